@@ -41,13 +41,19 @@ void MainWindow::initializeMcpServer()
     
     // 连接MCP服务器信号
     connect(m_mcpServer, &McpServer::serverStarted, this, &MainWindow::onMcpServerStarted);
+    connect(m_mcpServer, &McpServer::localServerStarted, this, &MainWindow::onMcpLocalServerStarted);
     connect(m_mcpServer, &McpServer::serverStopped, this, &MainWindow::onMcpServerStopped);
     connect(m_mcpServer, &McpServer::clientConnected, this, &MainWindow::onMcpClientConnected);
     connect(m_mcpServer, &McpServer::clientDisconnected, this, &MainWindow::onMcpClientDisconnected);
     connect(m_mcpServer, &McpServer::commandExecuted, this, &MainWindow::onMcpCommandExecuted);
     
+    // 设置MCP_LOCAL_SOCKET时改用本地套接字（如/tmp/mcp-qt.sock），不再监听TCP端口
+    const QString localSocket = QString::fromLocal8Bit(qgetenv("MCP_LOCAL_SOCKET"));
+    
     // 启动服务器
-    if (!m_mcpServer->startServer(8088)) {
+    bool started = localSocket.isEmpty() ? m_mcpServer->startServer(8088)
+                                         : m_mcpServer->startLocalServer(localSocket);
+    if (!started) {
         QMessageBox::warning(this, "错误", "MCP服务器启动失败！");
     }
 }
@@ -194,6 +200,12 @@ void MainWindow::onMcpServerStarted(quint16 port)
     qDebug() << "MCP服务器启动成功，端口:" << port;
 }
 
+void MainWindow::onMcpLocalServerStarted(const QString& serverName)
+{
+    updateStatusBar(QString("MCP服务器已启动，本地套接字: %1").arg(serverName));
+    qDebug() << "MCP服务器启动成功，本地套接字:" << serverName;
+}
+
 void MainWindow::onMcpServerStopped()
 {
     updateStatusBar("MCP服务器已停止");
@@ -51,12 +51,21 @@ public:
      */
     QString getCurrentAccount() const { return m_currentAccount; }
 
+    /**
+     * 函数名称：`getTestButtonClickCount`
+     * 功能描述：获取测试按钮累计点击次数
+     * 参数说明：无
+     * 返回值：int类型，点击次数
+     */
+    int getTestButtonClickCount() const { return m_testButtonClickCount; }
+
 private slots:
     void on_pushButton_login_clicked();
     void on_pushButton_test_clicked();
     
     // MCP服务器相关槽函数
     void onMcpServerStarted(quint16 port);
+    void onMcpLocalServerStarted(const QString& serverName);
     void onMcpServerStopped();
     void onMcpClientConnected(const QString& address);
     void onMcpClientDisconnected(const QString& address);
@@ -104,8 +104,10 @@ McpExecutor::ExecutionResult McpExecutor::getState()
         state["currentTime"] = QDateTime::currentDateTime().toString();
         state["applicationVersion"] = QApplication::applicationVersion();
         
-        // 获取登录状态（如果主窗口有相关方法）
-        // state["isLoggedIn"] = m_mainWindow->isLoggedIn();
+        // 获取登录状态和按钮计数（MCP服务器端的状态副本依赖这些字段）
+        state["isLoggedIn"] = m_mainWindow->isLoggedIn();
+        state["currentAccount"] = m_mainWindow->getCurrentAccount();
+        state["testButtonClickCount"] = m_mainWindow->getTestButtonClickCount();
         
         ExecutionResult result(true, "状态获取成功");
         result.data = state;
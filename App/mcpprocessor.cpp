@@ -1,5 +1,64 @@
 #include "mcpprocessor.h"
 #include <QDebug>
+#include <QHash>
+
+namespace {
+
+/**
+ * 函数名称：`CommandSpec`
+ * 功能描述：命令表条目，描述一条命令的关键字、类型和参数个数
+ *          （关键字需与Mcp/mcp-server-qt/qt_commands.py中的wire保持一致）
+ */
+struct CommandSpec {
+    const char* keyword;
+    McpProcessor::CommandType type;
+    int paramCount;
+};
+
+const CommandSpec COMMAND_SPECS[] = {
+    { "login",      McpProcessor::LOGIN,       2 },  // login:account:password
+    { "testbutton", McpProcessor::TEST_BUTTON, 0 },  // testbutton
+    { "getstate",   McpProcessor::GET_STATE,   0 },  // getstate
+};
+
+/**
+ * 函数名称：`commandTable`
+ * 功能描述：由命令表预先构建的关键字索引，首次调用时构建一次
+ * 参数说明：无
+ * 返回值：const QHash<QString, const CommandSpec*>&类型，关键字到命令表条目的映射
+ */
+const QHash<QString, const CommandSpec*>& commandTable()
+{
+    static const QHash<QString, const CommandSpec*> table = [] {
+        QHash<QString, const CommandSpec*> result;
+        for (const CommandSpec& spec : COMMAND_SPECS) {
+            result.insert(QString::fromLatin1(spec.keyword), &spec);
+        }
+        return result;
+    }();
+    return table;
+}
+
+/**
+ * 函数名称：`findCommandSpec`
+ * 功能描述：按命令关键字查找命令表条目（带参数的命令必须带":"分隔符，无参数命令必须完全匹配）
+ * 参数说明：
+ *     - command：QString类型，命令字符串
+ * 返回值：const CommandSpec*类型，未找到时为nullptr
+ */
+const CommandSpec* findCommandSpec(const QString& command)
+{
+    int separator = command.indexOf(':');
+    const QString keyword = separator < 0 ? command : command.left(separator);
+    const CommandSpec* spec = commandTable().value(keyword, nullptr);
+    
+    if (!spec || (spec->paramCount > 0) != (separator >= 0)) {
+        return nullptr;
+    }
+    return spec;
+}
+
+} // namespace
 
 McpProcessor::McpProcessor()
 {
@@ -25,7 +84,58 @@ McpProcessor::ParsedCommand McpProcessor::parseJsonMessage(const QString& jsonMe
         return result;
     }
     
-    QJsonObject obj = doc.object();
+    return parseJsonObject(doc.object(), jsonMessage);
+}
+
+/**
+ * 函数名称：`parseJsonBatch`
+ * 功能描述：解析JSON-RPC批量消息（JSON数组，每个元素是一条请求）
+ * 参数说明：
+ *     - jsonMessage：QString类型，JSON数组格式的消息字符串
+ * 返回值：QList<ParsedCommand>类型，按数组顺序解析后的命令列表，解析失败时为空
+ */
+QList<McpProcessor::ParsedCommand> McpProcessor::parseJsonBatch(const QString& jsonMessage)
+{
+    QJsonParseError error;
+    QJsonDocument doc = QJsonDocument::fromJson(jsonMessage.toUtf8(), &error);
+    
+    if (error.error != QJsonParseError::NoError || !doc.isArray()) {
+        qDebug() << "JSON批量消息解析错误:" << error.errorString();
+        return QList<ParsedCommand>();
+    }
+    
+    return parseJsonArray(doc.array());
+}
+
+/**
+ * 函数名称：`parseJsonArray`
+ * 功能描述：从已解析的JSON数组中提取批量请求
+ * 参数说明：
+ *     - array：QJsonArray类型，JSON-RPC批量请求
+ * 返回值：QList<ParsedCommand>类型，按数组顺序解析后的命令列表
+ */
+QList<McpProcessor::ParsedCommand> McpProcessor::parseJsonArray(const QJsonArray& array)
+{
+    QList<ParsedCommand> commands;
+    commands.reserve(array.size());
+    for (const QJsonValue& value : array) {
+        commands.append(parseJsonObject(value.toObject()));
+    }
+    return commands;
+}
+
+/**
+ * 函数名称：`parseJsonObject`
+ * 功能描述：从已解析的JSON对象中提取请求
+ * 参数说明：
+ *     - obj：QJsonObject类型，单条JSON-RPC请求
+ *     - originalMessage：QString类型，原始消息内容，为空时使用命令字符串
+ * 返回值：ParsedCommand类型，解析后的命令结构
+ */
+McpProcessor::ParsedCommand McpProcessor::parseJsonObject(const QJsonObject& obj, const QString& originalMessage)
+{
+    ParsedCommand result;
+    result.originalMessage = originalMessage;
     
     // 提取请求ID
     if (obj.contains("id")) {
@@ -33,15 +143,23 @@ McpProcessor::ParsedCommand McpProcessor::parseJsonMessage(const QString& jsonMe
     }
     
     // 提取方法和参数
-    if (obj.contains("method") && obj["method"].toString() == "execute") {
+    const QString method = obj["method"].toString();
+    if (method == "execute") {
         QJsonObject params = obj["params"].toObject();
         if (params.contains("command")) {
             QString command = params["command"].toString();
             ParsedCommand cmdResult = parseCommand(command);
             result.type = cmdResult.type;
             result.params = cmdResult.params;
+            if (result.originalMessage.isEmpty()) {
+                result.originalMessage = command;
+            }
         }
     }
+    else if (method == "hello") {
+        result.type = HELLO;
+        result.options = obj["params"].toObject();
+    }
     
     return result;
 }
@@ -58,22 +176,19 @@ McpProcessor::ParsedCommand McpProcessor::parseCommand(const QString& command)
     ParsedCommand result;
     result.originalMessage = command;
     
-    if (command.startsWith("login:")) {
-        result.type = LOGIN;
-        QStringList parts = command.split(":");
-        if (parts.size() >= 3) {
-            result.params << parts[1] << parts[2]; // account, password
-        }
-    }
-    else if (command == "testbutton") {
-        result.type = TEST_BUTTON;
-    }
-    else if (command == "getstate") {
-        result.type = GET_STATE;
-    }
-    else {
+    const CommandSpec* spec = findCommandSpec(command);
+    if (!spec) {
         result.type = UNKNOWN;
         qDebug() << "未知命令:" << command;
+        return result;
+    }
+    
+    result.type = spec->type;
+    if (spec->paramCount > 0) {
+        QStringList parts = command.split(":");
+        if (parts.size() > spec->paramCount) {
+            result.params = parts.mid(1, spec->paramCount);
+        }
     }
     
     return result;
@@ -91,6 +206,23 @@ McpProcessor::ParsedCommand McpProcessor::parseCommand(const QString& command)
  */
 QString McpProcessor::formatResponse(const QString& requestId, bool success, 
                                    const QString& message, const QJsonObject& data)
+{
+    QJsonDocument doc(formatResponseObject(requestId, success, message, data));
+    return doc.toJson(QJsonDocument::Compact);
+}
+
+/**
+ * 函数名称：`formatResponseObject`
+ * 功能描述：构造JSON-RPC响应对象（供单条响应和批量响应共用）
+ * 参数说明：
+ *     - requestId：QString类型，请求ID
+ *     - success：bool类型，执行成功状态
+ *     - message：QString类型，响应消息
+ *     - data：QJsonObject类型，附加数据
+ * 返回值：QJsonObject类型，响应对象
+ */
+QJsonObject McpProcessor::formatResponseObject(const QString& requestId, bool success,
+                                               const QString& message, const QJsonObject& data)
 {
     QJsonObject response;
     response["id"] = requestId;
@@ -112,8 +244,7 @@ QString McpProcessor::formatResponse(const QString& requestId, bool success,
         response["error"] = error;
     }
     
-    QJsonDocument doc(response);
-    return doc.toJson(QJsonDocument::Compact);
+    return response;
 }
 
 /**
@@ -125,12 +256,6 @@ QString McpProcessor::formatResponse(const QString& requestId, bool success,
  */
 McpProcessor::CommandType McpProcessor::stringToCommandType(const QString& commandStr)
 {
-    if (commandStr.startsWith("login:")) {
-        return LOGIN;
-    } else if (commandStr == "testbutton") {
-        return TEST_BUTTON;
-    } else if (commandStr == "getstate") {
-        return GET_STATE;
-    }
-    return UNKNOWN;
-} 
\ No newline at end of file
+    const CommandSpec* spec = findCommandSpec(commandStr);
+    return spec ? spec->type : UNKNOWN;
+}
@@ -5,6 +5,8 @@
 #include <QStringList>
 #include <QJsonDocument>
 #include <QJsonObject>
+#include <QJsonArray>
+#include <QList>
 
 /**
  * 函数名称：`McpProcessor`
@@ -19,7 +21,8 @@ public:
         UNKNOWN = 0,
         LOGIN,          // login:account:password
         TEST_BUTTON,    // testbutton
-        GET_STATE       // getstate
+        GET_STATE,      // getstate
+        HELLO           // {"method": "hello"} 帧格式协商
     };
 
     struct ParsedCommand {
@@ -27,6 +30,7 @@ public:
         QStringList params;
         QString originalMessage;
         QString requestId;
+        QJsonObject options;    // hello请求的协商参数
         
         ParsedCommand() : type(UNKNOWN) {}
     };
@@ -42,6 +46,34 @@ public:
      */
     ParsedCommand parseJsonMessage(const QString& jsonMessage);
 
+    /**
+     * 函数名称：`parseJsonBatch`
+     * 功能描述：解析JSON-RPC批量消息（JSON数组，每个元素是一条请求）
+     * 参数说明：
+     *     - jsonMessage：QString类型，JSON数组格式的消息字符串
+     * 返回值：QList<ParsedCommand>类型，按数组顺序解析后的命令列表，解析失败时为空
+     */
+    QList<ParsedCommand> parseJsonBatch(const QString& jsonMessage);
+
+    /**
+     * 函数名称：`parseJsonObject`
+     * 功能描述：从已解析的JSON对象中提取请求
+     * 参数说明：
+     *     - obj：QJsonObject类型，单条JSON-RPC请求
+     *     - originalMessage：QString类型，原始消息内容，为空时使用命令字符串
+     * 返回值：ParsedCommand类型，解析后的命令结构
+     */
+    ParsedCommand parseJsonObject(const QJsonObject& obj, const QString& originalMessage = QString());
+
+    /**
+     * 函数名称：`parseJsonArray`
+     * 功能描述：从已解析的JSON数组中提取批量请求
+     * 参数说明：
+     *     - array：QJsonArray类型，JSON-RPC批量请求
+     * 返回值：QList<ParsedCommand>类型，按数组顺序解析后的命令列表
+     */
+    QList<ParsedCommand> parseJsonArray(const QJsonArray& array);
+
     /**
      * 函数名称：`parseCommand`
      * 功能描述：解析纯文本命令
@@ -64,8 +96,22 @@ public:
     QString formatResponse(const QString& requestId, bool success, 
                           const QString& message, const QJsonObject& data = QJsonObject());
 
+    /**
+     * 函数名称：`formatResponseObject`
+     * 功能描述：构造JSON-RPC响应对象（供单条响应和批量响应共用）
+     * 参数说明：
+     *     - requestId：QString类型，请求ID
+     *     - success：bool类型，执行成功状态
+     *     - message：QString类型，响应消息
+     *     - data：QJsonObject类型，附加数据
+     * 返回值：QJsonObject类型，响应对象
+     */
+    QJsonObject formatResponseObject(const QString& requestId, bool success,
+                                     const QString& message, const QJsonObject& data = QJsonObject());
+
 private:
     CommandType stringToCommandType(const QString& commandStr);
+
 };
 
 #endif // MCPPROCESSOR_H 
\ No newline at end of file
@@ -3,15 +3,92 @@
 #include <QDebug>
 #include <QHostAddress>
 #include <QDateTime>
+#include <QJsonArray>
+#include <QJsonDocument>
+#include <QCborValue>
+#include <QtEndian>
+
+namespace {
+
+const int FRAME_HEADER_SIZE = 4;                        // 长度前缀：4字节大端无符号整数
+const quint32 MAX_FRAME_SIZE = 16 * 1024 * 1024;        // 单帧上限，超出视为协议错误
+
+/**
+ * 函数名称：`toCompactJson`
+ * 功能描述：将JSON对象或数组序列化为紧凑JSON
+ * 参数说明：
+ *     - value：QJsonValue类型，对象或数组
+ * 返回值：QByteArray类型，UTF-8编码的JSON
+ */
+QByteArray toCompactJson(const QJsonValue& value)
+{
+    QJsonDocument doc = value.isArray() ? QJsonDocument(value.toArray())
+                                        : QJsonDocument(value.toObject());
+    return doc.toJson(QJsonDocument::Compact);
+}
+
+/**
+ * 函数名称：`isConnected`
+ * 功能描述：判断客户端连接（TCP或本地套接字）是否仍处于连接状态
+ * 参数说明：
+ *     - device：QIODevice*类型，客户端连接
+ * 返回值：bool类型，连接状态
+ */
+bool isConnected(QIODevice* device)
+{
+    if (QAbstractSocket* tcp = qobject_cast<QAbstractSocket*>(device)) {
+        return tcp->state() == QAbstractSocket::ConnectedState;
+    }
+    if (QLocalSocket* local = qobject_cast<QLocalSocket*>(device)) {
+        return local->state() == QLocalSocket::ConnectedState;
+    }
+    return false;
+}
+
+/**
+ * 函数名称：`flushSocket`
+ * 功能描述：立即发送客户端连接中缓冲的数据
+ * 参数说明：
+ *     - device：QIODevice*类型，客户端连接
+ * 返回值：void类型
+ */
+void flushSocket(QIODevice* device)
+{
+    if (QAbstractSocket* tcp = qobject_cast<QAbstractSocket*>(device)) {
+        tcp->flush();
+    } else if (QLocalSocket* local = qobject_cast<QLocalSocket*>(device)) {
+        local->flush();
+    }
+}
+
+/**
+ * 函数名称：`abortSocket`
+ * 功能描述：立即断开客户端连接（协议错误时使用）
+ * 参数说明：
+ *     - device：QIODevice*类型，客户端连接
+ * 返回值：void类型
+ */
+void abortSocket(QIODevice* device)
+{
+    if (QAbstractSocket* tcp = qobject_cast<QAbstractSocket*>(device)) {
+        tcp->abort();
+    } else if (QLocalSocket* local = qobject_cast<QLocalSocket*>(device)) {
+        local->abort();
+    }
+}
+
+} // namespace
 
 McpServer::McpServer(MainWindow* mainWindow, QObject *parent)
     : QObject(parent)
     , m_tcpServer(new QTcpServer(this))
+    , m_localServer(new QLocalServer(this))
     , m_processor(new McpProcessor())
     , m_executor(new McpExecutor(mainWindow))
     , m_mainWindow(mainWindow)
 {
     connect(m_tcpServer, &QTcpServer::newConnection, this, &McpServer::onNewConnection);
+    connect(m_localServer, &QLocalServer::newConnection, this, &McpServer::onNewLocalConnection);
 }
 
 McpServer::~McpServer()
@@ -45,26 +122,57 @@ bool McpServer::startServer(quint16 port)
     return true;
 }
 
+/**
+ * 函数名称：`startLocalServer`
+ * 功能描述：启动本地套接字服务器（Unix域套接字/Windows命名管道），只接受本机连接
+ * 参数说明：
+ *     - name：QString类型，套接字名称或完整路径（如/tmp/mcp-qt.sock）
+ * 返回值：bool类型，启动成功状态
+ */
+bool McpServer::startLocalServer(const QString& name)
+{
+    if (m_localServer->isListening()) {
+        qDebug() << "本地套接字服务器已在运行";
+        return true;
+    }
+
+    // 上次异常退出可能遗留套接字文件，导致listen失败
+    QLocalServer::removeServer(name);
+    // 只允许当前用户连接
+    m_localServer->setSocketOptions(QLocalServer::UserAccessOption);
+
+    if (!m_localServer->listen(name)) {
+        qDebug() << "启动本地套接字服务器失败:" << m_localServer->errorString();
+        return false;
+    }
+
+    qDebug() << "MCP本地套接字服务器已启动:" << m_localServer->fullServerName();
+    emit localServerStarted(m_localServer->fullServerName());
+    return true;
+}
+
 /**
  * 函数名称：`stopServer`
- * 功能描述：停止TCP服务器
+ * 功能描述：停止服务器（TCP和本地套接字）
  * 参数说明：无
  * 返回值：void类型
  */
 void McpServer::stopServer()
 {
-    if (!m_tcpServer->isListening()) {
+    if (!isRunning()) {
         return;
     }
 
     // 断开所有客户端连接
-    for (QTcpSocket* client : m_clients) {
+    for (QIODevice* client : m_clients) {
         client->close();
         client->deleteLater();
     }
     m_clients.clear();
+    m_clientStates.clear();
 
     m_tcpServer->close();
+    m_localServer->close();
     qDebug() << "MCP服务器已停止";
     emit serverStopped();
 }
@@ -77,7 +185,7 @@ void McpServer::stopServer()
  */
 bool McpServer::isRunning() const
 {
-    return m_tcpServer->isListening();
+    return m_tcpServer->isListening() || m_localServer->isListening();
 }
 
 /**
@@ -91,6 +199,17 @@ quint16 McpServer::getPort() const
     return m_tcpServer->serverPort();
 }
 
+/**
+ * 函数名称：`getLocalServerName`
+ * 功能描述：获取本地套接字服务器的完整名称（Unix下为套接字文件路径）
+ * 参数说明：无
+ * 返回值：QString类型，未启动时为空
+ */
+QString McpServer::getLocalServerName() const
+{
+    return m_localServer->isListening() ? m_localServer->fullServerName() : QString();
+}
+
 /**
  * 函数名称：`getConnectedClients`
  * 功能描述：获取连接的客户端数量
@@ -106,28 +225,50 @@ void McpServer::onNewConnection()
 {
     while (m_tcpServer->hasPendingConnections()) {
         QTcpSocket* client = m_tcpServer->nextPendingConnection();
-        
         connect(client, &QTcpSocket::disconnected, this, &McpServer::onClientDisconnected);
-        connect(client, &QTcpSocket::readyRead, this, &McpServer::onDataReceived);
         
-        m_clients.append(client);
-        
-        QString clientAddress = QString("%1:%2")
-                               .arg(client->peerAddress().toString())
-                               .arg(client->peerPort());
+        addClient(client, QString("%1:%2")
+                          .arg(client->peerAddress().toString())
+                          .arg(client->peerPort()));
+    }
+}
+
+void McpServer::onNewLocalConnection()
+{
+    while (m_localServer->hasPendingConnections()) {
+        QLocalSocket* client = m_localServer->nextPendingConnection();
+        connect(client, &QLocalSocket::disconnected, this, &McpServer::onClientDisconnected);
         
-        qDebug() << "客户端连接:" << clientAddress;
-        emit clientConnected(clientAddress);
+        addClient(client, QString("local:%1").arg(client->socketDescriptor()));
     }
 }
 
+/**
+ * 函数名称：`addClient`
+ * 功能描述：登记新的客户端连接（TCP或本地套接字）
+ * 参数说明：
+ *     - client：QIODevice*类型，客户端连接
+ *     - address：QString类型，客户端地址
+ * 返回值：void类型
+ */
+void McpServer::addClient(QIODevice* client, const QString& address)
+{
+    connect(client, &QIODevice::readyRead, this, &McpServer::onDataReceived);
+    
+    ClientState state;
+    state.address = address;
+    m_clients.append(client);
+    m_clientStates.insert(client, state);
+    
+    qDebug() << "客户端连接:" << address;
+    emit clientConnected(address);
+}
+
 void McpServer::onClientDisconnected()
 {
-    QTcpSocket* client = qobject_cast<QTcpSocket*>(sender());
+    QIODevice* client = qobject_cast<QIODevice*>(sender());
     if (client) {
-        QString clientAddress = QString("%1:%2")
-                               .arg(client->peerAddress().toString())
-                               .arg(client->peerPort());
+        QString clientAddress = m_clientStates.value(client).address;
         
         qDebug() << "客户端断开连接:" << clientAddress;
         emit clientDisconnected(clientAddress);
@@ -138,10 +279,11 @@ void McpServer::onClientDisconnected()
 
 void McpServer::onDataReceived()
 {
-    QTcpSocket* client = qobject_cast<QTcpSocket*>(sender());
+    QIODevice* client = qobject_cast<QIODevice*>(sender());
     if (!client) return;
     
-    while (client->canReadLine()) {
+    // 行模式：协商切换为长度前缀帧后，剩余数据交给帧解析
+    while (m_clientStates.value(client).framing == LineFraming && client->canReadLine()) {
         QByteArray data = client->readLine();
         QString message = QString::fromUtf8(data).trimmed();
         
@@ -150,18 +292,28 @@ void McpServer::onDataReceived()
             processMessage(client, message);
         }
     }
+    
+    if (m_clientStates.value(client).framing == LengthPrefixedFraming) {
+        readFrames(client);
+    }
 }
 
 /**
  * 函数名称：`processMessage`
  * 功能描述：处理收到的消息
  * 参数说明：
- *     - socket：QTcpSocket*类型，客户端socket
+ *     - socket：QIODevice*类型，客户端连接
  *     - message：QString类型，消息内容
  * 返回值：void类型
  */
-void McpServer::processMessage(QTcpSocket* socket, const QString& message)
+void McpServer::processMessage(QIODevice* socket, const QString& message)
 {
+    // JSON数组为批量请求
+    if (message.startsWith("[")) {
+        processBatch(socket, m_processor->parseJsonBatch(message), message);
+        return;
+    }
+    
     // 解析命令
     McpProcessor::ParsedCommand cmd;
     
@@ -176,72 +328,263 @@ void McpServer::processMessage(QTcpSocket* socket, const QString& message)
         }
     }
     
-    QString response;
-    bool success = false;
+    dispatchCommand(socket, cmd);
+}
+
+/**
+ * 函数名称：`processBatch`
+ * 功能描述：按顺序执行JSON-RPC批量请求，并以一个JSON数组一次性应答
+ * 参数说明：
+ *     - socket：QIODevice*类型，客户端连接
+ *     - commands：QList<ParsedCommand>类型，解析后的批量命令
+ *     - message：QString类型，原始消息内容（用于错误提示）
+ * 返回值：void类型
+ */
+void McpServer::processBatch(QIODevice* socket, const QList<McpProcessor::ParsedCommand>& commands,
+                             const QString& message)
+{
+    if (commands.isEmpty()) {
+        sendJson(socket, m_processor->formatResponseObject(QString(), false, "无效的批量请求"));
+        emit commandExecuted(message, false);
+        return;
+    }
+    
+    QJsonArray responses;
+    for (const McpProcessor::ParsedCommand& cmd : commands) {
+        bool success = false;
+        responses.append(executeCommand(cmd, success));
+        emit commandExecuted(cmd.originalMessage, success);
+    }
+    
+    sendJson(socket, responses);
+}
+
+/**
+ * 函数名称：`dispatchCommand`
+ * 功能描述：处理一条已解析的请求（协商请求或普通命令）并发送响应
+ * 参数说明：
+ *     - socket：QIODevice*类型，客户端连接
+ *     - cmd：ParsedCommand类型，解析后的命令
+ * 返回值：void类型
+ */
+void McpServer::dispatchCommand(QIODevice* socket, const McpProcessor::ParsedCommand& cmd)
+{
+    if (cmd.type == McpProcessor::HELLO) {
+        negotiateFraming(socket, cmd);
+        return;
+    }
     
     // 执行命令
+    bool success = false;
+    QJsonObject response = executeCommand(cmd, success);
+    
+    // 发送响应
+    sendJson(socket, response);
+    emit commandExecuted(cmd.originalMessage, success);
+}
+
+/**
+ * 函数名称：`negotiateFraming`
+ * 功能描述：处理hello请求，按客户端能力选择帧格式和编码；应答使用旧格式，之后的消息使用新格式
+ * 参数说明：
+ *     - socket：QIODevice*类型，客户端连接
+ *     - cmd：ParsedCommand类型，hello请求
+ * 返回值：void类型
+ */
+void McpServer::negotiateFraming(QIODevice* socket, const McpProcessor::ParsedCommand& cmd)
+{
+    const QJsonArray framings = cmd.options["framing"].toArray();
+    const QJsonArray encodings = cmd.options["encodings"].toArray();
+    
+    bool lengthPrefixed = framings.contains(QJsonValue(QStringLiteral("length-prefixed")));
+    bool cbor = lengthPrefixed && encodings.contains(QJsonValue(QStringLiteral("cbor")));
+    
+    QJsonObject data;
+    data["framing"] = lengthPrefixed ? "length-prefixed" : "line";
+    data["encoding"] = cbor ? "cbor" : "json";
+    data["maxFrameSize"] = static_cast<qint64>(MAX_FRAME_SIZE);
+    sendJson(socket, m_processor->formatResponseObject(cmd.requestId, true, "帧格式协商成功", data));
+    
+    if (m_clientStates.contains(socket)) {
+        ClientState& state = m_clientStates[socket];
+        state.framing = lengthPrefixed ? LengthPrefixedFraming : LineFraming;
+        state.cbor = cbor;
+    }
+    qDebug() << "帧格式协商:" << data["framing"].toString() << data["encoding"].toString();
+}
+
+/**
+ * 函数名称：`readFrames`
+ * 功能描述：长度前缀模式下读取并处理所有完整的消息帧
+ * 参数说明：
+ *     - socket：QIODevice*类型，客户端连接
+ * 返回值：void类型
+ */
+void McpServer::readFrames(QIODevice* socket)
+{
+    m_clientStates[socket].buffer.append(socket->readAll());
+    
+    while (m_clientStates.contains(socket)) {
+        QByteArray& buffer = m_clientStates[socket].buffer;
+        if (buffer.size() < FRAME_HEADER_SIZE) {
+            break;
+        }
+        
+        quint32 length = qFromBigEndian<quint32>(buffer.constData());
+        if (length > MAX_FRAME_SIZE) {
+            qDebug() << "消息帧过大，断开连接:" << length;
+            abortSocket(socket);
+            return;
+        }
+        if (static_cast<quint32>(buffer.size() - FRAME_HEADER_SIZE) < length) {
+            break;
+        }
+        
+        QByteArray payload = buffer.mid(FRAME_HEADER_SIZE, static_cast<int>(length));
+        buffer.remove(0, FRAME_HEADER_SIZE + static_cast<int>(length));
+        
+        // 处理期间可能进入嵌套事件循环（弹窗），buffer引用此后不再使用
+        processFrame(socket, payload);
+    }
+}
+
+/**
+ * 函数名称：`processFrame`
+ * 功能描述：解码一个消息帧（JSON或CBOR）并处理其中的请求
+ * 参数说明：
+ *     - socket：QIODevice*类型，客户端连接
+ *     - payload：QByteArray类型，消息帧内容
+ * 返回值：void类型
+ */
+void McpServer::processFrame(QIODevice* socket, const QByteArray& payload)
+{
+    QJsonValue value;
+    if (m_clientStates.value(socket).cbor) {
+        value = QCborValue::fromCbor(payload).toJsonValue();
+    } else {
+        QJsonDocument doc = QJsonDocument::fromJson(payload);
+        if (doc.isArray()) {
+            value = doc.array();
+        } else if (doc.isObject()) {
+            value = doc.object();
+        }
+    }
+    
+    if (value.isArray()) {
+        processBatch(socket, m_processor->parseJsonArray(value.toArray()), QString());
+    } else if (value.isObject()) {
+        dispatchCommand(socket, m_processor->parseJsonObject(value.toObject()));
+    } else {
+        sendJson(socket, m_processor->formatResponseObject(QString(), false, "无效的消息帧"));
+    }
+}
+
+/**
+ * 函数名称：`executeCommand`
+ * 功能描述：执行一条已解析的命令
+ * 参数说明：
+ *     - cmd：ParsedCommand类型，解析后的命令
+ *     - success：bool&类型，输出执行成功状态
+ * 返回值：QJsonObject类型，JSON-RPC响应对象
+ */
+QJsonObject McpServer::executeCommand(const McpProcessor::ParsedCommand& cmd, bool& success)
+{
+    success = false;
+    
     switch (cmd.type) {
         case McpProcessor::LOGIN: {
             if (cmd.params.size() >= 2) {
                 McpExecutor::ExecutionResult result = m_executor->executeLogin(cmd.params[0], cmd.params[1]);
-                response = m_processor->formatResponse(cmd.requestId, result.success, result.message, result.data);
                 success = result.success;
-            } else {
-                response = m_processor->formatResponse(cmd.requestId, false, "登录参数不足");
+                return m_processor->formatResponseObject(cmd.requestId, result.success, result.message, result.data);
             }
-            break;
+            return m_processor->formatResponseObject(cmd.requestId, false, "登录参数不足");
         }
         case McpProcessor::TEST_BUTTON: {
             McpExecutor::ExecutionResult result = m_executor->executeTestButton();
-            response = m_processor->formatResponse(cmd.requestId, result.success, result.message, result.data);
             success = result.success;
-            break;
+            return m_processor->formatResponseObject(cmd.requestId, result.success, result.message, result.data);
         }
         case McpProcessor::GET_STATE: {
             McpExecutor::ExecutionResult result = m_executor->getState();
-            response = m_processor->formatResponse(cmd.requestId, result.success, result.message, result.data);
             success = result.success;
-            break;
-        }
-        default: {
-            response = m_processor->formatResponse(cmd.requestId, false, "未知命令: " + cmd.originalMessage);
-            break;
+            return m_processor->formatResponseObject(cmd.requestId, result.success, result.message, result.data);
         }
+        default:
+            return m_processor->formatResponseObject(cmd.requestId, false, "未知命令: " + cmd.originalMessage);
     }
-    
-    // 发送响应
-    sendResponse(socket, response);
-    emit commandExecuted(cmd.originalMessage, success);
 }
 
 /**
  * 函数名称：`sendResponse`
  * 功能描述：发送响应消息给客户端
  * 参数说明：
- *     - socket：QTcpSocket*类型，客户端socket
+ *     - socket：QIODevice*类型，客户端连接
  *     - response：QString类型，响应内容
  * 返回值：void类型
  */
-void McpServer::sendResponse(QTcpSocket* socket, const QString& response)
+void McpServer::sendResponse(QIODevice* socket, const QString& response)
 {
-    if (socket && socket->state() == QAbstractSocket::ConnectedState) {
+    if (socket && isConnected(socket)) {
         socket->write(response.toUtf8() + "\n");
-        socket->flush();
+        flushSocket(socket);
         qDebug() << "发送响应:" << response;
     }
 }
 
+/**
+ * 函数名称：`sendJson`
+ * 功能描述：按客户端协商的帧格式发送JSON响应（对象或批量数组）
+ * 参数说明：
+ *     - socket：QIODevice*类型，客户端连接
+ *     - value：QJsonValue类型，响应内容
+ * 返回值：void类型
+ */
+void McpServer::sendJson(QIODevice* socket, const QJsonValue& value)
+{
+    const ClientState state = m_clientStates.value(socket);
+    
+    if (state.framing == LineFraming) {
+        sendResponse(socket, QString::fromUtf8(toCompactJson(value)));
+    } else if (state.cbor) {
+        writeFrame(socket, QCborValue::fromJsonValue(value).toCbor());
+    } else {
+        writeFrame(socket, toCompactJson(value));
+    }
+}
+
+/**
+ * 函数名称：`writeFrame`
+ * 功能描述：以长度前缀帧发送消息体
+ * 参数说明：
+ *     - socket：QIODevice*类型，客户端连接
+ *     - payload：QByteArray类型，消息体
+ * 返回值：void类型
+ */
+void McpServer::writeFrame(QIODevice* socket, const QByteArray& payload)
+{
+    if (socket && isConnected(socket)) {
+        QByteArray header(FRAME_HEADER_SIZE, Qt::Uninitialized);
+        qToBigEndian<quint32>(static_cast<quint32>(payload.size()), header.data());
+        socket->write(header);
+        socket->write(payload);
+        flushSocket(socket);
+        qDebug() << "发送响应帧:" << payload.size() << "字节";
+    }
+}
+
 /**
  * 函数名称：`removeClient`
  * 功能描述：移除客户端连接
  * 参数说明：
- *     - socket：QTcpSocket*类型，客户端socket
+ *     - socket：QIODevice*类型，客户端连接
  * 返回值：void类型
  */
-void McpServer::removeClient(QTcpSocket* socket)
+void McpServer::removeClient(QIODevice* socket)
 {
     if (socket) {
         m_clients.removeAll(socket);
+        m_clientStates.remove(socket);
         socket->deleteLater();
     }
 } 
\ No newline at end of file
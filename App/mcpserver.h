@@ -4,7 +4,11 @@
 #include <QObject>
 #include <QTcpServer>
 #include <QTcpSocket>
+#include <QLocalServer>
+#include <QLocalSocket>
 #include <QList>
+#include <QHash>
+#include <QJsonValue>
 #include "mcpprocessor.h"
 #include "mcpexecutor.h"
 
@@ -12,7 +16,7 @@ class MainWindow;
 
 /**
  * 函数名称：`McpServer`
- * 功能描述：MCP TCP服务器类，处理客户端连接和命令执行
+ * 功能描述：MCP服务器类，通过TCP或本地套接字处理客户端连接和命令执行
  * 参数说明：无
  * 返回值：无
  */
@@ -33,9 +37,18 @@ public:
      */
     bool startServer(quint16 port = 8080);
 
+    /**
+     * 函数名称：`startLocalServer`
+     * 功能描述：启动本地套接字服务器（Unix域套接字/Windows命名管道），只接受本机连接
+     * 参数说明：
+     *     - name：QString类型，套接字名称或完整路径（如/tmp/mcp-qt.sock）
+     * 返回值：bool类型，启动成功状态
+     */
+    bool startLocalServer(const QString& name);
+
     /**
      * 函数名称：`stopServer`
-     * 功能描述：停止TCP服务器
+     * 功能描述：停止服务器（TCP和本地套接字）
      * 参数说明：无
      * 返回值：void类型
      */
@@ -57,6 +70,14 @@ public:
      */
     quint16 getPort() const;
 
+    /**
+     * 函数名称：`getLocalServerName`
+     * 功能描述：获取本地套接字服务器的完整名称（Unix下为套接字文件路径）
+     * 参数说明：无
+     * 返回值：QString类型，未启动时为空
+     */
+    QString getLocalServerName() const;
+
     /**
      * 函数名称：`getConnectedClients`
      * 功能描述：获取连接的客户端数量
@@ -75,6 +96,15 @@ signals:
      */
     void serverStarted(quint16 port);
 
+    /**
+     * 函数名称：`localServerStarted`
+     * 功能描述：本地套接字服务器启动信号
+     * 参数说明：
+     *     - serverName：QString类型，套接字完整名称
+     * 返回值：void类型
+     */
+    void localServerStarted(const QString& serverName);
+
     /**
      * 函数名称：`serverStopped`
      * 功能描述：服务器停止信号
@@ -113,44 +143,157 @@ signals:
 
 private slots:
     void onNewConnection();
+    void onNewLocalConnection();
     void onClientDisconnected();
     void onDataReceived();
 
 private:
+    /**
+     * 函数名称：`FramingMode`
+     * 功能描述：连接使用的消息帧格式，默认按行分隔，客户端可通过hello请求协商为长度前缀帧
+     */
+    enum FramingMode {
+        LineFraming = 0,        // 每行一条JSON或纯文本消息
+        LengthPrefixedFraming   // 4字节大端长度 + 消息体（JSON或CBOR）
+    };
+
+    struct ClientState {
+        FramingMode framing;
+        bool cbor;
+        QByteArray buffer;      // 长度前缀模式下未凑满一帧的数据
+        QString address;        // 客户端地址（TCP为ip:port，本地套接字为local:描述符）
+        
+        ClientState() : framing(LineFraming), cbor(false) {}
+    };
+
     QTcpServer* m_tcpServer;
-    QList<QTcpSocket*> m_clients;
+    QLocalServer* m_localServer;
+    // 客户端连接统一按QIODevice处理（QTcpSocket或QLocalSocket）
+    QList<QIODevice*> m_clients;
+    QHash<QIODevice*, ClientState> m_clientStates;
     McpProcessor* m_processor;
     McpExecutor* m_executor;
     MainWindow* m_mainWindow;
 
+    /**
+     * 函数名称：`addClient`
+     * 功能描述：登记新的客户端连接（TCP或本地套接字）
+     * 参数说明：
+     *     - client：QIODevice*类型，客户端连接
+     *     - address：QString类型，客户端地址
+     * 返回值：void类型
+     */
+    void addClient(QIODevice* client, const QString& address);
+
     /**
      * 函数名称：`processMessage`
      * 功能描述：处理收到的消息
      * 参数说明：
-     *     - socket：QTcpSocket*类型，客户端socket
+     *     - socket：QIODevice*类型，客户端连接
      *     - message：QString类型，消息内容
      * 返回值：void类型
      */
-    void processMessage(QTcpSocket* socket, const QString& message);
+    void processMessage(QIODevice* socket, const QString& message);
+
+    /**
+     * 函数名称：`processBatch`
+     * 功能描述：按顺序执行JSON-RPC批量请求，并以一个JSON数组一次性应答
+     * 参数说明：
+     *     - socket：QIODevice*类型，客户端连接
+     *     - commands：QList<ParsedCommand>类型，解析后的批量命令
+     *     - message：QString类型，原始消息内容（用于错误提示）
+     * 返回值：void类型
+     */
+    void processBatch(QIODevice* socket, const QList<McpProcessor::ParsedCommand>& commands,
+                      const QString& message);
+
+    /**
+     * 函数名称：`dispatchCommand`
+     * 功能描述：处理一条已解析的请求（协商请求或普通命令）并发送响应
+     * 参数说明：
+     *     - socket：QIODevice*类型，客户端连接
+     *     - cmd：ParsedCommand类型，解析后的命令
+     * 返回值：void类型
+     */
+    void dispatchCommand(QIODevice* socket, const McpProcessor::ParsedCommand& cmd);
+
+    /**
+     * 函数名称：`negotiateFraming`
+     * 功能描述：处理hello请求，按客户端能力选择帧格式和编码；应答使用旧格式，之后的消息使用新格式
+     * 参数说明：
+     *     - socket：QIODevice*类型，客户端连接
+     *     - cmd：ParsedCommand类型，hello请求
+     * 返回值：void类型
+     */
+    void negotiateFraming(QIODevice* socket, const McpProcessor::ParsedCommand& cmd);
+
+    /**
+     * 函数名称：`readFrames`
+     * 功能描述：长度前缀模式下读取并处理所有完整的消息帧
+     * 参数说明：
+     *     - socket：QIODevice*类型，客户端连接
+     * 返回值：void类型
+     */
+    void readFrames(QIODevice* socket);
+
+    /**
+     * 函数名称：`processFrame`
+     * 功能描述：解码一个消息帧（JSON或CBOR）并处理其中的请求
+     * 参数说明：
+     *     - socket：QIODevice*类型，客户端连接
+     *     - payload：QByteArray类型，消息帧内容
+     * 返回值：void类型
+     */
+    void processFrame(QIODevice* socket, const QByteArray& payload);
+
+    /**
+     * 函数名称：`executeCommand`
+     * 功能描述：执行一条已解析的命令
+     * 参数说明：
+     *     - cmd：ParsedCommand类型，解析后的命令
+     *     - success：bool&类型，输出执行成功状态
+     * 返回值：QJsonObject类型，JSON-RPC响应对象
+     */
+    QJsonObject executeCommand(const McpProcessor::ParsedCommand& cmd, bool& success);
 
     /**
      * 函数名称：`sendResponse`
      * 功能描述：发送响应消息给客户端
      * 参数说明：
-     *     - socket：QTcpSocket*类型，客户端socket
+     *     - socket：QIODevice*类型，客户端连接
      *     - response：QString类型，响应内容
      * 返回值：void类型
      */
-    void sendResponse(QTcpSocket* socket, const QString& response);
+    void sendResponse(QIODevice* socket, const QString& response);
+
+    /**
+     * 函数名称：`sendJson`
+     * 功能描述：按客户端协商的帧格式发送JSON响应（对象或批量数组）
+     * 参数说明：
+     *     - socket：QIODevice*类型，客户端连接
+     *     - value：QJsonValue类型，响应内容
+     * 返回值：void类型
+     */
+    void sendJson(QIODevice* socket, const QJsonValue& value);
+
+    /**
+     * 函数名称：`writeFrame`
+     * 功能描述：以长度前缀帧发送消息体
+     * 参数说明：
+     *     - socket：QIODevice*类型，客户端连接
+     *     - payload：QByteArray类型，消息体
+     * 返回值：void类型
+     */
+    void writeFrame(QIODevice* socket, const QByteArray& payload);
 
     /**
      * 函数名称：`removeClient`
      * 功能描述：移除客户端连接
      * 参数说明：
-     *     - socket：QTcpSocket*类型，客户端socket
+     *     - socket：QIODevice*类型，客户端连接
      * 返回值：void类型
      */
-    void removeClient(QTcpSocket* socket);
+    void removeClient(QIODevice* socket);
 };
 
 #endif // MCPSERVER_H 
\ No newline at end of file
@@ -5,33 +5,59 @@ Qt TCP客户端
 """
 
 import asyncio
+import itertools
 import json
 import socket
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class QtClient:
-    """Qt应用TCP客户端"""
+    """Qt应用TCP客户端（支持多个请求共享同一连接并发执行）"""
     
-    def __init__(self, host: str = "localhost", port: int = 8088):
+    def __init__(self, host: str = "localhost", port: int = 8088,
+                 timeout: float = 30.0, connect_timeout: float = 5.0,
+                 socket_path: Optional[str] = None):
         self.host = host
         self.port = port
+        # 设置后改为连接Qt的本地套接字（Qt端以MCP_LOCAL_SOCKET启动）
+        self.socket_path = socket_path
+        # 单个请求的默认超时（秒），None表示不限
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
         self.reader: Optional[asyncio.StreamReader] = None
         self.writer: Optional[asyncio.StreamWriter] = None
         self.connected = False
+        # 按请求id分发响应的挂起请求表（保持插入顺序，用于无id响应的回退匹配）
+        self._pending: Dict[str, asyncio.Future] = {}
+        # 已超时放弃的请求id，其迟到的响应直接丢弃，不能交给其他请求
+        self._abandoned: Dict[str, None] = {}
+        self._reader_task: Optional[asyncio.Task] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._ids = itertools.count(1)
         
     async def connect(self) -> bool:
         """连接到Qt应用"""
+        # 先停止旧连接的读取任务，否则它读到旧连接的EOF后会把新连接标记为断开
+        await self._stop_reader()
+        if self.writer:
+            # 丢弃失效的旧连接，其上挂起的请求不会再收到响应
+            self._fail_pending(ConnectionError("Qt应用连接已断开"))
+            self.writer.close()
         try:
-            self.reader, self.writer = await asyncio.open_connection(
-                self.host, self.port
-            )
+            if self.socket_path:
+                connecting = asyncio.open_unix_connection(self.socket_path)
+            else:
+                connecting = asyncio.open_connection(self.host, self.port)
+            self.reader, self.writer = await asyncio.wait_for(connecting, self.connect_timeout)
+            self._write_lock = asyncio.Lock()
+            self._reader_task = asyncio.ensure_future(self._read_loop(self.reader))
             self.connected = True
-            logger.info(f"已连接到Qt应用 {self.host}:{self.port}")
+            logger.info(f"已连接到Qt应用 {self.socket_path or f'{self.host}:{self.port}'}")
             return True
             
         except Exception as e:
@@ -41,74 +67,226 @@ class QtClient:
     
     async def disconnect(self):
         """断开连接"""
+        await self._stop_reader()
+        self._fail_pending(ConnectionError("Qt应用连接已断开"))
         if self.writer:
             self.writer.close()
             await self.writer.wait_closed()
             self.connected = False
             logger.info("已断开Qt应用连接")
     
+    async def _stop_reader(self):
+        """取消并等待当前连接的后台读取任务"""
+        task, self._reader_task = self._reader_task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    
     async def _ensure_connection(self):
         """确保连接有效"""
-        if not self.connected:
-            success = await self.connect()
-            if not success:
-                raise ConnectionError("无法连接到Qt应用")
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if not self.connected:
+                success = await self.connect()
+                if not success:
+                    raise ConnectionError("无法连接到Qt应用")
+    
+    def _fail_pending(self, error: Exception):
+        """让所有挂起的请求以异常结束"""
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+    
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        """后台读取任务：按响应id把结果分发给对应的请求"""
+        try:
+            while True:
+                response_line = await reader.readline()
+                if not response_line:
+                    raise ConnectionError("Qt应用连接已关闭")
+                
+                response_str = response_line.decode('utf-8').strip()
+                if not response_str:
+                    continue
+                logger.debug(f"收到响应: {response_str}")
+                self._dispatch(response_str)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if reader is not self.reader:
+                # 已被新连接取代，不能影响新连接的状态和挂起请求
+                return
+            logger.error(f"读取响应失败: {e}")
+            # 重置连接状态
+            self.connected = False
+            self._fail_pending(e if isinstance(e, ConnectionError) else ConnectionError(str(e)))
     
-    async def send_command(self, command: str) -> Dict[str, Any]:
+    def _dispatch(self, response_str: str):
+        """把一条响应交给等待它的请求"""
+        try:
+            response_data = json.loads(response_str)
+        except json.JSONDecodeError:
+            # 如果不是JSON格式，返回原始文本
+            response_data = {
+                "success": True,
+                "message": response_str,
+                "data": {}
+            }
+        
+        if isinstance(response_data, list):
+            # 批量响应：以第一条请求的id作为整批的键
+            first = response_data[0] if response_data else None
+            request_id = f"batch:{first.get('id')}" if isinstance(first, dict) else None
+        else:
+            request_id = response_data.get("id") if isinstance(response_data, dict) else None
+        if request_id in self._abandoned:
+            del self._abandoned[request_id]
+            logger.debug(f"丢弃已超时请求的响应: {request_id}")
+            return
+        future = self._pending.pop(request_id, None) if request_id else None
+        if future is None and self._pending:
+            # 无法按id匹配时（纯文本响应或解析失败），Qt按收到顺序应答，交给最早的请求
+            oldest_id = next(iter(self._pending))
+            future = self._pending.pop(oldest_id)
+        if future is None:
+            logger.warning(f"丢弃无人等待的响应: {response_str}")
+            return
+        if not future.done():
+            future.set_result(response_data)
+    
+    async def send_command(self, command: str, timeout: Optional[float] = None) -> Dict[str, Any]:
         """
         发送命令到Qt应用
         
         Args:
             command: 要发送的命令字符串
+            timeout: 本次请求的超时（秒），默认使用self.timeout
             
         Returns:
             Qt应用的响应字典
+            
+        Raises:
+            asyncio.TimeoutError: 超时未收到响应，请求被放弃
         """
         await self._ensure_connection()
         
+        message = self._build_message(command)
+        request_id = message["id"]
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        
         try:
-            # 构造JSON-RPC消息
-            message = {
-                "id": f"mcp_{asyncio.get_event_loop().time()}",
-                "method": "execute",
-                "params": {
-                    "command": command
-                }
-            }
-            
             # 发送消息
             message_str = json.dumps(message) + '\n'
-            self.writer.write(message_str.encode('utf-8'))
-            await self.writer.drain()
+            async with self._write_lock:
+                self.writer.write(message_str.encode('utf-8'))
+                await self.writer.drain()
             
             logger.debug(f"发送命令: {command}")
             
-            # 接收响应
-            response_line = await self.reader.readline()
-            if not response_line:
-                raise ConnectionError("Qt应用连接已关闭")
-            
-            response_str = response_line.decode('utf-8').strip()
-            logger.debug(f"收到响应: {response_str}")
-            
-            # 解析JSON响应
-            try:
-                response_data = json.loads(response_str)
-                return response_data
-            except json.JSONDecodeError:
-                # 如果不是JSON格式，返回原始文本
-                return {
-                    "success": True,
-                    "message": response_str,
-                    "data": {}
-                }
+            # 等待后台读取任务分发的响应
+            return await self._wait_response(future, [request_id], timeout)
                 
+        except asyncio.TimeoutError:
+            # 超时只放弃这个请求，连接继续有效
+            raise
         except Exception as e:
             logger.error(f"发送命令失败: {e}")
-            # 重置连接状态
-            self.connected = False
+            self._pending.pop(request_id, None)
+            if isinstance(e, (ConnectionError, OSError)):
+                # 重置连接状态
+                self.connected = False
             raise
     
+    async def send_commands(self, commands: List[str], batch_frame: bool = True,
+                            timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        一次发送多条命令，Qt端按顺序执行
+        
+        Args:
+            commands: 命令字符串列表
+            batch_frame: True时使用JSON-RPC批量数组（一条消息），
+                         False时逐行写入后一次drain
+            timeout: 整批请求的超时（秒），默认使用self.timeout
+            
+        Returns:
+            与commands顺序一致的响应字典列表
+        """
+        if not commands:
+            return []
+        await self._ensure_connection()
+        
+        messages = [self._build_message(command) for command in commands]
+        loop = asyncio.get_running_loop()
+        if batch_frame:
+            keys = [f"batch:{messages[0]['id']}"]
+            payload = json.dumps(messages) + '\n'
+        else:
+            keys = [message["id"] for message in messages]
+            payload = ''.join(json.dumps(message) + '\n' for message in messages)
+        futures = [loop.create_future() for _ in keys]
+        self._pending.update(zip(keys, futures))
+        
+        try:
+            async with self._write_lock:
+                self.writer.write(payload.encode('utf-8'))
+                await self.writer.drain()
+            
+            logger.debug(f"批量发送命令: {commands}")
+            
+            if not batch_frame:
+                return list(await self._wait_response(asyncio.gather(*futures), keys, timeout))
+            
+            responses = await self._wait_response(futures[0], keys, timeout)
+        except asyncio.TimeoutError:
+            raise
+        except Exception as e:
+            logger.error(f"批量发送命令失败: {e}")
+            for key in keys:
+                self._pending.pop(key, None)
+            if isinstance(e, (ConnectionError, OSError)):
+                self.connected = False
+            raise
+        
+        if not isinstance(responses, list):
+            # Qt端不支持批量数组时退回逐行发送
+            logger.info("Qt应用不支持批量请求，改为逐行发送")
+            return await self.send_commands(commands, batch_frame=False, timeout=timeout)
+        by_id = {r.get("id"): r for r in responses if isinstance(r, dict)}
+        return [by_id.get(message["id"], responses[i] if i < len(responses) else {})
+                for i, message in enumerate(messages)]
+    
+    async def _wait_response(self, awaitable, request_ids: List[str], timeout: Optional[float]):
+        """等待响应，超时后放弃这些请求id（连接继续供其他请求使用）"""
+        if timeout is None:
+            timeout = self.timeout
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"等待Qt应用响应超时({timeout}秒): {request_ids}")
+            for request_id in request_ids:
+                if self._pending.pop(request_id, None) is not None:
+                    self._abandoned[request_id] = None
+            while len(self._abandoned) > 1024:
+                del self._abandoned[next(iter(self._abandoned))]
+            raise
+    
+    def _build_message(self, command: str) -> Dict[str, Any]:
+        """构造JSON-RPC消息（id必须是字符串，Qt端按字符串读取）"""
+        return {
+            "id": f"mcp_{next(self._ids)}",
+            "method": "execute",
+            "params": {
+                "command": command
+            }
+        }
+    
     async def send_login_command(self, account: str, password: str) -> Dict[str, Any]:
         """发送登录命令"""
         command = f"login:{account}:{password}"
@@ -180,6 +358,11 @@ async def test_qt_client():
         response = await client.send_test_button_command()
         print(client.format_response(response))
         
+        print("\n=== 测试批量命令 ===")
+        responses = await client.send_commands(["login:admin:123456", "testbutton", "getstate"])
+        for response in responses:
+            print(client.format_response(response))
+        
     except Exception as e:
         print(f"测试失败: {e}")
     finally:
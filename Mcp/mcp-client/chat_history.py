@@ -0,0 +1,277 @@
+"""
+对话历史管理模块
+按token预算维护发送给LLM的消息列表：最近若干轮对话原样保留，
+更早的轮次（含工具执行结果）压缩为一条摘要消息；压缩在线程池中进行，不占用LLM调用的关键路径
+"""
+
+import asyncio
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 摘要消息的标记，用于再次压缩时识别并合并旧摘要
+SUMMARY_PREFIX = "[较早对话摘要]"
+
+# 助手输出的工具调用JSON中的工具名，以及摘要行中记录的工具名（"调用：login、get_state"）
+_TOOL_NAME = re.compile(r'"tool"\s*:\s*"([^"]+)"')
+_SUMMARY_TOOLS = re.compile(r"调用：([^；\n]+)")
+
+# 每条消息的格式开销（role、分隔符等）
+MESSAGE_OVERHEAD = 4
+
+# 压缩到预算的这一比例，留出余量，避免之后每一轮都要再压缩
+COMPACT_TARGET_RATIO = 0.75
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    函数名称：estimate_tokens
+    功能描述：本地估算文本的token数，中日韩字符约1字1个token，其他字符约4字符1个token
+    参数说明：
+        - text：str，文本内容
+    返回值：int，估算的token数
+    """
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if '\u2e80' <= ch <= '\u9fff' or '\uf900' <= ch <= '\uffef')
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    """
+    函数名称：message_tokens
+    功能描述：估算单条消息的token数（含格式开销和函数调用模式下的tool_calls）
+    参数说明：
+        - message：Dict，对话消息
+    返回值：int，估算的token数
+    """
+    tokens = MESSAGE_OVERHEAD + estimate_tokens(message.get("content") or "")
+    for call in message.get("tool_calls") or ():
+        function = call.get("function") or {}
+        tokens += MESSAGE_OVERHEAD + estimate_tokens(function.get("name", "") + function.get("arguments", ""))
+    return tokens
+
+
+def _shorten(text: str, limit: int) -> str:
+    """截取文本的第一行，超过limit个字符时以省略号结尾"""
+    line = (text or "").strip().splitlines()[0] if (text or "").strip() else ""
+    return line if len(line) <= limit else line[:limit] + "…"
+
+
+def _call_names(message: Dict[str, Any]) -> List[str]:
+    """助手消息中的工具调用名称：函数调用模式的tool_calls或提示词模式的JSON文本"""
+    if message.get("tool_calls"):
+        return [(call.get("function") or {}).get("name", "") for call in message["tool_calls"]]
+    return _TOOL_NAME.findall(message.get("content") or "")
+
+
+def _split_turns(messages: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """按用户消息把对话切分为轮次，每轮以user消息开头"""
+    turns: List[List[Dict[str, Any]]] = []
+    for message in messages:
+        if message.get("role") == "user" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def summarize_turn(turn: List[Dict[str, Any]], limit: int = 60) -> str:
+    """
+    函数名称：summarize_turn
+    功能描述：把一轮对话压缩为一行摘要：用户输入、调用的工具名、工具执行结果和助手的最终回复，
+              助手的工具调用（JSON文本或tool_calls）只保留工具名（判断能否使用响应缓存时需要）
+    参数说明：
+        - turn：List[Dict]，一轮对话消息
+        - limit：int，每段内容保留的最大字符数
+    返回值：str，摘要文本
+    """
+    parts = []
+    tools: List[str] = []
+    for message in turn:
+        role = message.get("role")
+        content = message.get("content") or ""
+        if role == "user":
+            parts.append(f"用户：{_shorten(content, limit)}")
+        elif role in ("system", "tool"):
+            parts.append(_shorten(content, limit))
+        elif role == "assistant" and (message.get("tool_calls") or content.lstrip().startswith(("{", "["))):
+            tools += _call_names(message)
+        elif role == "assistant":
+            parts.append(f"助手：{_shorten(content, limit)}")
+    if tools:
+        parts.insert(1 if parts and parts[0].startswith("用户：") else 0, f"调用：{'、'.join(tools)}")
+    # 同一轮里可能有多次工具调用，助手的最终回复在最后，保留首尾更有信息量
+    if len(parts) > 4:
+        parts = parts[:2] + ["…"] + parts[-2:]
+    return "；".join(parts)
+
+
+def tool_names(messages: List[Dict[str, Any]]) -> List[str]:
+    """
+    函数名称：tool_names
+    功能描述：列出消息中出现过的工具调用：助手的工具调用（JSON文本或tool_calls）和摘要行中记录的工具名
+    参数说明：
+        - messages：List[Dict]，对话消息（不含系统提示词，其中的调用示例不是真实调用）
+    返回值：List[str]，工具名称（可能重复）
+    """
+    names: List[str] = []
+    for message in messages:
+        content = message.get("content") or ""
+        if message.get("role") == "assistant":
+            names += _call_names(message)
+        elif message.get("role") == "system" and content.startswith(SUMMARY_PREFIX):
+            for line in _SUMMARY_TOOLS.findall(content):
+                names += [name.strip() for name in line.split("、") if name.strip()]
+    return names
+
+
+def compact_messages(messages: List[Dict[str, Any]], max_tokens: int,
+                     keep_turns: int) -> List[Dict[str, Any]]:
+    """
+    函数名称：compact_messages
+    功能描述：压缩消息列表：保留系统提示词和最近keep_turns轮对话，更早的轮次合并为一条摘要消息；
+              仍超出预算时依次丢弃最旧的摘要行、缩小保留窗口（至少保留最近一轮）。
+              纯函数，不修改传入的消息，可在线程池中执行
+    参数说明：
+        - messages：List[Dict]，完整消息列表，第一条为系统提示词
+        - max_tokens：int，token预算
+        - keep_turns：int，原样保留的最近轮数
+    返回值：List[Dict]，压缩后的消息列表
+    """
+    if not messages:
+        return []
+    system, rest = messages[0], messages[1:]
+
+    summary_lines: List[str] = []
+    if rest and rest[0].get("role") == "system" and (rest[0].get("content") or "").startswith(SUMMARY_PREFIX):
+        summary_lines = rest[0]["content"].splitlines()[1:]
+        rest = rest[1:]
+
+    turns = _split_turns(rest)
+    keep_turns = max(keep_turns, 1)
+    old, recent = turns[:-keep_turns], turns[-keep_turns:]
+    summary_lines += [f"- {summarize_turn(turn)}" for turn in old]
+
+    def build() -> List[Dict[str, Any]]:
+        result = [system]
+        if summary_lines:
+            result.append({"role": "system",
+                           "content": "\n".join([SUMMARY_PREFIX] + summary_lines)})
+        for turn in recent:
+            result.extend(turn)
+        return result
+
+    result = build()
+    total = sum(message_tokens(m) for m in result)
+    while total > max_tokens and (summary_lines or len(recent) > 1):
+        if summary_lines:
+            summary_lines.pop(0)
+        else:
+            summary_lines.append(f"- {summarize_turn(recent.pop(0))}")
+        result = build()
+        total = sum(message_tokens(m) for m in result)
+    return result
+
+
+class ConversationHistory:
+    """
+    函数名称：ConversationHistory
+    功能描述：按token预算管理会话消息；一轮的回复追加完后，超出预算时在线程池中压缩历史
+              （此时用户通常还在输入），请求LLM前只合并已经完成的压缩结果，不等待压缩；
+              压缩期间新增的消息不会丢失
+    参数说明：
+        - system_message：str，系统提示词
+        - max_tokens：Optional[int]，token预算，默认读取CHAT_HISTORY_MAX_TOKENS（4000）
+        - keep_turns：Optional[int]，原样保留的最近轮数，默认读取CHAT_HISTORY_KEEP_TURNS（6）
+    返回值：ConversationHistory实例
+    """
+
+    def __init__(self, system_message: str, max_tokens: Optional[int] = None,
+                 keep_turns: Optional[int] = None) -> None:
+        if max_tokens is None:
+            max_tokens = int(os.getenv('CHAT_HISTORY_MAX_TOKENS', '4000'))
+        if keep_turns is None:
+            keep_turns = int(os.getenv('CHAT_HISTORY_KEEP_TURNS', '6'))
+        self.max_tokens = max_tokens
+        self.target_tokens = int(max_tokens * COMPACT_TARGET_RATIO)
+        self.keep_turns = keep_turns
+        self._messages: List[Dict[str, Any]] = [{"role": "system", "content": system_message}]
+        self._tokens = message_tokens(self._messages[0])
+        self._pending: Optional[asyncio.Future] = None
+        self._pending_len = 0
+        self._settled_len = 0
+        self.compactions = 0
+
+    @property
+    def messages(self) -> List[Dict[str, Any]]:
+        """当前消息列表（可能尚未合并进行中的压缩结果）"""
+        return self._messages
+
+    @property
+    def tokens(self) -> int:
+        """当前消息列表的估算token数"""
+        return self._tokens
+
+    def append(self, message: Dict[str, Any]) -> None:
+        """
+        函数名称：append
+        功能描述：追加一条消息；追加的是助手回复或工具结果且超出预算时在后台开始压缩，
+                  用户消息之后紧接着就要请求LLM，不在这时开始压缩
+        参数说明：
+            - message：Dict，对话消息
+        返回值：无
+        """
+        self._messages.append(message)
+        self._tokens += message_tokens(message)
+        if message.get("role") != "user" and self._pending is None and self._needs_compaction():
+            self._schedule_compaction()
+
+    def _needs_compaction(self) -> bool:
+        """超出预算，且上次压缩后有新消息（否则再压缩也不会更小）"""
+        return self._tokens > self.max_tokens and len(self._messages) > self._settled_len
+
+    def _schedule_compaction(self) -> None:
+        """把当前消息的快照交给线程池压缩"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._apply(compact_messages(self._messages, self.target_tokens, self.keep_turns),
+                        len(self._messages))
+            return
+        self._pending_len = len(self._messages)
+        self._pending = loop.run_in_executor(
+            None, compact_messages, list(self._messages), self.target_tokens, self.keep_turns
+        )
+
+    def _apply(self, compacted: List[Dict[str, Any]], snapshot_len: int) -> None:
+        """用压缩结果替换快照部分，保留快照之后追加的消息"""
+        before = self._tokens
+        self._messages = compacted + self._messages[snapshot_len:]
+        self._tokens = sum(message_tokens(m) for m in self._messages)
+        self._settled_len = len(compacted)
+        self.compactions += 1
+        logger.info(f"对话历史已压缩: 约{before} → {self._tokens} tokens，共{len(self._messages)}条消息")
+
+    async def prepare(self) -> List[Dict[str, Any]]:
+        """
+        函数名称：prepare
+        功能描述：合并已完成的后台压缩，返回本次请求LLM使用的消息列表；
+                  压缩尚未完成时不等待，直接使用当前消息列表
+        参数说明：无
+        返回值：List[Dict]，消息列表
+        """
+        if self._pending is not None and self._pending.done():
+            pending, self._pending = self._pending, None
+            try:
+                compacted = await pending
+            except Exception as e:
+                logger.warning(f"对话历史压缩失败，保留完整历史: {e}")
+            else:
+                self._apply(compacted, self._pending_len)
+            # 压缩期间新增的消息可能又超出预算
+            if self._needs_compaction():
+                self._schedule_compaction()
+        return self._messages
@@ -34,6 +34,7 @@ async def check_mcp_server():
                     for tool in tools:
                         print(f"   🔧 {tool.get('name', 'Unknown')}: {tool.get('description', 'No description')}")
                     
+                    await mcp_client.close()
                     return True
                     
                 except Exception as e:
@@ -0,0 +1,247 @@
+"""
+LLM响应缓存模块
+按请求内容（模型、系统提示词哈希、最近若干轮消息、工具定义）的规范化哈希缓存LLM响应：
+内存层按LRU和TTL淘汰，可选的SQLite磁盘层在重启后仍然有效
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 每写入这么多条后清理一次磁盘层的过期记录
+_PRUNE_EVERY = 100
+
+
+@dataclass
+class CacheStats:
+    """
+    函数名称：CacheStats
+    功能描述：响应缓存统计
+    参数说明：无
+    返回值：CacheStats实例
+    """
+    hits: int = 0
+    misses: int = 0
+    memory_hits: int = 0
+    disk_hits: int = 0
+    stores: int = 0
+    evictions: int = 0
+    expired: int = 0
+    bypassed: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """可缓存请求中命中的比例"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        stats = asdict(self)
+        stats["hit_rate"] = round(self.hit_rate, 4)
+        return stats
+
+
+class CompletionCache:
+    """
+    函数名称：CompletionCache
+    功能描述：LLM响应的精确匹配缓存；键只取最近window_turns轮消息及其前一条助手回复，
+              更早的历史不参与匹配（同一条指令在长会话中也能命中）；
+              只回答追问的输入（如只输入密码"124"）连同上一轮的指令一起匹配，不会在别的上下文中命中
+    参数说明：
+        - max_entries：Optional[int]，内存层最多条数，默认读取LLM_CACHE_SIZE（256）
+        - ttl：Optional[float]，有效期秒数，默认读取LLM_CACHE_TTL（600）
+        - path：Optional[str]，SQLite磁盘层文件，默认读取LLM_CACHE_PATH，为空时只用内存
+        - window_turns：Optional[int]，参与匹配的最近轮数，默认读取LLM_CACHE_WINDOW_TURNS（2）
+    返回值：CompletionCache实例
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None,
+                 path: Optional[str] = None, window_turns: Optional[int] = None) -> None:
+        if max_entries is None:
+            max_entries = int(os.getenv('LLM_CACHE_SIZE', '256'))
+        if ttl is None:
+            ttl = float(os.getenv('LLM_CACHE_TTL', '600'))
+        if path is None:
+            path = os.getenv('LLM_CACHE_PATH') or None
+        if window_turns is None:
+            window_turns = int(os.getenv('LLM_CACHE_WINDOW_TURNS', '2'))
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.window_turns = max(window_turns, 1)
+        self.stats = CacheStats()
+
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if path:
+            self._open_db(path)
+
+    def _open_db(self, path: str) -> None:
+        """打开磁盘层并清理过期记录，失败时只用内存层"""
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS completions "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._db_prune()
+            logger.info(f"LLM响应缓存磁盘层: {path}")
+        except sqlite3.Error as e:
+            logger.warning(f"LLM响应缓存磁盘层不可用，只使用内存缓存: {e}")
+            self._db = None
+
+    def window(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        函数名称：window
+        功能描述：取参与匹配的最近window_turns轮消息（从倒数第window_turns条用户消息开始），
+                  前一条是助手回复时一并取出（用户的输入可能只是在回答它的追问）
+        参数说明：
+            - messages：List[Dict]，本次请求的消息列表
+        返回值：List[Dict]，最近几轮消息
+        """
+        starts = [i for i, m in enumerate(messages) if m.get("role") == "user"]
+        if not starts:
+            return messages[1:]
+        start = starts[-min(self.window_turns, len(starts))]
+        if start > 1 and messages[start - 1].get("role") == "assistant":
+            start -= 1
+        return messages[start:]
+
+    def key(self, model: str, messages: List[Dict[str, Any]],
+            tools: Optional[List[Dict[str, Any]]] = None) -> str:
+        """
+        函数名称：key
+        功能描述：计算请求的规范化哈希（键排序、紧凑分隔符，只保留role、content和tool_calls的函数名与参数；
+                  tool_call_id是本地生成的，不参与匹配）
+        参数说明：
+            - model：str，模型名称
+            - messages：List[Dict]，本次请求的消息列表，第一条为系统提示词
+            - tools：Optional[List[Dict]]，函数调用模式下的工具定义
+        返回值：str，SHA-256十六进制字符串
+        """
+        system = messages[0].get("content", "") if messages else ""
+        request = {
+            "model": model,
+            "system": hashlib.sha256(system.encode("utf-8")).hexdigest(),
+            "window": [self._canonical(m) for m in self.window(messages)],
+            "tools": tools or [],
+        }
+        canonical = json.dumps(request, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _canonical(message: Dict[str, Any]) -> Dict[str, Any]:
+        canonical = {"role": message.get("role"), "content": message.get("content")}
+        if message.get("tool_calls"):
+            canonical["tool_calls"] = [call.get("function") for call in message["tool_calls"]]
+        return canonical
+
+    def _expired(self, stored_at: float) -> bool:
+        return time.time() - stored_at >= self.ttl
+
+    async def get(self, key: str) -> Optional[str]:
+        """
+        函数名称：get
+        功能描述：查询缓存，先查内存层再查磁盘层，磁盘层命中的记录放回内存层
+        参数说明：
+            - key：str，请求哈希
+        返回值：str或None，缓存的响应
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, stored_at = entry
+            if not self._expired(stored_at):
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                self.stats.memory_hits += 1
+                return value
+            del self._entries[key]
+            self.stats.expired += 1
+        elif self._db is not None:
+            row = await asyncio.get_running_loop().run_in_executor(None, self._db_get, key)
+            if row is not None:
+                value, stored_at = row
+                if not self._expired(stored_at):
+                    self._remember(key, value, stored_at)
+                    self.stats.hits += 1
+                    self.stats.disk_hits += 1
+                    return value
+                self.stats.expired += 1
+        self.stats.misses += 1
+        return None
+
+    async def put(self, key: str, value: str) -> None:
+        """
+        函数名称：put
+        功能描述：写入缓存，内存层超过上限时淘汰最久未使用的记录；磁盘层写入在线程池中进行
+        参数说明：
+            - key：str，请求哈希
+            - value：str，LLM响应
+        返回值：无
+        """
+        stored_at = time.time()
+        self._remember(key, value, stored_at)
+        self.stats.stores += 1
+        if self._db is not None:
+            prune = self.stats.stores % _PRUNE_EVERY == 0
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._db_put, key, value, stored_at, prune
+            )
+
+    def _remember(self, key: str, value: str, stored_at: float) -> None:
+        self._entries[key] = (value, stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def _db_get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._db_lock:
+            try:
+                return self._db.execute(
+                    "SELECT value, stored_at FROM completions WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"读取LLM响应缓存失败: {e}")
+                return None
+
+    def _db_put(self, key: str, value: str, stored_at: float, prune: bool) -> None:
+        with self._db_lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO completions (key, value, stored_at) VALUES (?, ?, ?)",
+                    (key, value, stored_at),
+                )
+                if prune:
+                    self._db_prune()
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"写入LLM响应缓存失败: {e}")
+
+    def _db_prune(self) -> None:
+        """删除过期记录（调用方持有锁或处于初始化阶段）"""
+        self._db.execute("DELETE FROM completions WHERE stored_at < ?", (time.time() - self.ttl,))
+        self._db.commit()
+
+    def close(self) -> None:
+        """
+        函数名称：close
+        功能描述：关闭磁盘层
+        参数说明：无
+        返回值：无
+        """
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
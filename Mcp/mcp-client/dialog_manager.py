@@ -0,0 +1,237 @@
+"""
+本地多轮补全模块
+用户只说了"登录"或只给了账号时，按工具缓存的inputSchema在本地追问缺少的必填参数，
+跨轮次记录已填写的参数，参数齐全后立即执行，整个过程不经过LLM
+"""
+
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+
+from intent_router import normalize
+
+logger = logging.getLogger(__name__)
+
+# 触发多轮补全的指令；只有必填参数的工具需要（无参数工具由IntentRouter直接处理）
+DEFAULT_TRIGGERS: Dict[str, str] = {
+    "login": r"登录|登陆",
+}
+
+# 参数在中文里的叫法，第一个用于追问；未列出的参数用schema中的description或参数名
+DEFAULT_LABELS: Dict[str, Tuple[str, ...]] = {
+    "account": ("账号", "账户", "用户名", "用户"),
+    "password": ("密码",),
+}
+
+# 参数值：到空白、中文或中文标点为止
+_VALUE = r"(?P<value>[^\s，,。；;\u2e80-\u9fff\uff00-\uffef]+)"
+# 去掉指令词和参数后剩下的只能是这些字，否则说明用户在问别的事（如"登录失败怎么办"）
+_FILLER = re.compile(r"[我要想请帮麻烦给一下的吧呢啊用以，,。.!！?？:：\s]+")
+_CANCEL = re.compile(r"(?:取消|算了|不用了|不登录了|退出登录流程)")
+
+
+@dataclass
+class DialogStep:
+    """
+    函数名称：DialogStep
+    功能描述：多轮补全的一步：参数齐全时complete为True，否则reply为追问（或取消提示）
+    参数说明：无
+    返回值：DialogStep实例
+    """
+    tool: str
+    arguments: Dict[str, Any]
+    complete: bool = False
+    reply: Optional[str] = None
+
+
+@dataclass
+class DialogStats:
+    """多轮补全统计"""
+    started: int = 0
+    prompts: int = 0
+    completed: int = 0
+    cancelled: int = 0
+    abandoned: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+
+@dataclass
+class _PendingCall:
+    tool: str
+    schema: Dict[str, Any]
+    arguments: Dict[str, Any] = field(default_factory=dict)
+    asking: Optional[str] = None
+
+
+class SlotFillingDialog:
+    """
+    函数名称：SlotFillingDialog
+    功能描述：由工具inputSchema驱动的本地多轮补全状态机：
+              start()识别不完整的指令并追问，resume()用下一轮输入填写参数，
+              输入无法作为参数时放弃补全，交回IntentRouter/LLM处理
+    参数说明：
+        - mcp_client：MCPClient，提供工具目录缓存（get_tool/validate_arguments）
+        - triggers：Optional[Dict[str, str]]，工具名到触发正则的映射，默认DEFAULT_TRIGGERS
+        - labels：Optional[Dict[str, Tuple[str]]]，参数名到中文叫法的映射，默认DEFAULT_LABELS
+    返回值：SlotFillingDialog实例
+    """
+
+    def __init__(self, mcp_client, triggers: Optional[Dict[str, str]] = None,
+                 labels: Optional[Dict[str, Tuple[str, ...]]] = None) -> None:
+        self.mcp_client = mcp_client
+        self.triggers: Dict[str, Pattern] = {
+            tool: re.compile(pattern) for tool, pattern in (triggers or DEFAULT_TRIGGERS).items()
+        }
+        self.labels = DEFAULT_LABELS if labels is None else labels
+        self.stats = DialogStats()
+        self._pending: Optional[_PendingCall] = None
+
+    @property
+    def active(self) -> bool:
+        """是否有等待补全的工具调用"""
+        return self._pending is not None
+
+    def cancel(self) -> None:
+        """
+        函数名称：cancel
+        功能描述：放弃当前等待补全的工具调用
+        参数说明：无
+        返回值：无
+        """
+        self._pending = None
+
+    def _label(self, name: str, schema: Dict[str, Any]) -> str:
+        """追问时使用的参数叫法"""
+        if name in self.labels:
+            return self.labels[name][0]
+        prop = schema.get("properties", {}).get(name, {})
+        return prop.get("description") or name
+
+    def _slot_pattern(self, name: str) -> Pattern:
+        """匹配"账号是wyx""password: 124"这类带叫法的参数"""
+        names = sorted(set(self.labels.get(name, ())) | {name}, key=len, reverse=True)
+        alternatives = "|".join(re.escape(n) for n in names)
+        return re.compile(rf"(?:{alternatives})\s*(?:[:：是为]\s*)?{_VALUE}", re.IGNORECASE)
+
+    def _extract(self, text: str, schema: Dict[str, Any]) -> Tuple[Dict[str, str], str]:
+        """提取带叫法的参数，返回(参数, 去掉这些参数后的剩余文本)"""
+        values: Dict[str, str] = {}
+        for name in schema.get("properties", {}):
+            m = self._slot_pattern(name).search(text)
+            if m:
+                values[name] = m.group("value")
+                text = text[:m.start()] + " " + text[m.end():]
+        return values, text
+
+    @staticmethod
+    def _convert(value: str, prop: Dict[str, Any]) -> Any:
+        """按schema类型转换参数值，无法转换时抛出ValueError"""
+        kind = prop.get("type")
+        if kind == "integer":
+            return int(value)
+        if kind == "number":
+            return float(value)
+        if kind == "boolean":
+            if value.lower() in ("true", "1", "yes", "是"):
+                return True
+            if value.lower() in ("false", "0", "no", "否"):
+                return False
+            raise ValueError(value)
+        return value
+
+    def _missing(self, pending: _PendingCall) -> List[str]:
+        return [name for name in pending.schema.get("required", []) if name not in pending.arguments]
+
+    def _fill(self, pending: _PendingCall, values: Dict[str, str]) -> Optional[str]:
+        """写入参数，返回类型不符的参数名"""
+        properties = pending.schema.get("properties", {})
+        for name, value in values.items():
+            try:
+                pending.arguments[name] = self._convert(value, properties.get(name, {}))
+            except ValueError:
+                return name
+        return None
+
+    def _next_step(self, pending: _PendingCall, invalid: Optional[str] = None) -> DialogStep:
+        """参数齐全时结束补全，否则追问下一个缺少的参数"""
+        missing = self._missing(pending)
+        if invalid is None and not missing:
+            self._pending = None
+            self.stats.completed += 1
+            return DialogStep(pending.tool, dict(pending.arguments), complete=True)
+        pending.asking = invalid or missing[0]
+        self.stats.prompts += 1
+        label = self._label(pending.asking, pending.schema)
+        reply = f"{label}格式不正确，请重新输入{label}" if invalid else f"请输入{label}"
+        return DialogStep(pending.tool, dict(pending.arguments), reply=reply)
+
+    async def start(self, text: str) -> Optional[DialogStep]:
+        """
+        函数名称：start
+        功能描述：识别缺少必填参数的指令（如"登录""登录账号wyx"）并开始补全
+        参数说明：
+            - text：str，用户输入
+        返回值：DialogStep或None，不是可补全的指令时返回None
+        """
+        # 参数从原文提取（只去掉客套词），句尾的标点可能是密码的一部分
+        verbatim = normalize(text, strip_suffix=False)
+        hits = [(tool, pattern.search(verbatim)) for tool, pattern in self.triggers.items()]
+        hits = [(tool, m) for tool, m in hits if m]
+        if len(hits) != 1:
+            return None
+        tool_name, trigger = hits[0]
+        tool = await self.mcp_client.get_tool(tool_name)
+        if tool is None:
+            return None
+        schema = tool.get("inputSchema") or {}
+        if not schema.get("required"):
+            return None
+
+        rest = verbatim[:trigger.start()] + " " + verbatim[trigger.end():]
+        values, rest = self._extract(rest, schema)
+        if _FILLER.sub("", normalize(rest)):
+            # 除了指令和参数还有别的内容，可能是提问，交给LLM
+            return None
+
+        pending = _PendingCall(tool_name, schema)
+        invalid = self._fill(pending, values)
+        self.stats.started += 1
+        self._pending = pending
+        step = self._next_step(pending, invalid)
+        if not step.complete:
+            logger.info(f"💬 本地补全 {tool_name} 参数，已有: {list(pending.arguments)}")
+        return step
+
+    async def resume(self, text: str) -> Optional[DialogStep]:
+        """
+        函数名称：resume
+        功能描述：用本轮输入填写等待补全的参数；输入是取消时结束补全，
+                  既不带叫法也不是单个参数值时放弃补全并返回None
+        参数说明：
+            - text：str，用户输入
+        返回值：DialogStep或None
+        """
+        pending = self._pending
+        if pending is None:
+            return None
+        normalized = normalize(text)
+        if _CANCEL.fullmatch(normalized):
+            self._pending = None
+            self.stats.cancelled += 1
+            return DialogStep(pending.tool, dict(pending.arguments), reply="好的，已取消")
+
+        answer = text.strip()
+        if pending.asking and re.fullmatch(_VALUE, answer):
+            # 直接回答了追问的参数，如只输入"124"（不做归一化，密码末尾的标点要保留）
+            return self._next_step(pending, self._fill(pending, {pending.asking: answer}))
+
+        values, rest = self._extract(normalize(text, strip_suffix=False), pending.schema)
+        if not values or _FILLER.sub("", normalize(rest)):
+            self._pending = None
+            self.stats.abandoned += 1
+            logger.info(f"本地补全已放弃，交给LLM处理: {text}")
+            return None
+        return self._next_step(pending, self._fill(pending, values))
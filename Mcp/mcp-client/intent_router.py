@@ -0,0 +1,198 @@
+"""
+本地意图识别模块
+用规则匹配常见的QT控制指令（登录、点击测试按钮、查看状态），直接得到工具名和参数，
+不经过LLM；只有整句被某一条规则完整匹配时才算命中，其余情况交给LLM处理
+"""
+
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 账号、密码只接受ASCII字符，避免把"密码""登录"等中文词吞进参数；
+# 密码取最短匹配，句尾的"，登录"不会被当作密码的一部分
+_ACCOUNT = r"(?P<account>[A-Za-z0-9_@.\-]+)"
+_PASSWORD = r"(?P<password>[\x21-\x7e]+?)"
+_LOGIN = r"(?:登录|登陆)"
+_SEP = r"\s*[，,]?\s*"
+_IS = r"\s*(?:[:：是为]\s*)?"
+
+# 句首的客套词和句尾的语气词、客套话、标点在匹配前去掉；客套话前可以有逗号或空格（"查看状态，谢谢"）
+_PREFIX = re.compile(r"^(?:请你|请|麻烦|帮我|帮忙|给我)+")
+_SUFFIX = re.compile(
+    r"(?:[\s，,]*(?:一下|吧|吗|呢|啊|呀|哦|谢谢你|谢谢啦|谢谢|谢啦|多谢|感谢|辛苦了)[\s。.!！?？~～]*)*"
+    r"[\s。.!！?？~～，,]*$"
+)
+
+
+@dataclass(frozen=True)
+class IntentRule:
+    """
+    函数名称：IntentRule
+    功能描述：一条意图规则：整句匹配任一模式即得到工具调用，命名分组作为工具参数
+    参数说明：
+        - tool：str，MCP工具名称
+        - patterns：Tuple[Pattern]，整句匹配的正则表达式
+        - arguments：Dict，固定参数（与命名分组合并）
+    返回值：IntentRule实例
+    """
+    tool: str
+    patterns: Tuple[Pattern, ...]
+    arguments: Dict[str, Any] = field(default_factory=dict)
+
+    def match(self, text: str) -> Optional[Dict[str, Any]]:
+        """
+        函数名称：match
+        功能描述：整句匹配，返回工具参数
+        参数说明：
+            - text：str，归一化后的用户输入（可保留句尾）
+        返回值：Dict或None，匹配成功时返回工具参数
+        """
+        for pattern in self.patterns:
+            m = pattern.fullmatch(text)
+            if m:
+                return {**self.arguments, **m.groupdict()}
+        return None
+
+
+def _rule(tool: str, *patterns: str, **arguments: Any) -> IntentRule:
+    return IntentRule(tool, tuple(re.compile(p, re.IGNORECASE) for p in patterns), arguments)
+
+
+DEFAULT_RULES: Tuple[IntentRule, ...] = (
+    _rule(
+        "login",
+        # 登录账号wyx密码124 / 登录 账号: wyx, 密码: 124 / 用账号wyx密码124登录
+        rf"(?:用)?{_LOGIN}?\s*(?:账号|账户|用户名|用户){_IS}{_ACCOUNT}{_SEP}(?:的)?密码{_IS}{_PASSWORD}(?:{_SEP}{_LOGIN})?",
+        # 登录账号 wyx 124（start()里提示的格式）
+        rf"{_LOGIN}\s*(?:账号|账户|用户名)?\s+{_ACCOUNT}\s+{_PASSWORD}",
+        # 以wyx登录，密码124
+        rf"(?:以|用){_ACCOUNT}\s*{_LOGIN}{_SEP}密码{_IS}{_PASSWORD}",
+    ),
+    _rule(
+        "test_button",
+        r"(?:点击|点|按|按下)?(?:一下)?测试按钮",
+        r"(?:点击|点)?(?:一下)?测试",
+        r"测试一下按钮",
+        r"按钮测试",
+    ),
+    _rule(
+        "get_state",
+        r"(?:查看|获取|查询|看|看看|看一下|显示)?(?:一下)?(?:当前|应用|应用程序|程序|QT|Qt)?(?:的)?状态",
+        r"状态查询",
+    ),
+)
+
+
+@dataclass
+class IntentMatch:
+    """本地识别出的工具调用"""
+    tool: str
+    arguments: Dict[str, Any]
+
+
+@dataclass
+class IntentStats:
+    """
+    函数名称：IntentStats
+    功能描述：本地意图识别的命中统计
+    参数说明：无
+    返回值：IntentStats实例
+    """
+    requests: int = 0
+    hits: int = 0
+    misses: int = 0
+    ambiguous: int = 0
+    rejected: int = 0
+    per_tool: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def hit_rate(self) -> float:
+        """本地直接执行的请求占比"""
+        return self.hits / self.requests if self.requests else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "hits": self.hits,
+            "misses": self.misses,
+            "ambiguous": self.ambiguous,
+            "rejected": self.rejected,
+            "hit_rate": round(self.hit_rate, 4),
+            "per_tool": dict(self.per_tool),
+        }
+
+
+def normalize(text: str, strip_suffix: bool = True) -> str:
+    """
+    函数名称：normalize
+    功能描述：归一化用户输入：去掉首尾空白、客套词、语气词和句尾标点，合并连续空白
+    参数说明：
+        - text：str，用户输入或语音识别结果
+        - strip_suffix：bool，False时保留句尾的语气词和标点（它们可能是密码等参数的一部分）
+    返回值：str，归一化后的文本
+    """
+    text = _PREFIX.sub("", re.sub(r"\s+", " ", text.strip()))
+    if strip_suffix:
+        text = _SUFFIX.sub("", text)
+    return text.strip()
+
+
+class IntentRouter:
+    """
+    函数名称：IntentRouter
+    功能描述：本地意图路由：规则唯一命中且参数通过工具schema检查时直接给出工具调用，
+              无命中、命中多条规则或参数不合法时返回None，由LLM处理
+    参数说明：
+        - rules：Optional[Tuple[IntentRule]]，意图规则，默认DEFAULT_RULES
+    返回值：IntentRouter实例
+    """
+
+    def __init__(self, rules: Optional[Tuple[IntentRule, ...]] = None) -> None:
+        self.rules = DEFAULT_RULES if rules is None else rules
+        self.stats = IntentStats()
+
+    def match(self, text: str,
+              validate: Optional[Callable[[str, Dict[str, Any]], Optional[str]]] = None) -> Optional[IntentMatch]:
+        """
+        函数名称：match
+        功能描述：识别用户输入对应的工具调用
+        参数说明：
+            - text：str，用户输入
+            - validate：Optional[Callable]，参数检查函数(tool, arguments) -> 错误说明或None，
+                        通常为MCPClient.validate_arguments（工具不在目录中也会返回错误）
+        返回值：IntentMatch或None，None表示交给LLM处理
+        """
+        self.stats.requests += 1
+        # 先用保留句尾的文本匹配，参数取原文（"密码abc123!"的"!"属于密码）；
+        # 不匹配时再去掉句尾的语气词和标点匹配
+        verbatim = normalize(text, strip_suffix=False)
+        normalized = normalize(text)
+        candidates: List[IntentMatch] = []
+        for rule in self.rules:
+            arguments = rule.match(verbatim)
+            if arguments is None and normalized != verbatim:
+                arguments = rule.match(normalized)
+            if arguments is not None:
+                candidates.append(IntentMatch(rule.tool, arguments))
+
+        if not candidates:
+            self.stats.misses += 1
+            return None
+        if len({c.tool for c in candidates}) > 1:
+            self.stats.ambiguous += 1
+            logger.info(f"本地意图不唯一，交给LLM处理: {[c.tool for c in candidates]}")
+            return None
+
+        match = candidates[0]
+        if validate is not None:
+            error = validate(match.tool, match.arguments)
+            if error:
+                self.stats.rejected += 1
+                logger.info(f"本地意图参数不符合工具定义，交给LLM处理: {match.tool}: {error}")
+                return None
+        self.stats.hits += 1
+        self.stats.per_tool[match.tool] = self.stats.per_tool.get(match.tool, 0) + 1
+        return match
@@ -1,14 +1,31 @@
 import asyncio
+import itertools
 import json
 import logging
 import os
-from typing import List, Dict, Any
+import re
+import time
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from pathlib import Path
 import httpx
-from openai import OpenAI
+from openai import AsyncOpenAI
 from fastmcp import Client
+from fastmcp.exceptions import ToolError
+from mcp import types as mcp_types
 from dotenv import load_dotenv
 
+from chat_history import ConversationHistory, tool_names
+from completion_cache import CompletionCache
+from intent_router import IntentRouter
+from dialog_manager import SlotFillingDialog, DialogStep
+from semantic_cache import SemanticToolCache, NUMPY_AVAILABLE
+from response_renderer import ResponseRenderer
+
+try:
+    import h2  # noqa: F401  httpx的HTTP/2支持依赖h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -18,51 +35,269 @@ logger = logging.getLogger(__name__)
 class MCPClient:
     """
     函数名称：MCPClient
-    功能描述：MCP客户端，负责连接MCP服务器并执行工具调用
+    功能描述：MCP客户端，负责连接MCP服务器并执行工具调用；
+              整个会话期间保持一个长连接（SSE流和initialize握手只做一次），失败后下次调用自动重建
     参数说明：无构造参数
     返回值：MCPClient实例
     """
     
-    def __init__(self):
+    # JSON Schema类型与Python类型的对应，用于本地参数检查
+    _SCHEMA_TYPES = {
+        "string": str,
+        "integer": int,
+        "number": (int, float),
+        "boolean": bool,
+        "object": dict,
+        "array": list,
+    }
+    
+    def __init__(self, tools_ttl: Optional[float] = None):
         self.client = None
         self.server_url = None
+        self._connected = False
+        self._session_lock: Optional[asyncio.Lock] = None
+        # 工具目录缓存：名称 -> 工具定义（含inputSchema），服务器发出tools/list_changed通知或超过TTL后失效
+        self.tools_ttl = tools_ttl if tools_ttl is not None else float(os.getenv('MCP_TOOLS_TTL', '300'))
+        self._tools: Dict[str, Dict[str, Any]] = {}
+        self._tools_loaded_at: Optional[float] = None
         
     async def connect_to_server(self, server_url: str):
         """
         函数名称：connect_to_server
-        功能描述：连接到FastMCP服务器
+        功能描述：连接到FastMCP服务器并建立长连接会话
         参数说明：
             - server_url：str，MCP服务器SSE地址
         返回值：无
         """
         self.server_url = server_url
         # 使用FastMCP Client连接到SSE服务器
-        self.client = Client(server_url + "/sse")
-        logger.info(f"Prepared FastMCP client for {server_url}")
+        self.client = Client(server_url + "/sse", message_handler=self._handle_message)
+        try:
+            await self._ensure_session()
+            logger.info(f"Connected to FastMCP server {server_url}")
+            await self.list_tools(refresh=True)
+        except Exception as e:
+            # 服务器暂不可用时不报错，首次调用工具时会再次尝试
+            logger.warning(f"MCP session not established yet, will retry on first call: {e}")
+    
+    async def _ensure_session(self) -> Client:
+        """
+        函数名称：_ensure_session
+        功能描述：返回已建立的会话，会话不存在或已断开时重新建立
+        参数说明：无
+        返回值：Client，处于连接状态的FastMCP客户端
+        """
+        if not self.client:
+            raise Exception("Not connected to MCP server")
+        if self._session_lock is None:
+            self._session_lock = asyncio.Lock()
+        async with self._session_lock:
+            if self._connected and self.client.is_connected():
+                return self.client
+            if self._connected:
+                logger.info("MCP session lost, reconnecting")
+                await self._close_session()
+                # 服务器可能已重启，工具列表需要重新获取
+                self.invalidate_tools()
+            await self.client.__aenter__()
+            self._connected = True
+            return self.client
+    
+    async def _close_session(self):
+        """
+        函数名称：_close_session
+        功能描述：关闭当前会话，忽略已断开连接上的错误
+        参数说明：无
+        返回值：无
+        """
+        if not self._connected:
+            return
+        self._connected = False
+        try:
+            await self.client.__aexit__(None, None, None)
+        except Exception as e:
+            logger.debug(f"Error closing MCP session: {e}")
+    
+    async def _on_call_error(self, error: Exception):
+        """
+        函数名称：_on_call_error
+        功能描述：调用失败时判断会话是否还可用，不可用则关闭，下次调用重新建立
+        参数说明：
+            - error：Exception，调用抛出的异常
+        返回值：无
+        """
+        # 工具自身返回的错误不影响会话
+        if isinstance(error, ToolError):
+            return
+        await self._close_session()
         
-    async def list_tools(self) -> List[Dict[str, Any]]:
+    async def _handle_message(self, message: Any):
         """
-        函数名称：list_tools
-        功能描述：获取MCP服务器提供的工具列表
+        函数名称：_handle_message
+        功能描述：处理服务器主动发来的消息，工具列表变化时使目录缓存失效
+        参数说明：
+            - message：服务器请求、通知或异常
+        返回值：无
+        """
+        if (isinstance(message, mcp_types.ServerNotification)
+                and isinstance(message.root, mcp_types.ToolListChangedNotification)):
+            logger.info("Server tool list changed, invalidating tool catalog")
+            self.invalidate_tools()
+    
+    def invalidate_tools(self):
+        """
+        函数名称：invalidate_tools
+        功能描述：使工具目录缓存失效，下次查询时重新获取
+        参数说明：无
+        返回值：无
+        """
+        self._tools_loaded_at = None
+    
+    def _tools_fresh(self) -> bool:
+        """
+        函数名称：_tools_fresh
+        功能描述：判断工具目录缓存是否仍然有效
         参数说明：无
+        返回值：bool，缓存有效返回True
+        """
+        if self._tools_loaded_at is None:
+            return False
+        return time.monotonic() - self._tools_loaded_at < self.tools_ttl
+        
+    async def list_tools(self, refresh: bool = False) -> List[Dict[str, Any]]:
+        """
+        函数名称：list_tools
+        功能描述：获取MCP服务器提供的工具列表，优先使用目录缓存（会话失效时重建会话并重试一次）
+        参数说明：
+            - refresh：bool，为True时忽略缓存，重新向服务器获取
         返回值：List[Dict]，工具列表
         """
         if not self.client:
             raise Exception("Not connected to MCP server")
-            
-        try:
-            async with self.client as client:
+        if not refresh and self._tools_fresh():
+            return list(self._tools.values())
+        
+        for attempt in range(2):
+            try:
+                client = await self._ensure_session()
                 tools = await client.list_tools()
                 # 转换为字典格式
-                return [tool.model_dump() for tool in tools]
-        except Exception as e:
-            logger.error(f"Error listing tools: {e}")
-            return []
+                self._tools = {tool.name: tool.model_dump() for tool in tools}
+                self._tools_loaded_at = time.monotonic()
+                return list(self._tools.values())
+            except Exception as e:
+                await self._on_call_error(e)
+                if attempt == 0 and not self._connected:
+                    continue
+                logger.error(f"Error listing tools: {e}")
+                return []
+        return []
+            
+    async def get_tool(self, tool_name: str) -> Optional[Dict[str, Any]]:
+        """
+        函数名称：get_tool
+        功能描述：按名称查找工具定义，缓存有效时不访问服务器
+        参数说明：
+            - tool_name：str，工具名称
+        返回值：Dict或None，工具定义（含inputSchema、annotations），不存在时返回None
+        """
+        if not self._tools_fresh():
+            await self.list_tools(refresh=True)
+        return self._tools.get(tool_name)
+    
+    def tool_names(self) -> List[str]:
+        """
+        函数名称：tool_names
+        功能描述：返回目录缓存中的工具名称
+        参数说明：无
+        返回值：List[str]，工具名称列表
+        """
+        return list(self._tools)
+    
+    def is_idempotent(self, tool_name: str) -> bool:
+        """
+        函数名称：is_idempotent
+        功能描述：按目录缓存中的工具注解判断工具是否只读或幂等（重复执行结果相同）
+        参数说明：
+            - tool_name：str，工具名称
+        返回值：bool，只读或幂等时返回True，未知工具返回False
+        """
+        tool = self._tools.get(tool_name)
+        annotations = (tool or {}).get('annotations') or {}
+        return bool(annotations.get('readOnlyHint') or annotations.get('idempotentHint'))
+    
+    def is_read_only(self, tool_name: str) -> bool:
+        """
+        函数名称：is_read_only
+        功能描述：按目录缓存中的工具注解判断工具是否只读（不改变Qt应用状态）
+        参数说明：
+            - tool_name：str，工具名称
+        返回值：bool，只读时返回True，未知工具返回False
+        """
+        tool = self._tools.get(tool_name)
+        annotations = (tool or {}).get('annotations') or {}
+        return bool(annotations.get('readOnlyHint'))
+    
+    async def function_tools(self) -> List[Dict[str, Any]]:
+        """
+        函数名称：function_tools
+        功能描述：把目录缓存中的工具转换为OpenAI函数调用格式，作为LLM请求的tools参数
+        参数说明：无
+        返回值：List[Dict]，[{"type": "function", "function": {name, description, parameters}}]
+        """
+        if not self._tools_fresh():
+            await self.list_tools(refresh=True)
+        return [
+            {
+                "type": "function",
+                "function": {
+                    "name": name,
+                    "description": tool.get('description') or "",
+                    "parameters": tool.get('inputSchema') or {"type": "object", "properties": {}},
+                },
+            }
+            for name, tool in self._tools.items()
+        ]
+    
+    def validate_arguments(self, tool_name: str, arguments: Dict[str, Any]) -> Optional[str]:
+        """
+        函数名称：validate_arguments
+        功能描述：按缓存的inputSchema在本地检查工具参数（必填项、类型、不允许的额外参数）
+        参数说明：
+            - tool_name：str，工具名称
+            - arguments：Dict，工具参数
+        返回值：str或None，参数有误时返回错误说明，正确时返回None
+        """
+        tool = self._tools.get(tool_name)
+        if tool is None:
+            return f"未知工具: {tool_name}"
+        if not isinstance(arguments, dict):
+            return "arguments必须是JSON对象"
+        schema = tool.get('inputSchema') or {}
+        properties = schema.get('properties', {})
+        
+        missing = [name for name in schema.get('required', []) if name not in arguments]
+        if missing:
+            return f"缺少必填参数: {', '.join(missing)}"
+        if schema.get('additionalProperties') is False:
+            unknown = [name for name in arguments if name not in properties]
+            if unknown:
+                return f"未知参数: {', '.join(unknown)}"
+        for name, value in arguments.items():
+            schema_type = properties.get(name, {}).get('type')
+            expected = self._SCHEMA_TYPES.get(schema_type)
+            if expected is None or (isinstance(value, str) and schema_type != 'string'):
+                # 服务器端会把"5"、"true"之类的字符串转换为数字/布尔值，这里不拦截
+                continue
+            # bool是int的子类，需单独排除
+            if not isinstance(value, expected) or (isinstance(value, bool) and expected is not bool):
+                return f"参数 {name} 类型应为 {schema_type}"
+        return None
             
     async def execute_tool(self, tool_name: str, arguments: Dict[str, Any]) -> str:
         """
         函数名称：execute_tool
-        功能描述：执行MCP工具
+        功能描述：执行MCP工具（不自动重试，避免重复执行有副作用的工具；失效的会话在下次调用时重建）
         参数说明：
             - tool_name：str，工具名称
             - arguments：Dict，工具参数
@@ -72,16 +307,27 @@ class MCPClient:
             raise Exception("Not connected to MCP server")
             
         try:
-            async with self.client as client:
-                result = await client.call_tool(tool_name, arguments)
-                if hasattr(result, 'content') and result.content:
-                    return result.content[0].text if result.content else 'No result'
-                else:
-                    return str(result)
+            client = await self._ensure_session()
+            result = await client.call_tool(tool_name, arguments)
+            if hasattr(result, 'content') and result.content:
+                return result.content[0].text if result.content else 'No result'
+            else:
+                return str(result)
         except Exception as e:
+            await self._on_call_error(e)
             error_msg = f"Error executing tool {tool_name}: {str(e)}"
             logger.error(error_msg)
             return error_msg
+    
+    async def close(self):
+        """
+        函数名称：close
+        功能描述：关闭长连接会话
+        参数说明：无
+        返回值：无
+        """
+        if self.client:
+            await self._close_session()
             
     async def cleanup(self):
         """
@@ -90,64 +336,374 @@ class MCPClient:
         参数说明：无
         返回值：无
         """
-        # FastMCP Client使用上下文管理器，无需手动清理
+        await self.close()
         logger.info("MCP client cleanup completed")
 
 
+class ToolCallDetector:
+    """
+    函数名称：ToolCallDetector
+    功能描述：增量检测LLM流式输出中的工具调用JSON；
+              {"tool": ..., "arguments": ...} 对象（或由这类对象组成的数组）一旦语法完整即可判定，无需等待后续token；
+              以 {、[ 或 ``` 开头的输出视为工具调用候选不回显，其他输出视为普通文本逐段回显
+    参数说明：无构造参数
+    返回值：ToolCallDetector实例
+    """
+
+    def __init__(self) -> None:
+        self.buffer = ""
+        self.mode: Optional[str] = None  # None未判定 / "json" / "text"
+        self.tool_call: Optional[str] = None
+        self._pos = 0
+        self._start = -1
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, delta: str) -> str:
+        """
+        函数名称：feed
+        功能描述：追加一段输出并继续扫描，检测到完整工具调用后保存到tool_call
+        参数说明：
+            - delta：str，新收到的文本片段
+        返回值：str，应回显到终端的文本（工具调用候选返回空串）
+        """
+        self.buffer += delta
+        echo = ""
+        if self.mode is None:
+            head = self.buffer.lstrip()
+            if head and (head[0] in "{[" or head.startswith("```")):
+                self.mode = "json"
+            elif head and not "```".startswith(head[:3]):
+                self.mode = "text"
+                echo = head
+        elif self.mode == "text":
+            echo = delta
+        if self.tool_call is None:
+            self._scan()
+        return echo
+
+    def _scan(self) -> None:
+        """按括号深度扫描新增字符（忽略字符串内的括号），找到完整的工具调用对象或数组即停止"""
+        buffer = self.buffer
+        i = self._pos
+        while i < len(buffer):
+            c = buffer[i]
+            i += 1
+            if self._start < 0:
+                if c in "{[":
+                    self._start, self._depth = i - 1, 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c in "{[":
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    start, self._start = self._start, -1
+                    candidate = buffer[start:i]
+                    try:
+                        parsed = json.loads(candidate)
+                    except json.JSONDecodeError:
+                        if candidate[0] == "[":
+                            # 如"[注意 {...}]"，从[之后重新扫描，其中的工具调用对象仍能识别
+                            i = start + 1
+                        continue
+                    if _is_tool_calls(parsed):
+                        self.tool_call = candidate
+                        self._pos = i
+                        return
+                    if candidate[0] == "[":
+                        i = start + 1
+        self._pos = len(buffer)
+
+
+def _is_tool_calls(parsed: Any) -> bool:
+    """
+    函数名称：_is_tool_calls
+    功能描述：判断解析出的JSON是否为工具调用：含tool字段的对象，或由这类对象组成的非空数组
+    参数说明：
+        - parsed：Any，json.loads的结果
+    返回值：bool，是工具调用时返回True
+    """
+    if isinstance(parsed, list):
+        return bool(parsed) and all(isinstance(c, dict) and "tool" in c for c in parsed)
+    return isinstance(parsed, dict) and "tool" in parsed
+
+
+class StreamPrinter:
+    """
+    函数名称：StreamPrinter
+    功能描述：把LLM流式输出的文本逐段打印到终端；没有收到任何片段时（工具调用或非流式模式）打印完整响应
+    参数说明：
+        - prefix：str，输出前缀，默认"助手:"
+    返回值：StreamPrinter实例
+    """
+
+    def __init__(self, prefix: str = "助手:") -> None:
+        self.prefix = prefix
+        self.started = False
+
+    def write(self, text: str) -> None:
+        """
+        函数名称：write
+        功能描述：打印一个文本片段，首个片段前打印前缀
+        参数说明：
+            - text：str，文本片段
+        返回值：无
+        """
+        if not self.started:
+            print(self.prefix, end=" ", flush=True)
+            self.started = True
+        print(text, end="", flush=True)
+
+    def finish(self, response: str) -> None:
+        """
+        函数名称：finish
+        功能描述：结束本次输出，已流式打印时补换行，否则打印完整响应
+        参数说明：
+            - response：str，完整响应内容
+        返回值：无
+        """
+        if self.started:
+            print()
+        else:
+            print(self.prefix, response)
+
+
 class LLMClient:
     """
     函数名称：LLMClient
-    功能描述：LLM客户端，负责与大语言模型API通信
+    功能描述：LLM客户端，负责与大语言模型API通信；
+              基于AsyncOpenAI，请求不阻塞事件循环，所有请求共享一个httpx连接池（keep-alive，装有h2时启用HTTP/2）
     参数说明：
         - model_name：str，模型名称
         - url：str，API地址
         - api_key：str，API密钥
+        - timeout：Optional[float]，单次请求超时秒数，默认读取LLM_TIMEOUT（60）
+        - max_connections：Optional[int]，连接池上限，默认读取LLM_MAX_CONNECTIONS（10）
+        - stream：Optional[bool]，是否使用流式响应，默认读取LLM_STREAM（true）；
+                  流式模式下工具调用JSON一完整就返回并中止剩余输出，普通文本逐段回调on_text
+        - function_calling：Optional[bool]，是否使用原生函数调用，默认读取LLM_FUNCTION_CALLING（false）；
+                  开启后工具定义通过tools参数传递，模型返回的tool_calls转换为{"tool", "arguments"}JSON（多个时为数组），
+                  关闭时沿用系统提示词中的工具列表和JSON输出约定（适用于不支持函数调用的模型）
+        - use_cache：Optional[bool]，是否缓存响应，默认读取LLM_CACHE（true），缓存参数见CompletionCache
     返回值：LLMClient实例
     """
 
-    def __init__(self, model_name: str, url: str, api_key: str) -> None:
+    def __init__(self, model_name: str, url: str, api_key: str,
+                 timeout: Optional[float] = None, max_connections: Optional[int] = None,
+                 stream: Optional[bool] = None, function_calling: Optional[bool] = None,
+                 use_cache: Optional[bool] = None) -> None:
         self.model_name = model_name
         self.url = url
-        self.client = OpenAI(api_key=api_key, base_url=url)
+        if stream is None:
+            stream = os.getenv('LLM_STREAM', 'true').lower() == 'true'
+        self.stream = stream
+        if function_calling is None:
+            function_calling = os.getenv('LLM_FUNCTION_CALLING', 'false').lower() == 'true'
+        self.function_calling = function_calling
+        if use_cache is None:
+            use_cache = os.getenv('LLM_CACHE', 'true').lower() == 'true'
+        self.cache: Optional[CompletionCache] = CompletionCache() if use_cache else None
+        if timeout is None:
+            timeout = float(os.getenv('LLM_TIMEOUT', '60'))
+        if max_connections is None:
+            max_connections = int(os.getenv('LLM_MAX_CONNECTIONS', '10'))
+        # 对话间隔通常有几十秒，空闲连接保留得比httpx默认的5秒更久，避免每轮重新握手TLS
+        keepalive_expiry = float(os.getenv('LLM_KEEPALIVE_EXPIRY', '120'))
+        self.http_client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+        self.client = AsyncOpenAI(api_key=api_key, base_url=url, http_client=self.http_client)
 
-    def get_response(self, messages: List[Dict[str, str]]) -> str:
+    async def get_response(self, messages: List[Dict[str, str]],
+                           on_text: Optional[Callable[[str], None]] = None,
+                           tools: Optional[List[Dict[str, Any]]] = None,
+                           cacheable: bool = False,
+                           storable: Optional[Callable[[str], bool]] = None) -> str:
         """
         函数名称：get_response
-        功能描述：发送消息给LLM并获取响应
+        功能描述：发送消息给LLM并获取响应，等待期间事件循环可以处理其他任务
         参数说明：
             - messages：List[Dict]，对话消息列表
-        返回值：str，LLM响应内容
+            - on_text：Optional[Callable]，流式模式下普通文本片段的回调（如逐字打印）
+            - tools：Optional[List[Dict]]，函数调用模式下的工具定义（见MCPClient.function_tools）
+            - cacheable：bool，是否允许使用响应缓存；由调用方确认上下文中没有非幂等工具的结果
+            - storable：Optional[Callable]，响应写入缓存前的检查，返回False时不缓存这条响应
+        返回值：str，LLM响应内容；检测到工具调用时只返回{"tool", "arguments"}JSON或其数组
         """
+        key = None
+        if self.cache is not None:
+            if cacheable:
+                key = self.cache.key(self.model_name, messages, tools)
+                cached = await self.cache.get(key)
+                if cached is not None:
+                    logger.info("⚡ 命中LLM响应缓存")
+                    return cached
+            else:
+                self.cache.stats.bypassed += 1
+
+        options: Dict[str, Any] = {"tools": tools} if tools else {}
         try:
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                stream=False
-            )
-            return response.choices[0].message.content
+            if self.stream:
+                content = await self._stream_response(messages, on_text, options)
+            else:
+                response = await self.client.chat.completions.create(
+                    model=self.model_name,
+                    messages=messages,
+                    stream=False,
+                    **options
+                )
+                message = response.choices[0].message
+                if getattr(message, 'tool_calls', None):
+                    content = self._tool_calls_json(
+                        [(call.function.name, call.function.arguments) for call in message.tool_calls]
+                    )
+                else:
+                    content = message.content
         except Exception as e:
             logger.error(f"Error getting LLM response: {e}")
             return f"LLM调用失败: {str(e)}"
 
+        if key is not None and content and (storable is None or storable(content)):
+            await self.cache.put(key, content)
+        return content
+
+    async def _stream_response(self, messages: List[Dict[str, str]],
+                               on_text: Optional[Callable[[str], None]],
+                               options: Dict[str, Any]) -> str:
+        """
+        函数名称：_stream_response
+        功能描述：流式获取响应，工具调用JSON语法完整时立即关闭流，不再等待和计费剩余token；
+                  原生tool_calls可能有多个，按序号拼接参数，收到结束标记后一并返回
+        参数说明：
+            - messages：List[Dict]，对话消息列表
+            - on_text：Optional[Callable]，普通文本片段的回调
+            - options：Dict，附加的请求参数（tools）
+        返回值：str，工具调用JSON或完整文本
+        """
+        detector = ToolCallDetector()
+        # 序号 -> [函数名称, 已收到的参数]
+        calls: Dict[int, List[str]] = {}
+        stream = await self.client.chat.completions.create(
+            model=self.model_name,
+            messages=messages,
+            stream=True,
+            **options
+        )
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                for call in getattr(delta, 'tool_calls', None) or []:
+                    # 名称在每个调用的首个片段，参数分段到达；最后一个调用的参数之后紧接着就是结束标记
+                    entry = calls.setdefault(call.index, ["", ""])
+                    if call.function.name:
+                        entry[0] = call.function.name
+                    entry[1] += call.function.arguments or ""
+                if calls and chunk.choices[0].finish_reason:
+                    break
+                if not delta.content:
+                    continue
+                echo = detector.feed(delta.content)
+                if echo and on_text:
+                    on_text(echo)
+                if detector.tool_call is not None:
+                    logger.debug("检测到完整工具调用，中止LLM流")
+                    return detector.tool_call
+        finally:
+            await stream.close()
+        if calls:
+            return self._tool_calls_json([tuple(calls[index]) for index in sorted(calls)])
+        return detector.buffer
+
+    @staticmethod
+    def _tool_calls_json(calls: List[Tuple[str, str]]) -> str:
+        """
+        函数名称：_tool_calls_json
+        功能描述：把原生函数调用转换为process_llm_response使用的{"tool", "arguments"}JSON，多个调用时为数组
+        参数说明：
+            - calls：List[Tuple[str, str]]，(函数名称, 模型给出的JSON参数字符串)
+        返回值：str，工具调用JSON
+        """
+        converted = []
+        for name, arguments in calls:
+            try:
+                parsed = json.loads(arguments) if arguments else {}
+            except json.JSONDecodeError:
+                # 参数交给validate_arguments检查，错误信息返回给LLM修正
+                logger.warning(f"函数调用参数不是合法JSON: {arguments}")
+                parsed = arguments
+            converted.append({"tool": name, "arguments": parsed})
+        payload = converted[0] if len(converted) == 1 else converted
+        return json.dumps(payload, ensure_ascii=False)
+
+    async def close(self) -> None:
+        """
+        函数名称：close
+        功能描述：关闭共享的HTTP连接池和响应缓存
+        参数说明：无
+        返回值：无
+        """
+        await self.client.close()
+        if self.cache is not None:
+            if self.cache.stats.hits + self.cache.stats.misses:
+                logger.info(f"LLM响应缓存统计: {self.cache.stats.to_dict()}")
+            self.cache.close()
+
 
 class ChatSession:
     """
     函数名称：ChatSession
     功能描述：聊天会话，处理用户输入和LLM响应，并与MCP工具交互
     参数说明：
-        - llm_client：LLMClient，LLM客户端实例
+        - llm_client：Optional[LLMClient]，LLM客户端实例；为None时只能直接执行工具调用（如负载测试）
         - mcp_client：MCPClient，MCP客户端实例
     返回值：ChatSession实例
     """
 
-    def __init__(self, llm_client: LLMClient, mcp_client: MCPClient) -> None:
+    def __init__(self, llm_client: Optional[LLMClient], mcp_client: MCPClient) -> None:
         self.mcp_client = mcp_client
         self.llm_client = llm_client
+        # 常见指令在本地识别后直接执行，不完整的指令在本地追问缺少的参数，都不经过LLM
+        # （INTENT_FAST_PATH=false关闭）
+        local = os.getenv('INTENT_FAST_PATH', 'true').lower() == 'true'
+        self.intent_router = IntentRouter() if local else None
+        self.dialog = SlotFillingDialog(mcp_client) if local else None
+        # LLM成功执行过的工具调用按用户原话缓存，相似的说法直接复用（SEMANTIC_CACHE=false关闭，需要numpy）
+        semantic = os.getenv('SEMANTIC_CACHE', 'true').lower() == 'true'
+        if semantic and not NUMPY_AVAILABLE:
+            logger.warning("未安装numpy，语义缓存已关闭")
+        self.semantic_cache = SemanticToolCache() if semantic and NUMPY_AVAILABLE else None
+        # 最近一次process_llm_response执行的工具调用(工具名, 参数)
+        self._last_tool_call: Optional[Tuple[str, Dict[str, Any]]] = None
+        # 工具执行后的回复用模板在本地生成，LLM_FOLLOWUP决定哪些情况仍请求LLM
+        self.renderer = ResponseRenderer()
+        # 最近一次process_llm_response各工具调用的(工具名, 参数, 执行结果)
+        self._last_results: List[Tuple[str, Any, str]] = []
+        # 函数调用模式下写入历史的tool_calls的id
+        self._tool_call_ids = itertools.count(1)
 
     async def cleanup(self) -> None:
         """
         函数名称：cleanup
-        功能描述：清理MCP客户端资源
+        功能描述：清理MCP客户端和LLM客户端资源
         参数说明：无
         返回值：无
         """
@@ -155,15 +711,241 @@ class ChatSession:
             await self.mcp_client.cleanup()
         except Exception as e:
             logging.warning(f"Warning during final cleanup: {e}")
+        if self.llm_client is not None:
+            try:
+                await self.llm_client.close()
+            except Exception as e:
+                logging.warning(f"Warning during LLM client cleanup: {e}")
+        if self.intent_router is not None and self.intent_router.stats.requests:
+            logger.info(f"本地意图识别统计: {self.intent_router.stats.to_dict()}")
+        if self.dialog is not None and self.dialog.stats.started:
+            logger.info(f"本地参数补全统计: {self.dialog.stats.to_dict()}")
+        if self.semantic_cache is not None and self.semantic_cache.stats.lookups:
+            logger.info(f"语义缓存统计: {self.semantic_cache.stats.to_dict()}")
+        if self.renderer.stats.rendered or self.renderer.stats.llm_followups:
+            logger.info(f"本地回复统计: {self.renderer.stats.to_dict()}")
+
+    async def handle_locally(self, user_input: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        函数名称：handle_locally
+        功能描述：不经过LLM处理用户输入：先继续进行中的参数补全，再尝试本地意图识别，
+                  再识别缺少参数的指令并开始追问，最后查找语义缓存；执行了工具时用回复模板回应结果
+        参数说明：
+            - user_input：str，用户输入
+        返回值：List[Dict]或None，本轮产生的对话消息（需追加到历史），以工具执行结果结尾时
+                表示结果需要由LLM回复；None表示交给LLM
+        """
+        if self.dialog is not None and self.dialog.active:
+            step = await self.dialog.resume(user_input)
+            if step is not None:
+                return await self._run_dialog_step(step)
+
+        fast_path = await self.try_fast_path(user_input)
+        if fast_path is not None:
+            return self._local_messages(*fast_path)
+
+        if self.dialog is not None:
+            step = await self.dialog.start(user_input)
+            if step is not None:
+                return await self._run_dialog_step(step)
+
+        cached = await self.try_semantic_cache(user_input)
+        if cached is not None:
+            return self._local_messages(*cached)
+        return None
+
+    def _local_messages(self, tool_call: str, result: str) -> List[Dict[str, Any]]:
+        """
+        函数名称：_local_messages
+        功能描述：本地执行工具后生成本轮的对话消息，能用模板回复时附上回复
+        参数说明：
+            - tool_call：str，工具调用JSON
+            - result：str，工具执行结果
+        返回值：List[Dict]，本轮产生的对话消息，无法用模板回复时以工具执行结果结尾
+        """
+        messages = self.tool_turn_messages(tool_call, result)
+        reply = self.reply_to_tool_results()
+        if reply is not None:
+            messages.append({"role": "assistant", "content": reply})
+        return messages
+
+    def tool_turn_messages(self, llm_response: str, result: str) -> List[Dict[str, Any]]:
+        """
+        函数名称：tool_turn_messages
+        功能描述：把一次工具调用及其结果转换为写入历史的消息：函数调用模式下为带tool_calls的助手消息
+                  和每个调用一条tool消息（与tools参数的约定一致，模型不会改为输出JSON文本），
+                  提示词JSON模式下为助手的JSON文本和一条system结果消息
+        参数说明：
+            - llm_response：str，工具调用JSON（process_llm_response的输入）
+            - result：str，process_llm_response的返回值
+        返回值：List[Dict]，对话消息
+        """
+        if self.llm_client is None or not self.llm_client.function_calling or not self._last_results:
+            return [{"role": "assistant", "content": llm_response},
+                    {"role": "system", "content": result}]
+        calls = []
+        for tool_name, arguments, _ in self._last_results:
+            if not isinstance(arguments, str):
+                arguments = json.dumps(arguments, ensure_ascii=False)
+            calls.append({"id": f"call_{next(self._tool_call_ids)}", "type": "function",
+                          "function": {"name": tool_name, "arguments": arguments}})
+        messages: List[Dict[str, Any]] = [{"role": "assistant", "content": None, "tool_calls": calls}]
+        for call, (_, _, output) in zip(calls, self._last_results):
+            messages.append({"role": "tool", "tool_call_id": call["id"], "content": output})
+        return messages
+
+    async def _run_dialog_step(self, step: DialogStep) -> List[Dict[str, Any]]:
+        """
+        函数名称：_run_dialog_step
+        功能描述：参数补全完成时执行工具，否则输出追问
+        参数说明：
+            - step：DialogStep，补全状态机的输出
+        返回值：List[Dict]，本轮产生的对话消息
+        """
+        if not step.complete:
+            print("助手:", step.reply)
+            return [{"role": "assistant", "content": step.reply}]
+        tool_call = json.dumps({"tool": step.tool, "arguments": step.arguments}, ensure_ascii=False)
+        logger.info(f"⚡ 参数补全完成: {tool_call}")
+        result = await self.process_llm_response(tool_call)
+        return self._local_messages(tool_call, result)
+
+    async def try_fast_path(self, user_input: str) -> Optional[Tuple[str, str]]:
+        """
+        函数名称：try_fast_path
+        功能描述：本地识别常见指令并直接执行工具，识别不确定时返回None交给LLM
+        参数说明：
+            - user_input：str，用户输入
+        返回值：Tuple[str, str]或None，(工具调用JSON, 工具执行结果)
+        """
+        if self.intent_router is None:
+            return None
+        match = self.intent_router.match(user_input, validate=self.mcp_client.validate_arguments)
+        if match is None:
+            return None
+        tool_call = json.dumps({"tool": match.tool, "arguments": match.arguments}, ensure_ascii=False)
+        logger.info(f"⚡ 本地识别指令: {tool_call}")
+        result = await self.process_llm_response(tool_call)
+        return tool_call, result
+
+    async def try_semantic_cache(self, user_input: str) -> Optional[Tuple[str, str]]:
+        """
+        函数名称：try_semantic_cache
+        功能描述：复用语义缓存中相似说法的工具调用，只复用只读或幂等的工具（说错了也不会改变Qt应用状态），
+                  执行失败时删除该缓存条目
+        参数说明：
+            - user_input：str，用户输入
+        返回值：Tuple[str, str]或None，(工具调用JSON, 工具执行结果)
+        """
+        if self.semantic_cache is None:
+            return None
+        hit = self.semantic_cache.lookup(user_input)
+        if hit is None:
+            return None
+        if not self.mcp_client.is_idempotent(hit.tool):
+            # 工具目录刷新后注解可能已经改变
+            self.semantic_cache.invalidate(hit.source)
+            return None
+        tool_call = json.dumps({"tool": hit.tool, "arguments": hit.arguments}, ensure_ascii=False)
+        logger.info(f"⚡ 复用语义缓存({hit.score:.2f}): {tool_call}")
+        result = await self.process_llm_response(tool_call)
+        if not self._tool_succeeded(result):
+            self.semantic_cache.invalidate(hit.source)
+        return tool_call, result
+
+    def remember_tool_call(self, user_input: str, result: str) -> None:
+        """
+        函数名称：remember_tool_call
+        功能描述：LLM对用户输入的第一次响应成功执行了只读或幂等的工具时，把这次调用写入语义缓存；
+                  test_button这类会改变状态的工具不缓存，相似但意思不同的说法不能直接触发它
+        参数说明：
+            - user_input：str，用户输入
+            - result：str，process_llm_response的返回值
+        返回值：无
+        """
+        if self.semantic_cache is None or self._last_tool_call is None:
+            return
+        tool_name, arguments = self._last_tool_call
+        if self._tool_succeeded(result) and self.mcp_client.is_idempotent(tool_name):
+            self.semantic_cache.add(user_input, tool_name, arguments)
+
+    @staticmethod
+    def _tool_succeeded(result: str) -> bool:
+        """工具已执行且Qt应用返回成功"""
+        return result.startswith("工具执行结果") and "✅" in result and "❌" not in result
+
+    def _cacheable(self, messages: List[Dict[str, str]]) -> bool:
+        """
+        函数名称：_cacheable
+        功能描述：判断本次请求能否使用LLM响应缓存：缓存键只取最近几轮，所以整个上下文
+                  （含压缩摘要）中都不能有非幂等工具（如test_button、login）的调用，否则同样的输入对应的结果并不相同
+        参数说明：
+            - messages：List[Dict]，本次请求的消息列表
+        返回值：bool，可以使用缓存时返回True
+        """
+        if self.llm_client.cache is None:
+            return False
+        # 第一条是系统提示词，其中的调用示例不是真实调用
+        return all(self.mcp_client.is_idempotent(name) for name in tool_names(messages[1:]))
+    
+    def _storable(self, response: str) -> bool:
+        """
+        函数名称：_storable
+        功能描述：判断LLM响应能否写入缓存：带参数的非幂等工具调用（如login）的参数来自当时的对话，
+                  换一个上下文重放会执行错误的操作，不缓存
+        参数说明：
+            - response：str，LLM响应内容
+        返回值：bool，可以缓存时返回True
+        """
+        try:
+            parsed = json.loads(response)
+        except json.JSONDecodeError:
+            return True
+        if not _is_tool_calls(parsed):
+            return True
+        calls = parsed if isinstance(parsed, list) else [parsed]
+        return all(self.mcp_client.is_idempotent(call["tool"]) or not call.get("arguments")
+                   for call in calls)
+    
+    async def _ask_llm(self, history: ConversationHistory, use_tools: bool = True) -> str:
+        """
+        函数名称：_ask_llm
+        功能描述：用当前历史请求LLM，普通文本逐字打印，上下文允许时使用响应缓存
+        参数说明：
+            - history：ConversationHistory，会话历史
+            - use_tools：bool，函数调用模式下是否随请求传递工具定义
+        返回值：str，LLM响应内容
+        """
+        messages = await history.prepare()
+        printer = StreamPrinter()
+        response = await self.llm_client.get_response(
+            messages, on_text=printer.write,
+            tools=await self._llm_tools() if use_tools else None,
+            cacheable=self._cacheable(messages), storable=self._storable)
+        printer.finish(response)
+        return response
+
+    async def _llm_tools(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        函数名称：_llm_tools
+        功能描述：函数调用模式下返回随LLM请求传递的工具定义（来自目录缓存）
+        参数说明：无
+        返回值：List[Dict]或None，提示词JSON模式下返回None
+        """
+        if not self.llm_client.function_calling:
+            return None
+        return await self.mcp_client.function_tools()
 
     async def process_llm_response(self, llm_response: str) -> str:
         """
         函数名称：process_llm_response
-        功能描述：处理LLM响应，解析工具调用并执行
+        功能描述：处理LLM响应，解析工具调用（单个对象或对象数组）并执行
         参数说明：
             - llm_response：str，LLM响应内容
         返回值：str，处理后的结果
         """
+        self._last_tool_call = None
+        self._last_results = []
         try:
             logger.info(f"🔍 处理LLM响应: {llm_response[:100]}...")
             
@@ -181,9 +963,12 @@ class ChatSession:
                 cleaned_response = cleaned_response.split('</tool_call>')[0].strip()
                 logger.info("✂️ 已移除tool_call标记")
             
-            # 查找JSON部分 - 从第一个{开始到最后一个}结束
+            # 查找JSON部分 - 从第一个{开始到最后一个}结束，[在{之前时按数组提取
             start_idx = cleaned_response.find('{')
             end_idx = cleaned_response.rfind('}')
+            array_idx = cleaned_response.find('[')
+            if array_idx != -1 and (start_idx == -1 or array_idx < start_idx):
+                start_idx, end_idx = array_idx, cleaned_response.rfind(']')
             
             if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
                 json_part = cleaned_response[start_idx:end_idx+1]
@@ -194,37 +979,17 @@ class ChatSession:
             tool_call = json.loads(json_part)
             logger.info(f"✅ JSON解析成功: {tool_call}")
             
-            if "tool" in tool_call and "arguments" in tool_call:
-                # 获取可用工具列表
-                tools = await self.mcp_client.list_tools()
-                tool_names = [tool.get('name') for tool in tools]
-                logger.info(f"🔧 可用工具: {tool_names}")
-                logger.info(f"🎯 请求工具: {tool_call['tool']}")
-                
-                if tool_call["tool"] in tool_names:
-                    try:
-                        logger.info(f"⚡ 开始执行工具: {tool_call['tool']} 参数: {tool_call['arguments']}")
-                        
-                        # 执行工具调用
-                        result = await self.mcp_client.execute_tool(
-                            tool_call["tool"], tool_call["arguments"]
-                        )
-                        
-                        logger.info(f"✅ 工具执行成功: {result}")
-                        final_result = f"工具执行结果: {result}"
-                        print(f"🔧 {final_result}")  # 立即打印结果
-                        return final_result
-                        
-                    except Exception as e:
-                        error_msg = f"工具执行错误: {str(e)}"
-                        logger.error(error_msg)
-                        print(f"❌ {error_msg}")  # 立即打印错误
-                        return error_msg
-                        
-                error_msg = f"未找到工具: {tool_call['tool']} (可用: {tool_names})"
-                logger.warning(error_msg)
-                print(f"⚠️ {error_msg}")  # 立即打印警告
-                return error_msg
+            if isinstance(tool_call, list) and len(tool_call) == 1:
+                tool_call = tool_call[0]
+            if isinstance(tool_call, list):
+                if tool_call and all(isinstance(c, dict) and "tool" in c and "arguments" in c
+                                     for c in tool_call):
+                    return await self.execute_tool_calls(tool_call)
+            elif isinstance(tool_call, dict) and "tool" in tool_call and "arguments" in tool_call:
+                result = await self._execute_tool_call(tool_call)
+                self._last_tool_call = (tool_call["tool"], tool_call["arguments"])
+                self._last_results = [(tool_call["tool"], tool_call["arguments"], result)]
+                return result
                 
             logger.info("📝 非工具调用，返回原始响应")
             return llm_response
@@ -233,6 +998,128 @@ class ChatSession:
             logger.info(f"📝 非JSON格式响应，直接返回: {str(e)}")
             return llm_response
 
+    async def _execute_tool_call(self, tool_call: Dict[str, Any]) -> str:
+        """
+        函数名称：_execute_tool_call
+        功能描述：检查并执行一个工具调用，结果立即打印
+        参数说明：
+            - tool_call：Dict，{"tool": 工具名, "arguments": 参数}
+        返回值：str，工具执行结果或错误说明
+        """
+        # 从工具目录缓存中查找（不额外请求服务器）
+        tool = await self.mcp_client.get_tool(tool_call["tool"])
+        tool_names = self.mcp_client.tool_names()
+        logger.info(f"🎯 请求工具: {tool_call['tool']}")
+        
+        if tool is not None:
+            # 本地检查参数，错误直接返回给LLM修正，不发往服务器
+            argument_error = self.mcp_client.validate_arguments(
+                tool_call["tool"], tool_call["arguments"]
+            )
+            if argument_error:
+                error_msg = f"工具参数错误: {tool_call['tool']}: {argument_error}"
+                logger.warning(error_msg)
+                print(f"⚠️ {error_msg}")
+                return error_msg
+            
+            try:
+                logger.info(f"⚡ 开始执行工具: {tool_call['tool']} 参数: {tool_call['arguments']}")
+                
+                # 执行工具调用
+                result = await self.mcp_client.execute_tool(
+                    tool_call["tool"], tool_call["arguments"]
+                )
+                
+                logger.info(f"✅ 工具执行成功: {result}")
+                final_result = f"工具执行结果: {result}"
+                print(f"🔧 {final_result}")  # 立即打印结果
+                return final_result
+                
+            except Exception as e:
+                error_msg = f"工具执行错误: {str(e)}"
+                logger.error(error_msg)
+                print(f"❌ {error_msg}")  # 立即打印错误
+                return error_msg
+                
+        error_msg = f"未找到工具: {tool_call['tool']} (可用: {tool_names})"
+        logger.warning(error_msg)
+        print(f"⚠️ {error_msg}")  # 立即打印警告
+        return error_msg
+
+    def reply_to_tool_results(self) -> Optional[str]:
+        """
+        函数名称：reply_to_tool_results
+        功能描述：用回复模板回应最近一次执行的工具结果并打印，不请求LLM
+        参数说明：无
+        返回值：str或None，None表示结果需要由LLM回复（格式无法识别，或LLM_FOLLOWUP要求）
+        """
+        reply = self.renderer.reply(self._last_results)
+        if reply is not None:
+            print("助手:", reply)
+        return reply
+
+    def _plan_stages(self, tool_calls: List[Dict[str, Any]]) -> List[List[Tuple[int, Dict[str, Any]]]]:
+        """
+        函数名称：_plan_stages
+        功能描述：把同一轮的多个工具调用按顺序分成若干批，同一批内并发执行；
+                  标记了depends_on_previous的调用开始新的一批，只读工具与会修改状态的工具
+                  也不放在同一批（如"登录然后查看状态"，查看状态要等登录完成）
+        参数说明：
+            - tool_calls：List[Dict]，工具调用列表
+        返回值：List[List[Tuple[int, Dict]]]，每批的(序号, 工具调用)
+        """
+        stages: List[List[Tuple[int, Dict[str, Any]]]] = []
+        stage_read_only = None
+        for index, tool_call in enumerate(tool_calls):
+            read_only = self.mcp_client.is_read_only(tool_call["tool"])
+            if not stages or tool_call.get("depends_on_previous") or read_only != stage_read_only:
+                stages.append([])
+                stage_read_only = read_only
+            stages[-1].append((index, tool_call))
+        return stages
+
+    async def execute_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> str:
+        """
+        函数名称：execute_tool_calls
+        功能描述：执行LLM一次给出的多个工具调用：批与批之间按顺序执行，批内用asyncio.gather并发执行；
+                  之前有调用未成功时，标记了depends_on_previous的调用不再执行
+        参数说明：
+            - tool_calls：List[Dict]，工具调用列表
+        返回值：str，全部调用的结果，合并为一条消息返回给LLM
+        """
+        if len(tool_calls) == 1:
+            result = await self._execute_tool_call(tool_calls[0])
+            self._last_results = [(tool_calls[0]["tool"], tool_calls[0]["arguments"], result)]
+            return result
+        # 分批需要工具注解，目录缓存有效时不访问服务器
+        await self.mcp_client.list_tools()
+        stages = self._plan_stages(tool_calls)
+        logger.info(f"⚡ 本轮{len(tool_calls)}个工具调用，分{len(stages)}批执行")
+        
+        results: List[str] = [""] * len(tool_calls)
+        failed = False
+        for stage in stages:
+            runnable = []
+            for index, tool_call in stage:
+                if failed and tool_call.get("depends_on_previous"):
+                    results[index] = "已跳过：之前的工具调用未成功"
+                    print(f"⏭️ 已跳过 {tool_call['tool']}：之前的工具调用未成功")
+                else:
+                    runnable.append((index, tool_call))
+            outputs = await asyncio.gather(*(self._execute_tool_call(c) for _, c in runnable))
+            for (index, _), output in zip(runnable, outputs):
+                results[index] = output
+            failed = failed or any(not self._tool_succeeded(results[index]) for index, _ in stage)
+        self._last_results = [(c["tool"], c["arguments"], r) for c, r in zip(tool_calls, results)]
+        
+        prefix = "工具执行结果: "
+        lines = [f"工具执行结果（共{len(tool_calls)}个调用）:"]
+        for index, (tool_call, result) in enumerate(zip(tool_calls, results), 1):
+            if result.startswith(prefix):
+                result = result[len(prefix):]
+            lines.append(f"[{index}] {tool_call['tool']}: {result}")
+        return "\n".join(lines)
+
     async def start(self, system_message: str) -> None:
         """
         函数名称：start
@@ -241,7 +1128,8 @@ class ChatSession:
             - system_message：str，系统消息
         返回值：无
         """
-        messages = [{"role": "system", "content": system_message}]
+        # 按token预算保留历史，超出时在后台压缩较早的轮次
+        history = ConversationHistory(system_message)
         print("=== QT应用控制助手已启动 ===")
         print("可以使用以下指令:")
         print("- 登录账号 <用户名> <密码>")
@@ -261,26 +1149,40 @@ class ChatSession:
                 if not user_input:
                     continue
                     
-                messages.append({"role": "user", "content": user_input})
+                history.append({"role": "user", "content": user_input})
 
-                # 获取LLM的初始响应
-                llm_response = self.llm_client.get_response(messages)
-                print("助手:", llm_response)
+                # 常见指令和参数补全在本地处理，不请求LLM
+                local_messages = await self.handle_locally(user_input)
+                if local_messages is not None:
+                    for message in local_messages:
+                        history.append(message)
+                    if local_messages[-1]["role"] == "assistant":
+                        continue
+                    # 本地执行的结果无法用模板回复，由LLM回复
+                    llm_response = await self._ask_llm(history)
+                    result = await self.process_llm_response(llm_response)
+                else:
+                    # 获取LLM的初始响应（普通文本逐字打印）
+                    llm_response = await self._ask_llm(history)
 
-                # 处理可能的工具调用
-                result = await self.process_llm_response(llm_response)
+                    # 处理可能的工具调用，成功执行的调用写入语义缓存
+                    result = await self.process_llm_response(llm_response)
+                    self.remember_tool_call(user_input, result)
 
                 # 如果处理结果与原始响应不同，说明执行了工具调用，需要进一步处理
                 while result != llm_response:
-                    messages.append({"role": "assistant", "content": llm_response})
-                    messages.append({"role": "system", "content": result})
+                    for message in self.tool_turn_messages(llm_response, result):
+                        history.append(message)
 
-                    # 将工具执行结果发送回LLM获取新响应
-                    llm_response = self.llm_client.get_response(messages)
+                    # 能用模板回复的结果直接回复；其余（如参数错误）发送回LLM获取新响应
+                    reply = self.reply_to_tool_results()
+                    if reply is not None:
+                        llm_response = reply
+                        break
+                    llm_response = await self._ask_llm(history)
                     result = await self.process_llm_response(llm_response)
-                    print("助手:", llm_response)
 
-                messages.append({"role": "assistant", "content": llm_response})
+                history.append({"role": "assistant", "content": llm_response})
 
             except KeyboardInterrupt:
                 print('\nQT控制助手退出')
@@ -352,29 +1254,64 @@ async def main():
         logger.info(f"MCP服务器地址: {mcp_server_url}")
         await mcp_client.connect_to_server(mcp_server_url)
         
-        # 获取可用工具列表并格式化为系统提示的一部分
-        tools = await mcp_client.list_tools()
-        tools_description = json.dumps(tools, ensure_ascii=False, indent=2)
-
-        # QT应用控制专用系统提示词
-        system_message = f'''
-        你是一个QT应用程序控制助手，专门帮助用户操作QT应用程序。
-
-        可用工具：{tools_description}
+        if llm_client.function_calling:
+            # 工具定义随每次请求通过tools参数传递，系统提示词中不再附带工具列表
+            tools_section = "可用工具已通过函数调用接口提供。"
+            response_rules = '''
+        1、当用户请求执行QT操作时，直接调用对应的函数，参数从用户输入中提取；
+        一次要求多个操作时，在同一次回复中按执行顺序调用全部函数
 
-        响应规则：
+        2、不要在回复中输出工具调用的JSON文本
+'''
+            examples = ""
+        else:
+            # 获取可用工具列表并格式化为系统提示的一部分
+            tools = await mcp_client.list_tools()
+            tools_description = json.dumps(tools, ensure_ascii=False, indent=2)
+            tools_section = f"可用工具：{tools_description}"
+            response_rules = '''
         1、当用户请求执行QT操作时，返回严格符合以下格式的纯净JSON：
-        {{
+        {
             "tool": "tool-name",
-            "arguments": {{
+            "arguments": {
                 "argument-name": "value"
-            }}
-        }}
+            }
+        }
+        一次要求多个操作时，返回按执行顺序排列的数组，互不依赖的调用会同时执行；
+        必须等前面的调用完成后才能执行的调用，加上 "depends_on_previous": true：
+        [
+            {"tool": "tool-name", "arguments": {}},
+            {"tool": "tool-name", "arguments": {}, "depends_on_previous": true}
+        ]
 
         2、禁止包含以下内容：
          - Markdown标记（如```json）
          - 自然语言解释前缀（如"结果："）
          - 多余的格式化符号
+'''
+            examples = '''
+        正确示例：
+        用户：登录账号wyx，密码124
+        响应：{"tool":"login","arguments":{"account":"wyx","password":"124"}}
+
+        用户：点击测试按钮
+        响应：{"tool":"test_button","arguments":{"random_string":"test"}}
+
+        用户：登录账号wyx密码124，然后查看状态
+        响应：[{"tool":"login","arguments":{"account":"wyx","password":"124"}},{"tool":"get_state","arguments":{},"depends_on_previous":true}]
+
+        错误示例：
+        用户：登录
+        错误响应：```json{"tool":"login",...}``` → 含Markdown
+'''
+
+        # QT应用控制专用系统提示词
+        system_message = f'''
+        你是一个QT应用程序控制助手，专门帮助用户操作QT应用程序。
+
+        {tools_section}
+
+        响应规则：{response_rules}
 
         3、常见指令映射：
          - "登录" 或 "登录账号" → 使用 login 工具
@@ -386,18 +1323,7 @@ async def main():
          - 突出关键信息（如登录状态、操作结果等）
          - 如果操作成功，给出积极反馈
          - 如果操作失败，说明可能的原因
-
-        正确示例：
-        用户：登录账号wyx，密码124
-        响应：{{"tool":"login","arguments":{{"account":"wyx","password":"124"}}}}
-
-        用户：点击测试按钮
-        响应：{{"tool":"test_button","arguments":{{"random_string":"test"}}}}
-
-        错误示例：
-        用户：登录
-        错误响应：```json{{"tool":"login",...}}``` → 含Markdown
-        '''
+        {examples}'''
         
         # 启动聊天会话
         await chat_session.start(system_message)
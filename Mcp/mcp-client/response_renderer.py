@@ -0,0 +1,218 @@
+"""
+本地回复渲染模块
+把工具执行结果按工具的回复模板（区分成功/失败，可引用结果中的data字段）直接转换为中文回复，
+不再为"登录成功"这类结果再请求一次LLM；结果格式无法识别时才交给LLM
+"""
+
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RESULT_PREFIX = "工具执行结果: "
+SKIPPED_PREFIX = "已跳过"
+
+# MCP服务器格式化的Qt响应（见mcp-server-qt的format_qt_response）
+_SUCCESS = re.compile(r"(?P<action>[^\n]+?)结果: (?P<status>✅ 成功|❌ 失败)\n消息: (?P<message>[^\n]*)(?P<rest>.*)", re.S)
+_FAILURE = re.compile(r"(?P<action>[^\n:：]+?)失败: (?P<message>.+)", re.S)
+_DETAILS = "\n详细信息: "
+_SOURCE = re.compile(r"\n数据来源: [^\n]*$")
+
+# LLM_FOLLOWUP的取值：什么情况下仍由LLM生成回复
+FOLLOWUP_NEVER = "never"
+FOLLOWUP_AMBIGUOUS = "ambiguous"
+FOLLOWUP_FAILURE = "failure"
+FOLLOWUP_ALWAYS = "always"
+FOLLOWUP_POLICIES = (FOLLOWUP_NEVER, FOLLOWUP_AMBIGUOUS, FOLLOWUP_FAILURE, FOLLOWUP_ALWAYS)
+
+
+@dataclass(frozen=True)
+class ResponseTemplate:
+    """
+    函数名称：ResponseTemplate
+    功能描述：一条回复模板：status为success或failure，when中的字段都相等时才使用；
+              text用str.format语法引用字段（data字段、工具参数、message、action），缺少字段时跳过该模板
+    参数说明：无
+    返回值：ResponseTemplate实例
+    """
+    status: str
+    text: str
+    when: Dict[str, Any] = field(default_factory=dict)
+
+
+DEFAULT_TEMPLATES: Dict[str, Tuple[ResponseTemplate, ...]] = {
+    "login": (
+        ResponseTemplate("success", "登录成功，当前账号：{account}。"),
+        ResponseTemplate("success", "登录成功。"),
+        ResponseTemplate("failure", "登录失败，请检查账号和密码后重试。", when={"message": "登录失败"}),
+        ResponseTemplate("failure", "登录失败：{message}。"),
+    ),
+    "test_button": (
+        ResponseTemplate("success", "测试按钮已点击。"),
+        ResponseTemplate("failure", "测试按钮点击失败：{message}。"),
+    ),
+    "get_state": (
+        ResponseTemplate("success", "当前已登录（账号：{currentAccount}），测试按钮已点击{testButtonClickCount}次。",
+                         when={"isLoggedIn": True}),
+        ResponseTemplate("success", "当前未登录，测试按钮已点击{testButtonClickCount}次。",
+                         when={"isLoggedIn": False}),
+        ResponseTemplate("success", "状态获取成功：{message}。"),
+        ResponseTemplate("failure", "状态获取失败：{message}。"),
+    ),
+}
+
+# 没有专用模板的工具
+GENERIC_TEMPLATES: Tuple[ResponseTemplate, ...] = (
+    ResponseTemplate("success", "{action}成功：{message}。"),
+    ResponseTemplate("failure", "{action}失败：{message}。"),
+)
+
+
+@dataclass
+class ToolOutcome:
+    """解析后的工具执行结果"""
+    action: str
+    success: bool
+    message: str
+    data: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class RenderStats:
+    """
+    函数名称：RenderStats
+    功能描述：本地回复统计：rendered为用模板回复的次数，llm_followups为交给LLM回复的次数，
+              unparsed为结果格式无法识别的次数，failures为含失败调用的次数
+    参数说明：无
+    返回值：RenderStats实例
+    """
+    rendered: int = 0
+    llm_followups: int = 0
+    unparsed: int = 0
+    failures: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+
+def parse_tool_result(result: str) -> Optional[ToolOutcome]:
+    """
+    函数名称：parse_tool_result
+    功能描述：解析ChatSession返回的工具执行结果（"工具执行结果: " + 服务器格式化的Qt响应）
+    参数说明：
+        - result：str，单个工具调用的结果
+    返回值：ToolOutcome或None，不是Qt响应格式时（如参数错误、连接异常）返回None
+    """
+    if not result.startswith(RESULT_PREFIX):
+        return None
+    text = _SOURCE.sub("", result[len(RESULT_PREFIX):].strip())
+
+    m = _SUCCESS.fullmatch(text)
+    if m:
+        data: Dict[str, Any] = {}
+        rest = m.group("rest")
+        if rest.startswith(_DETAILS):
+            try:
+                parsed = json.loads(rest[len(_DETAILS):])
+            except json.JSONDecodeError:
+                return None
+            data = parsed if isinstance(parsed, dict) else {"data": parsed}
+        elif rest.strip():
+            return None
+        return ToolOutcome(m.group("action"), m.group("status") == "✅ 成功", m.group("message").strip(), data)
+
+    m = _FAILURE.fullmatch(text)
+    if m:
+        return ToolOutcome(m.group("action"), False, m.group("message").strip())
+    return None
+
+
+class ResponseRenderer:
+    """
+    函数名称：ResponseRenderer
+    功能描述：用回复模板把本轮的工具执行结果转换为中文回复，按LLM_FOLLOWUP决定哪些情况仍交给LLM：
+              never不请求LLM（无法识别的结果原样回复），ambiguous只在结果格式无法识别时，
+              failure在此基础上工具执行失败时也请求，always每次都请求（原来的行为）
+    参数说明：
+        - templates：Optional[Dict]，工具名到回复模板的映射，默认DEFAULT_TEMPLATES
+        - followup：Optional[str]，默认读取LLM_FOLLOWUP（ambiguous）
+    返回值：ResponseRenderer实例
+    """
+
+    def __init__(self, templates: Optional[Dict[str, Tuple[ResponseTemplate, ...]]] = None,
+                 followup: Optional[str] = None) -> None:
+        if followup is None:
+            followup = os.getenv('LLM_FOLLOWUP', FOLLOWUP_AMBIGUOUS).lower()
+        if followup not in FOLLOWUP_POLICIES:
+            logger.warning(f"未知的LLM_FOLLOWUP: {followup}，使用{FOLLOWUP_AMBIGUOUS}")
+            followup = FOLLOWUP_AMBIGUOUS
+        self.templates = DEFAULT_TEMPLATES if templates is None else templates
+        self.followup = followup
+        self.stats = RenderStats()
+
+    def render(self, tool: str, arguments: Any, result: str) -> Tuple[Optional[str], bool]:
+        """
+        函数名称：render
+        功能描述：渲染单个工具调用的结果
+        参数说明：
+            - tool：str，工具名
+            - arguments：Any，工具参数
+            - result：str，工具执行结果
+        返回值：Tuple[Optional[str], bool]，(回复文本，无法识别时为None；是否成功)
+        """
+        if result.startswith(SKIPPED_PREFIX):
+            return f"{tool}未执行（之前的操作未成功）。", False
+        outcome = parse_tool_result(result)
+        if outcome is None:
+            return None, False
+
+        fields: Dict[str, Any] = dict(arguments) if isinstance(arguments, dict) else {}
+        fields.update(outcome.data)
+        fields.update(action=outcome.action, message=outcome.message.rstrip("。."))
+        status = "success" if outcome.success else "failure"
+        for template in self.templates.get(tool, ()) + GENERIC_TEMPLATES:
+            if template.status != status:
+                continue
+            if any(fields.get(name) != value for name, value in template.when.items()):
+                continue
+            try:
+                return template.text.format_map(fields), outcome.success
+            except (KeyError, IndexError, ValueError):
+                continue
+        return None, outcome.success
+
+    def reply(self, results: List[Tuple[str, Any, str]]) -> Optional[str]:
+        """
+        函数名称：reply
+        功能描述：生成本轮工具执行后的回复
+        参数说明：
+            - results：List[Tuple[str, Any, str]]，本轮各工具调用的(工具名, 参数, 执行结果)
+        返回值：str或None，None表示应由LLM生成回复
+        """
+        if not results or self.followup == FOLLOWUP_ALWAYS:
+            self.stats.llm_followups += 1
+            return None
+
+        texts: List[str] = []
+        unparsed = failed = False
+        for tool, arguments, result in results:
+            text, success = self.render(tool, arguments, result)
+            if text is None:
+                unparsed = True
+                text = result[len(RESULT_PREFIX):] if result.startswith(RESULT_PREFIX) else result
+            failed = failed or not success
+            texts.append(text)
+        self.stats.unparsed += unparsed
+        self.stats.failures += failed
+
+        if (self.followup == FOLLOWUP_AMBIGUOUS and unparsed) or \
+                (self.followup == FOLLOWUP_FAILURE and (unparsed or failed)):
+            self.stats.llm_followups += 1
+            return None
+        self.stats.rendered += 1
+        # 模板回复都以句号结尾，直接连接；原样回复的结果可能有多行，分行显示
+        return ("\n" if unparsed else "").join(texts)
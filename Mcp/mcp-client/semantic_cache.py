@@ -0,0 +1,268 @@
+"""
+语义缓存模块
+把LLM成功执行过的无参数工具调用按用户原话缓存，新输入与缓存的说法足够相似时直接复用该工具调用，
+不再请求LLM；相似度用字符n-gram的TF-IDF向量（NumPy矩阵）和余弦相似度计算
+"""
+
+import logging
+import math
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from intent_router import normalize
+
+logger = logging.getLogger(__name__)
+
+NGRAM_RANGE = (1, 2)
+# 其他工具的最高相似度达到最佳结果的这一比例时视为不唯一（如"查看状态然后点击测试按钮"）
+AMBIGUITY_RATIO = 0.6
+# 相似度直方图的分桶宽度，用于调整阈值
+_BUCKET = 0.1
+_NON_WORD = re.compile(r"[\W_]+")
+# 否定或提问的说法（"不要点击测试按钮""点击测试按钮之前要先登录吗"）与缓存的指令字面相近但意思不同，
+# 既不缓存也不复用；在原话上检查，归一化会去掉句尾的"吗"和问号
+_NEGATION_OR_QUESTION = re.compile(r"不|别|没|勿|吗|嘛|么|？|\?|是否|能否|可否|如何|为什么|怎")
+
+
+@dataclass
+class _Entry:
+    utterance: str
+    tool: str
+    arguments: Dict[str, Any]
+    grams: Counter
+    hits: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class SemanticHit:
+    """语义缓存命中：复用的工具调用、相似度和被匹配的缓存说法"""
+    tool: str
+    arguments: Dict[str, Any]
+    score: float
+    source: str
+
+
+@dataclass
+class SemanticCacheStats:
+    """
+    函数名称：SemanticCacheStats
+    功能描述：语义缓存统计；best_scores按0.1分桶记录每次查询的最高相似度，
+              near_misses为低于阈值不到0.1的查询数，用于调整阈值
+    参数说明：无
+    返回值：SemanticCacheStats实例
+    """
+    lookups: int = 0
+    hits: int = 0
+    below_threshold: int = 0
+    ambiguous: int = 0
+    guarded: int = 0
+    skipped_arguments: int = 0
+    near_misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+    best_scores: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def record_score(self, score: float) -> None:
+        low = min(int(score / _BUCKET + 1e-9), int(1 / _BUCKET) - 1) * _BUCKET
+        bucket = f"{low:.1f}-{low + _BUCKET:.1f}"
+        self.best_scores[bucket] = self.best_scores.get(bucket, 0) + 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hit_rate, 4),
+            "below_threshold": self.below_threshold,
+            "ambiguous": self.ambiguous,
+            "guarded": self.guarded,
+            "skipped_arguments": self.skipped_arguments,
+            "near_misses": self.near_misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "best_scores": dict(sorted(self.best_scores.items())),
+        }
+
+
+def char_ngrams(text: str) -> Counter:
+    """
+    函数名称：char_ngrams
+    功能描述：归一化后去掉空白和标点，统计1~2字符的n-gram
+    参数说明：
+        - text：str，用户输入
+    返回值：Counter，n-gram计数
+    """
+    text = _NON_WORD.sub("", normalize(text).lower())
+    grams: Counter = Counter()
+    for n in NGRAM_RANGE:
+        for i in range(len(text) - n + 1):
+            grams[text[i:i + n]] += 1
+    return grams
+
+
+class SemanticToolCache:
+    """
+    函数名称：SemanticToolCache
+    功能描述：用户说法到工具调用的相似度缓存：top-1余弦相似度达到阈值，且其他工具的相似度明显更低时命中；
+              只缓存无参数的调用（登录的账号密码来自原话，相似的说法换了参数值也可能命中），
+              否定或提问的说法不缓存也不复用；超过容量按最久未使用淘汰。
+              调用方还应只缓存只读或幂等的工具（见ChatSession.remember_tool_call）
+    参数说明：
+        - max_entries：Optional[int]，最多缓存的说法数，默认读取SEMANTIC_CACHE_SIZE（256）
+        - threshold：Optional[float]，命中所需的余弦相似度，默认读取SEMANTIC_CACHE_THRESHOLD（0.7）
+    返回值：SemanticToolCache实例
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, threshold: Optional[float] = None) -> None:
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("语义缓存需要安装numpy")
+        if max_entries is None:
+            max_entries = int(os.getenv('SEMANTIC_CACHE_SIZE', '256'))
+        if threshold is None:
+            threshold = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.7'))
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.stats = SemanticCacheStats()
+        self._entries: List[_Entry] = []
+        # 以下在条目变化后由_rebuild()重新计算
+        self._vocab: Dict[str, int] = {}
+        self._idf: Optional["np.ndarray"] = None
+        self._matrix: Optional["np.ndarray"] = None
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _rebuild(self) -> None:
+        """重新计算词表、IDF和按行归一化的TF-IDF矩阵"""
+        self._vocab = {}
+        for entry in self._entries:
+            for gram in entry.grams:
+                self._vocab.setdefault(gram, len(self._vocab))
+        counts = np.zeros((len(self._entries), len(self._vocab)), dtype=np.float32)
+        for row, entry in enumerate(self._entries):
+            for gram, count in entry.grams.items():
+                counts[row, self._vocab[gram]] = count
+        df = np.count_nonzero(counts, axis=0)
+        self._idf = np.log((1 + len(self._entries)) / (1 + df)) + 1
+        tfidf = np.where(counts > 0, 1 + np.log(np.maximum(counts, 1)), 0) * self._idf
+        norms = np.linalg.norm(tfidf, axis=1, keepdims=True)
+        self._matrix = tfidf / np.maximum(norms, 1e-12)
+        self._dirty = False
+
+    def _similarities(self, grams: Counter) -> "np.ndarray":
+        """新输入与每个缓存说法的余弦相似度"""
+        if self._dirty:
+            self._rebuild()
+        query = np.zeros(len(self._vocab), dtype=np.float32)
+        # 缓存里没出现过的n-gram不参与点积，但按最大IDF计入范数，新内容越多相似度越低
+        unseen_idf = math.log(1 + len(self._entries)) + 1
+        unseen = 0.0
+        for gram, count in grams.items():
+            weight = 1 + math.log(count)
+            column = self._vocab.get(gram)
+            if column is None:
+                unseen += (weight * unseen_idf) ** 2
+            else:
+                query[column] = weight * self._idf[column]
+        norm = math.sqrt(float(query @ query) + unseen)
+        if norm == 0:
+            return np.zeros(len(self._entries), dtype=np.float32)
+        return self._matrix @ (query / norm)
+
+    def lookup(self, utterance: str) -> Optional[SemanticHit]:
+        """
+        函数名称：lookup
+        功能描述：查找与输入最相似的缓存说法
+        参数说明：
+            - utterance：str，用户输入
+        返回值：SemanticHit或None
+        """
+        self.stats.lookups += 1
+        if _NEGATION_OR_QUESTION.search(utterance):
+            self.stats.guarded += 1
+            return None
+        grams = char_ngrams(utterance)
+        if not self._entries or not grams:
+            self.stats.below_threshold += 1
+            return None
+        scores = self._similarities(grams)
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+        self.stats.record_score(score)
+        if score < self.threshold:
+            self.stats.below_threshold += 1
+            if score >= self.threshold - _BUCKET:
+                self.stats.near_misses += 1
+            return None
+
+        entry = self._entries[best]
+        rival = max((float(s) for e, s in zip(self._entries, scores) if e.tool != entry.tool), default=0.0)
+        if rival >= score * AMBIGUITY_RATIO:
+            self.stats.ambiguous += 1
+            logger.info(f"语义缓存结果不唯一({score:.2f}/{rival:.2f})，交给LLM处理: {utterance!r}")
+            return None
+        entry.hits += 1
+        entry.last_used = time.monotonic()
+        self.stats.hits += 1
+        logger.info(f"语义缓存命中({score:.2f}): {utterance!r} ≈ {entry.utterance!r} → {entry.tool}")
+        return SemanticHit(entry.tool, dict(entry.arguments), score, entry.utterance)
+
+    def add(self, utterance: str, tool: str, arguments: Dict[str, Any]) -> None:
+        """
+        函数名称：add
+        功能描述：缓存一次成功的无参数工具调用，带参数的调用不缓存；同一说法再次出现时覆盖旧的调用
+        参数说明：
+            - utterance：str，用户原话
+            - tool：str，工具名
+            - arguments：Dict，工具参数
+        返回值：无
+        """
+        if arguments:
+            self.stats.skipped_arguments += 1
+            return
+        if _NEGATION_OR_QUESTION.search(utterance):
+            return
+        grams = char_ngrams(utterance)
+        if not grams or not isinstance(arguments, dict):
+            return
+        key = normalize(utterance)
+        self._entries = [e for e in self._entries if e.utterance != key]
+        self._entries.append(_Entry(key, tool, dict(arguments), grams))
+        self.stats.stores += 1
+        if len(self._entries) > self.max_entries:
+            oldest = min(range(len(self._entries)), key=lambda i: self._entries[i].last_used)
+            del self._entries[oldest]
+            self.stats.evictions += 1
+        self._dirty = True
+
+    def invalidate(self, utterance: str) -> None:
+        """
+        函数名称：invalidate
+        功能描述：删除与该说法相同的缓存条目（如复用后工具执行失败）
+        参数说明：
+            - utterance：str，缓存的说法（SemanticHit.source）或用户原话
+        返回值：无
+        """
+        key = normalize(utterance)
+        before = len(self._entries)
+        self._entries = [e for e in self._entries if e.utterance != key]
+        if len(self._entries) != before:
+            self.stats.invalidations += 1
+            self._dirty = True
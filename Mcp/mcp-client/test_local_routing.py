@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+本地路由测试脚本
+测试不经过LLM的本地意图识别和语义缓存是否按预期命中或交给LLM，不需要MCP服务器和API密钥
+"""
+
+import sys
+from pathlib import Path
+
+# 添加当前目录到路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from intent_router import IntentRouter
+from semantic_cache import SemanticToolCache, NUMPY_AVAILABLE
+
+
+def _expect_route(router, text, tool, arguments=None):
+    """检查一条输入的识别结果，tool为None表示应交给LLM"""
+    match = router.match(text)
+    got = (match.tool, match.arguments) if match else None
+    want = (tool, arguments if arguments is not None else {}) if tool else None
+    assert got == want, f"{text!r}: 期望 {want}，实际 {got}"
+    print(f"  ✅ {text!r} → {tool or 'LLM'}")
+
+
+def test_intent_router_suffix():
+    """测试句尾的客套话和标点不影响本地识别"""
+    print("🔍 测试句尾客套话...")
+    router = IntentRouter()
+    _expect_route(router, "查看状态，谢谢", "get_state")
+    _expect_route(router, "查看状态 谢谢啦", "get_state")
+    _expect_route(router, "查看状态,谢谢你", "get_state")
+    _expect_route(router, "点击测试按钮吧，多谢！", "test_button")
+    _expect_route(router, "帮我看看状态呀~", "get_state")
+    _expect_route(router, "登录账号wyx密码124，谢谢", "login", {"account": "wyx", "password": "124"})
+
+
+def test_intent_router_password_punctuation():
+    """测试属于密码的句尾标点被保留"""
+    print("🔍 测试密码中的标点...")
+    router = IntentRouter()
+    _expect_route(router, "登录账号wyx密码abc123!", "login", {"account": "wyx", "password": "abc123!"})
+    _expect_route(router, "登录账号wyx密码124。", "login", {"account": "wyx", "password": "124"})
+
+
+def test_intent_router_misses():
+    """测试不确定的输入交给LLM"""
+    print("🔍 测试交给LLM的输入...")
+    router = IntentRouter()
+    _expect_route(router, "登录失败怎么办", None)
+    _expect_route(router, "查看状态然后点击测试按钮", None)
+
+
+def _semantic_cache():
+    """缓存两条LLM执行过的说法"""
+    cache = SemanticToolCache(max_entries=16)
+    cache.add("点击测试按钮", "test_button", {})
+    cache.add("查看状态", "get_state", {})
+    return cache
+
+
+def test_semantic_cache_negation():
+    """测试否定和提问的说法不复用字面相近的缓存调用"""
+    print("🔍 测试语义缓存的否定和提问...")
+    if not NUMPY_AVAILABLE:
+        print("  ⚠️ 未安装numpy，跳过")
+        return
+    cache = _semantic_cache()
+    for text in ["不要点击测试按钮", "点击测试按钮之前要先登录吗", "别查看状态了", "查看状态？"]:
+        hit = cache.lookup(text)
+        assert hit is None, f"{text!r}: 不应复用 {hit.tool}（相似度 {hit.score:.2f}）"
+        print(f"  ✅ {text!r} → LLM")
+    assert cache.stats.guarded == 4, cache.stats.to_dict()
+
+    cache.add("不要查看状态", "get_state", {})
+    assert len(cache) == 2, "否定的说法不应写入缓存"
+    print("  ✅ 否定的说法不写入缓存")
+
+
+def test_semantic_cache_threshold():
+    """测试默认阈值下只有非常接近的说法才复用"""
+    print("🔍 测试语义缓存阈值...")
+    if not NUMPY_AVAILABLE:
+        print("  ⚠️ 未安装numpy，跳过")
+        return
+    cache = _semantic_cache()
+    assert cache.threshold > 0.5, cache.threshold
+    hit = cache.lookup("看看状态")
+    assert hit is not None and hit.tool == "get_state", hit
+    print(f"  ✅ '看看状态' → get_state（相似度 {hit.score:.2f}）")
+    for text in ["登录状态查看", "查看日志"]:
+        hit = cache.lookup(text)
+        assert hit is None, f"{text!r}: 不应复用 {hit.tool}（相似度 {hit.score:.2f}）"
+        print(f"  ✅ {text!r} → LLM")
+
+
+def test_semantic_cache_arguments():
+    """测试带参数的调用不写入缓存"""
+    print("🔍 测试语义缓存的参数...")
+    if not NUMPY_AVAILABLE:
+        print("  ⚠️ 未安装numpy，跳过")
+        return
+    cache = SemanticToolCache(max_entries=16)
+    cache.add("我想以wyx身份登录系统，密码124", "login", {"account": "wyx", "password": "124"})
+    assert len(cache) == 0 and cache.stats.skipped_arguments == 1, cache.stats.to_dict()
+    assert cache.lookup("我想以wyx身份登录系统，密码1245") is None
+    print("  ✅ 登录调用不写入缓存")
+
+
+def main():
+    """主测试函数"""
+    print("🧪 本地路由测试")
+    print("=" * 50)
+
+    tests = [
+        ("句尾客套话", test_intent_router_suffix),
+        ("密码中的标点", test_intent_router_password_punctuation),
+        ("交给LLM", test_intent_router_misses),
+        ("语义缓存否定和提问", test_semantic_cache_negation),
+        ("语义缓存阈值", test_semantic_cache_threshold),
+        ("语义缓存参数", test_semantic_cache_arguments),
+    ]
+
+    results = {}
+    for test_name, test_func in tests:
+        try:
+            test_func()
+            results[test_name] = True
+        except Exception as e:
+            print(f"  ❌ {test_name}测试失败: {e}")
+            results[test_name] = False
+
+    # 测试总结
+    print("\n📊 测试总结")
+    print("=" * 30)
+    for test_name, passed_test in results.items():
+        status = "✅ 通过" if passed_test else "❌ 失败"
+        print(f"  {test_name}: {status}")
+
+    passed = sum(results.values())
+    print(f"\n🎯 总体结果: {passed}/{len(results)} 通过")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
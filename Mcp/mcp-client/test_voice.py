@@ -135,12 +135,23 @@ def test_integration():
     
     try:
         from voice_chat_session import VoiceChatSession
+        from completion_cache import CompletionCache
         print("  ✅ 语音聊天会话模块导入成功")
         
         # 模拟客户端测试
         class MockLLMClient:
-            def get_response(self, messages):
+            """与LLMClient的属性和get_response签名一致，只在内存中缓存响应"""
+            function_calling = False
+
+            def __init__(self):
+                self.cache = CompletionCache(path="")
+
+            async def get_response(self, messages, on_text=None, tools=None,
+                                   cacheable=False, storable=None):
                 return "测试响应"
+
+            async def close(self):
+                self.cache.close()
         
         class MockMCPClient:
             async def cleanup(self):
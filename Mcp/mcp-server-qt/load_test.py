@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+Load generator for the Qt control path
+
+Drives N concurrent virtual clients through one layer of the bridge and
+reports throughput plus p50/p95/p99/max latency per command:
+
+    qt    the pooled QtClient of this server, straight to the Qt TCP port
+    mcp   the MCP tools over SSE (this server must be running)
+    chat  ChatSession.process_llm_response of mcp-client with canned LLM
+          tool-call JSON, i.e. everything but the LLM itself
+
+Several concurrency levels can be swept in one run to see how the bridge
+degrades, and a saved report can be compared against a later run to get
+before/after numbers for an optimization.
+
+Usage:
+    python load_test.py --layer qt --simulator --concurrency 1,4,16 --duration 10
+    python load_test.py --layer mcp --mix get_state=6,test_button=3,login=1 --output before.json
+    python load_test.py --layer mcp --compare before.json
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import math
+import random
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from qt_commands import COMMANDS_BY_NAME, QtCommand
+
+LAYERS = ("qt", "mcp", "chat")
+DEFAULT_MIX = "get_state=6,test_button=3,login=1"
+PERCENTILES = (50, 95, 99)
+
+MCP_CLIENT_DIR = Path(__file__).parent.parent / "mcp-client"
+
+
+def parse_mix(spec: str) -> List[Tuple[QtCommand, float]]:
+    """Parse ``name=weight,...`` into (command, weight) pairs"""
+    mix = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, weight = item.partition("=")
+        command = COMMANDS_BY_NAME.get(name.strip())
+        if command is None:
+            raise ValueError(f"未知命令: {name} (可用: {', '.join(COMMANDS_BY_NAME)})")
+        mix.append((command, float(weight) if weight else 1.0))
+    if not mix or sum(w for _, w in mix) <= 0:
+        raise ValueError(f"无效的命令配比: {spec}")
+    return mix
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    """Latency summary in milliseconds"""
+    values = sorted(latencies)
+    summary = {
+        "count": len(values),
+        "errors": errors,
+        "throughput": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "mean": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+    }
+    for p in PERCENTILES:
+        summary[f"p{p}"] = round(percentile(values, p) * 1000, 3)
+    summary["max"] = round(values[-1] * 1000, 3) if values else 0.0
+    return summary
+
+
+def _tool_succeeded(text: str) -> bool:
+    """format_qt_response marks successful results with ✅"""
+    return "✅" in text
+
+
+def _load_mcp_client_module():
+    """Import mcp-client/main.py under its own name (it clashes with ./main.py)"""
+    # its sibling modules (chat_history) must be importable; appended so that
+    # ./main.py still wins for "main"
+    if str(MCP_CLIENT_DIR) not in sys.path:
+        sys.path.append(str(MCP_CLIENT_DIR))
+    spec = importlib.util.spec_from_file_location("mcp_client_main", MCP_CLIENT_DIR / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    # its per-call INFO logging would dominate the measured latency
+    module.logger.setLevel(logging.WARNING)
+    return module
+
+
+# ---- layers: one driver per virtual client, call() returns success ----
+
+class QtLayer:
+    """Raw QtClient; all virtual clients share one pooled client, like the MCP tools do"""
+
+    def __init__(self, host: str, port: int, pool_size: int, socket_path: Optional[str] = None):
+        from main import QtClient
+        self.client = QtClient(host, port, min_size=1, max_size=pool_size, socket_path=socket_path)
+
+    def driver(self):
+        return self
+
+    async def open(self):
+        pass
+
+    async def call(self, command: QtCommand, arguments: Dict[str, str]) -> bool:
+        response = await self.client.send_command(command.encode(**arguments),
+                                                  retry=command.idempotent)
+        result = response.get("result")
+        if isinstance(result, dict):
+            return bool(result.get("success"))
+        return bool(response.get("success")) and "error" not in response
+
+    async def close(self):
+        pass
+
+    async def shutdown(self):
+        await self.client.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pool": self.client.pool.stats.to_dict()}
+
+
+class _McpDriver:
+    def __init__(self, server_url: str):
+        from fastmcp import Client
+        self.client = Client(server_url + "/sse")
+
+    async def open(self):
+        await self.client.__aenter__()
+
+    async def call(self, command: QtCommand, arguments: Dict[str, str]) -> bool:
+        result = await self.client.call_tool(command.name, arguments)
+        content = getattr(result, "content", result)
+        return bool(content) and _tool_succeeded(content[0].text)
+
+    async def close(self):
+        await self.client.__aexit__(None, None, None)
+
+
+class McpLayer:
+    """MCP tools over SSE, one client session per virtual client"""
+
+    def __init__(self, server_url: str):
+        self.server_url = server_url
+
+    def driver(self):
+        return _McpDriver(self.server_url)
+
+    async def shutdown(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class _ChatDriver:
+    def __init__(self, module, server_url: str):
+        self.module = module
+        self.server_url = server_url
+        self.session = None
+
+    async def open(self):
+        mcp_client = self.module.MCPClient()
+        await mcp_client.connect_to_server(self.server_url)
+        # process_llm_response never calls the LLM, the replies are canned
+        self.session = self.module.ChatSession(llm_client=None, mcp_client=mcp_client)
+
+    async def call(self, command: QtCommand, arguments: Dict[str, str]) -> bool:
+        llm_response = json.dumps({"tool": command.name, "arguments": arguments},
+                                  ensure_ascii=False)
+        result = await self.session.process_llm_response(llm_response)
+        return result.startswith("工具执行结果") and _tool_succeeded(result)
+
+    async def close(self):
+        await self.session.cleanup()
+
+
+class ChatLayer:
+    """ChatSession.process_llm_response, one session per virtual client"""
+
+    def __init__(self, server_url: str):
+        self.server_url = server_url
+        self.module = _load_mcp_client_module()
+
+    def driver(self):
+        return _ChatDriver(self.module, self.server_url)
+
+    async def shutdown(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+# ---- load generation ----
+
+class _StartGate:
+    """
+    Starts the measurement once every client is connected and warmed up,
+    and stops the clock when the last measuring client finishes
+    """
+
+    def __init__(self, clients: int):
+        self._waiting = clients
+        self._running = clients
+        self._event = asyncio.Event()
+        self.started = 0.0
+        self.finished = 0.0
+
+    async def wait(self) -> float:
+        """Block until all clients are ready; returns the start time"""
+        self._arrive()
+        await self._event.wait()
+        return self.started
+
+    def leave(self):
+        """Called by every client when it stops, also after a failed open"""
+        if not self._event.is_set():
+            self._arrive()
+        self._running -= 1
+        if self._running == 0:
+            self.finished = time.perf_counter()
+
+    def _arrive(self):
+        self._waiting -= 1
+        if self._waiting == 0:
+            self.started = time.perf_counter()
+            self._event.set()
+
+    @property
+    def elapsed(self) -> float:
+        return max(self.finished - self.started, 0.0)
+
+
+class LoadTest:
+    """
+    Closed-loop load test: each virtual client sends its next command as
+    soon as the previous one returns
+
+    Args:
+        layer: QtLayer, McpLayer or ChatLayer
+        mix: (command, weight) pairs
+        arguments: values for command parameters (e.g. account, password)
+        duration: measured seconds per concurrency level
+        requests: fixed number of requests per client instead of a duration
+        warmup: unmeasured requests per client before measuring
+        seed: random seed of the command sequence
+    """
+
+    def __init__(self, layer, mix: List[Tuple[QtCommand, float]],
+                 arguments: Dict[str, str], duration: float = 10.0,
+                 requests: Optional[int] = None, warmup: int = 1,
+                 seed: Optional[int] = None):
+        self.layer = layer
+        self.commands = [c for c, _ in mix]
+        self.weights = [w for _, w in mix]
+        self.arguments = arguments
+        self.duration = duration
+        self.requests = requests
+        self.warmup = warmup
+        self.seed = seed
+
+    def _arguments_for(self, command: QtCommand) -> Dict[str, str]:
+        return {p.name: self.arguments.get(p.name, "") for p in command.params}
+
+    async def _client(self, index: int, start: "_StartGate",
+                      latencies: Dict[str, List[float]], errors: Dict[str, int]):
+        rng = random.Random(None if self.seed is None else self.seed + index)
+        driver = self.layer.driver()
+        try:
+            await driver.open()
+        except BaseException:
+            start.leave()
+            raise
+        try:
+            for _ in range(self.warmup):
+                command = rng.choices(self.commands, self.weights)[0]
+                await self._call(driver, command)
+
+            deadline = await start.wait() + self.duration
+            sent = 0
+            while True:
+                if self.requests is not None:
+                    if sent >= self.requests:
+                        break
+                elif time.perf_counter() >= deadline:
+                    break
+                command = rng.choices(self.commands, self.weights)[0]
+                begin = time.perf_counter()
+                ok = await self._call(driver, command)
+                latencies[command.name].append(time.perf_counter() - begin)
+                if not ok:
+                    errors[command.name] += 1
+                sent += 1
+        finally:
+            start.leave()
+            await driver.close()
+
+    async def _call(self, driver, command: QtCommand) -> bool:
+        try:
+            return await driver.call(command, self._arguments_for(command))
+        except Exception:
+            return False
+
+    async def run_level(self, concurrency: int) -> Dict[str, Any]:
+        """Run one concurrency level and return its report"""
+        latencies: Dict[str, List[float]] = defaultdict(list)
+        errors: Dict[str, int] = defaultdict(int)
+        start = _StartGate(concurrency)
+        await asyncio.gather(*(self._client(i, start, latencies, errors)
+                               for i in range(concurrency)))
+        elapsed = start.elapsed
+
+        commands = {name: summarize(values, errors[name], elapsed)
+                    for name, values in sorted(latencies.items())}
+        all_latencies = [v for values in latencies.values() for v in values]
+        return {
+            "concurrency": concurrency,
+            "elapsed": round(elapsed, 3),
+            "total": summarize(all_latencies, sum(errors.values()), elapsed),
+            "commands": commands,
+        }
+
+    async def run(self, levels: List[int]) -> List[Dict[str, Any]]:
+        reports = []
+        for concurrency in levels:
+            report = await self.run_level(concurrency)
+            print_level(report)
+            reports.append(report)
+        return reports
+
+
+# ---- reporting ----
+
+_COLUMNS = ("count", "errors", "throughput", "p50", "p95", "p99", "max")
+
+
+def print_level(report: Dict[str, Any]):
+    print(f"\n并发数 {report['concurrency']}  (耗时 {report['elapsed']}s)")
+    print(f"  {'命令':<14}" + "".join(f"{c:>12}" for c in _COLUMNS))
+    rows = list(report["commands"].items()) + [("[总计]", report["total"])]
+    for name, summary in rows:
+        print(f"  {name:<14}" + "".join(f"{summary[c]:>12}" for c in _COLUMNS))
+
+
+def print_comparison(baseline: Dict[str, Any], current: Dict[str, Any]):
+    """Print throughput and latency changes against a saved report"""
+    print(f"\n📊 对比基线 (基线层: {baseline.get('layer')}, 当前层: {current.get('layer')})")
+    base_levels = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    for level in current["levels"]:
+        base = base_levels.get(level["concurrency"])
+        if base is None:
+            print(f"  并发数 {level['concurrency']}: 基线中无此并发级别")
+            continue
+        print(f"  并发数 {level['concurrency']}:")
+        rows = [("[总计]", base["total"], level["total"])]
+        rows += [(name, base["commands"][name], summary)
+                 for name, summary in level["commands"].items()
+                 if name in base["commands"]]
+        for name, before, after in rows:
+            changes = "  ".join(
+                f"{metric} {before[metric]} → {after[metric]} ({_delta(before[metric], after[metric])})"
+                for metric in ("throughput", "p50", "p99")
+            )
+            print(f"    {name:<14}{changes}")
+
+
+def _delta(before: float, after: float) -> str:
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+async def _run(args) -> Dict[str, Any]:
+    simulator = None
+    if args.simulator:
+        from qt_simulator import QtSimulator
+        simulator = QtSimulator(host="127.0.0.1", port=0, service_time=args.service_time,
+                                jitter=args.jitter, seed=args.seed, socket_path=args.qt_socket)
+        await simulator.start()
+        args.qt_host, args.qt_port = simulator.host, simulator.port
+
+    if args.layer == "qt":
+        layer = QtLayer(args.qt_host, args.qt_port, args.pool_size, args.qt_socket)
+    elif args.layer == "mcp":
+        layer = McpLayer(args.server_url)
+    else:
+        layer = ChatLayer(args.server_url)
+
+    test = LoadTest(layer, parse_mix(args.mix),
+                    {"account": args.account, "password": args.password},
+                    duration=args.duration, requests=args.requests,
+                    warmup=args.warmup, seed=args.seed)
+    print(f"🚀 负载测试: 层={args.layer} 配比={args.mix} 并发={args.concurrency}")
+    try:
+        levels = await test.run([int(n) for n in args.concurrency.split(",")])
+    finally:
+        await layer.shutdown()
+        if simulator is not None:
+            await simulator.stop()
+
+    report = {"layer": args.layer, "mix": args.mix, "levels": levels}
+    report.update(layer.stats())
+    if simulator is not None:
+        report["simulator"] = simulator.stats.to_dict()
+    return report
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Qt控制链路负载测试")
+    parser.add_argument("--layer", choices=LAYERS, default="qt", help="压测的层")
+    parser.add_argument("--concurrency", default="1,4,16", help="并发虚拟客户端数，逗号分隔可依次压测")
+    parser.add_argument("--duration", type=float, default=10.0, help="每个并发级别的压测时长(秒)")
+    parser.add_argument("--requests", type=int, default=None, help="每个客户端固定请求数，设置后忽略--duration")
+    parser.add_argument("--warmup", type=int, default=1, help="每个客户端不计入统计的预热请求数")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="命令配比，如 get_state=6,test_button=3,login=1")
+    parser.add_argument("--account", default="admin", help="login命令使用的账号")
+    parser.add_argument("--password", default="123456", help="login命令使用的密码")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--qt-host", default="localhost")
+    parser.add_argument("--qt-port", type=int, default=8088)
+    parser.add_argument("--qt-socket", default=None, help="qt层: 改为连接此Unix域套接字")
+    parser.add_argument("--pool-size", type=int, default=4, help="qt层连接池最大连接数")
+    parser.add_argument("--server-url", default="http://localhost:8000", help="mcp/chat层的MCP服务器地址")
+    parser.add_argument("--simulator", action="store_true", help="qt层: 在进程内启动Qt模拟器作为目标")
+    parser.add_argument("--service-time", type=float, default=0.005, help="模拟器每条命令的处理时间(秒)")
+    parser.add_argument("--jitter", type=float, default=0.002, help="模拟器处理时间随机抖动上限(秒)")
+    parser.add_argument("--output", help="将报告保存为JSON文件")
+    parser.add_argument("--compare", help="与之前保存的JSON报告对比")
+    args = parser.parse_args(argv)
+
+    if args.simulator and args.layer != "qt":
+        parser.error("--simulator 仅用于qt层；mcp/chat层请让MCP服务器连接单独启动的qt_simulator.py")
+    report = asyncio.run(_run(args))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2),
+                                     encoding="utf-8")
+        print(f"\n💾 报告已保存: {args.output}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        print_comparison(baseline, report)
+
+
+if __name__ == "__main__":
+    main()
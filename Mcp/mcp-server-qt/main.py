@@ -1,17 +1,32 @@
 """
 MCP Qt Control Server using FastMCP
 
-This MCP server connects to Qt application on port 8088 and provides tools to:
+This MCP server connects to Qt application on port 8088 (or a Unix domain
+socket, see QT_SOCKET_PATH) and provides tools to:
 - Login to the Qt application
 - Click test button  
 - Get application state
 """
 
 import asyncio
+import inspect
+import itertools
 import json
+import os
 import socket
 import logging
+import time
+from typing import Annotated, Optional
 from mcp.server.fastmcp import FastMCP
+from mcp.types import ToolAnnotations
+from pydantic import Field
+
+from qt_breaker import CircuitBreaker, CircuitOpenError
+from qt_commands import QT_COMMANDS, QtCommand
+from qt_framing import FRAMING_AUTO
+from qt_pool import QtConnectionPool
+from qt_singleflight import SingleFlight
+from qt_state import QtStateReplica
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -21,167 +36,207 @@ logger = logging.getLogger(__name__)
 mcp = FastMCP("Qt Control Server")
 
 class QtClient:
-    """Simple Qt TCP client for MCP server"""
+    """Qt TCP client for MCP server, backed by a shared connection pool"""
     
-    def __init__(self, host="localhost", port=8088):
+    def __init__(self, host="localhost", port=8088, min_size=1, max_size=4, idle_timeout=60.0,
+                 framing=FRAMING_AUTO, breaker=None, socket_path=None):
         self.host = host
         self.port = port
+        self.pool = QtConnectionPool(host, port, min_size=min_size, max_size=max_size,
+                                     idle_timeout=idle_timeout, framing=framing,
+                                     socket_path=socket_path)
+        # Fails calls fast while the Qt application is unreachable
+        self.breaker = breaker or CircuitBreaker()
+        self._ids = itertools.count(1)
         
-    async def send_command(self, command: str) -> dict:
-        """Send command to Qt application"""
+    async def send_command(self, command: str, retry: bool = True,
+                           deadline: Optional[float] = None) -> dict:
+        """
+        Send command to Qt application
+
+        retry allows one resend on a fresh socket when a pooled connection
+        turns out to be stale; pass False for non-idempotent commands.
+        deadline is a time.monotonic() value bounding the whole call.
+        """
         try:
-            reader, writer = await asyncio.open_connection(self.host, self.port)
-            
             # Construct JSON-RPC message
             message = {
-                "id": f"mcp_{asyncio.get_event_loop().time()}",
+                "id": f"mcp_{next(self._ids)}",
                 "method": "execute", 
                 "params": {"command": command}
             }
             
-            # Send message
-            message_str = json.dumps(message) + '\n'
-            writer.write(message_str.encode('utf-8'))
-            await writer.drain()
+            # Send message on a pooled keep-alive connection
+            response = await self.breaker.call(
+                lambda: self.pool.roundtrip(message, retry=retry, deadline=deadline)
+            )
             
-            # Receive response
-            response_line = await reader.readline()
-            response_str = response_line.decode('utf-8').strip()
-            
-            # Close connection
-            writer.close()
-            await writer.wait_closed()
-            
-            # Parse response
-            try:
-                return json.loads(response_str)
-            except json.JSONDecodeError:
-                return {"success": True, "message": response_str}
+            # Plain text responses (non-JSON lines) are wrapped
+            if isinstance(response, dict):
+                return response
+            return {"success": True, "message": str(response)}
                 
+        except CircuitOpenError as e:
+            return unavailable_response(e)
+        except asyncio.TimeoutError:
+            logger.warning(f"Qt command timed out: {command}")
+            return {"success": False, "message": "Qt应用响应超时，命令可能仍在执行"}
         except Exception as e:
             logger.error(f"Qt connection failed: {e}")
             return {"success": False, "message": f"连接Qt应用失败: {str(e)}"}
 
-# Create Qt client instance
-qt_client = QtClient()
+    async def send_commands(self, commands: list, deadline: Optional[float] = None) -> list:
+        """
+        Send several commands as one JSON-RPC batch (one round trip)
 
-@mcp.tool()
-def login(account: str, password: str) -> str:
-    """
-    Login to Qt application
-    
-    Args:
-        account: User account name
-        password: User password
-        
-    Returns:
-        Login result message
-    """
-    import asyncio
-    
-    async def _do_login():
-        command = f"login:{account}:{password}"
-        response = await qt_client.send_command(command)
-        return format_qt_response(response, "登录")
-    
-    try:
-        # 尝试在现有事件循环中运行
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            # 如果事件循环正在运行，创建任务
-            import concurrent.futures
-            import threading
-            
-            def run_in_thread():
-                new_loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(new_loop)
-                try:
-                    return new_loop.run_until_complete(_do_login())
-                finally:
-                    new_loop.close()
-            
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(run_in_thread)
-                return future.result(timeout=30)
-        else:
-            return asyncio.run(_do_login())
-    except Exception as e:
-        logger.error(f"登录失败: {e}")
-        return f"登录失败: {str(e)}"
+        Qt executes the batch in order. If the Qt application does not
+        understand batches, the commands are sent one by one instead.
+        """
+        if not commands:
+            return []
+        messages = [
+            {"id": f"mcp_{next(self._ids)}", "method": "execute", "params": {"command": command}}
+            for command in commands
+        ]
+        try:
+            responses = await self.breaker.call(
+                lambda: self.pool.roundtrip(messages, deadline=deadline)
+            )
+        except CircuitOpenError as e:
+            return [unavailable_response(e) for _ in commands]
+        except asyncio.TimeoutError:
+            logger.warning(f"Qt batch timed out: {commands}")
+            return [{"success": False, "message": "Qt应用响应超时，命令可能仍在执行"} for _ in commands]
+        except Exception as e:
+            logger.error(f"Qt connection failed: {e}")
+            return [{"success": False, "message": f"连接Qt应用失败: {str(e)}"} for _ in commands]
 
-@mcp.tool()
-def test_button() -> str:
-    """
-    Click the test button in Qt application
-    
-    Returns:
-        Test button click result
+        if not isinstance(responses, list):
+            logger.info("Qt应用不支持批量请求，改为逐条发送")
+            return [await self.send_command(command, deadline=deadline) for command in commands]
+        by_id = {r.get("id"): r for r in responses if isinstance(r, dict)}
+        return [by_id.get(m["id"], responses[i] if i < len(responses) else {})
+                for i, m in enumerate(messages)]
+
+    async def close(self):
+        """Close pooled connections"""
+        await self.pool.close()
+
+def unavailable_response(error: CircuitOpenError) -> dict:
+    """Structured fast-fail result (JSON-RPC error shape) while the circuit breaker is open"""
+    return {
+        "success": False,
+        "error": {
+            "code": -32000,
+            "message": (f"Qt应用当前不可用（连续连接失败，已暂停访问），"
+                        f"约{max(error.retry_after, 1):.0f}秒后自动恢复探测，请勿重复调用"),
+            "data": {"reason": "circuit_open", "retryAfter": round(error.retry_after, 3)},
+        },
+    }
+
+# Create Qt client instance (shared by all tools)
+qt_client = QtClient(
+    host=os.getenv("QT_HOST", "localhost"),
+    port=int(os.getenv("QT_PORT", "8088")),
+    # Qt和MCP服务器在同一台机器时，可改用Qt的本地套接字（MCP_LOCAL_SOCKET）
+    socket_path=os.getenv("QT_SOCKET_PATH") or None,
+    min_size=int(os.getenv("QT_POOL_MIN_SIZE", "1")),
+    max_size=int(os.getenv("QT_POOL_MAX_SIZE", "4")),
+    idle_timeout=float(os.getenv("QT_POOL_IDLE_TIMEOUT", "60")),
+    framing=os.getenv("QT_FRAMING", FRAMING_AUTO),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("QT_BREAKER_THRESHOLD", "3")),
+        backoff=float(os.getenv("QT_BREAKER_BACKOFF", "1")),
+        max_backoff=float(os.getenv("QT_BREAKER_MAX_BACKOFF", "30")),
+    ),
+)
+
+# Default time budget per call by command class, unless the command table sets one
+READ_TIMEOUT = float(os.getenv("QT_READ_TIMEOUT", "5"))
+WRITE_TIMEOUT = float(os.getenv("QT_WRITE_TIMEOUT", "30"))
+
+# Write-through replica answering get_state within the freshness bound
+state_replica = QtStateReplica(max_age=float(os.getenv("QT_STATE_MAX_AGE", "2")))
+
+# Coalesces concurrent identical idempotent commands into one Qt request
+single_flight = SingleFlight()
+
+async def run_command(command: QtCommand, arguments: dict, force_refresh: bool = False,
+                      deadline: Optional[float] = None) -> str:
     """
-    import asyncio
-    
-    async def _do_test():
-        response = await qt_client.send_command("testbutton")
-        return format_qt_response(response, "测试按钮")
-    
-    try:
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            import concurrent.futures
-            import threading
-            
-            def run_in_thread():
-                new_loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(new_loop)
-                try:
-                    return new_loop.run_until_complete(_do_test())
-                finally:
-                    new_loop.close()
-            
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(run_in_thread)
-                return future.result(timeout=30)
-        else:
-            return asyncio.run(_do_test())
-    except Exception as e:
-        logger.error(f"测试按钮失败: {e}")
-        return f"测试按钮失败: {str(e)}"
+    Execute a Qt command table entry and format the result
 
-@mcp.tool()
-def get_state() -> str:
+    deadline (time.monotonic()) is propagated down to the socket read;
+    by default it is the command's budget from now.
     """
-    Get current state of Qt application
+    if deadline is None:
+        deadline = time.monotonic() + command.budget(READ_TIMEOUT, WRITE_TIMEOUT)
+    if command.replicated and not force_refresh:
+        cached = state_replica.get()
+        if cached is not None:
+            return (format_qt_response(cached, command.action)
+                    + f"\n数据来源: 本地状态副本 ({state_replica.age:.1f}秒前)")
     
-    Returns:
-        Application state information
-    """
-    import asyncio
+    version = state_replica.version
+    wire_command = command.encode(**arguments)
+    if command.idempotent:
+        # 并发的相同幂等命令只向Qt发送一次
+        response = await single_flight.do(
+            wire_command, lambda: qt_client.send_command(wire_command, retry=True, deadline=deadline)
+        )
+    else:
+        response = await qt_client.send_command(wire_command, retry=False, deadline=deadline)
+    if command.replicated:
+        state_replica.store(response, version)
+    elif not command.read_only:
+        state_replica.apply_write(command, arguments, response)
+    return format_qt_response(response, command.action)
+
+def make_command_tool(command: QtCommand):
+    """Build the async MCP tool function for a Qt command table entry"""
     
-    async def _do_get_state():
-        response = await qt_client.send_command("getstate")
-        return format_qt_response(response, "状态查询")
+    async def tool(force_refresh: bool = False, **arguments) -> str:
+        try:
+            return await run_command(command, arguments, force_refresh)
+        except Exception as e:
+            logger.error(f"{command.action}失败: {e}")
+            return f"{command.action}失败: {str(e)}"
     
-    try:
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            import concurrent.futures
-            import threading
-            
-            def run_in_thread():
-                new_loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(new_loop)
-                try:
-                    return new_loop.run_until_complete(_do_get_state())
-                finally:
-                    new_loop.close()
-            
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(run_in_thread)
-                return future.result(timeout=30)
-        else:
-            return asyncio.run(_do_get_state())
-    except Exception as e:
-        logger.error(f"状态查询失败: {e}")
-        return f"状态查询失败: {str(e)}"
+    parameters = [
+        inspect.Parameter(p.name, inspect.Parameter.KEYWORD_ONLY,
+                          annotation=Annotated[p.type, Field(description=p.description)])
+        for p in command.params
+    ]
+    if command.replicated:
+        parameters.append(inspect.Parameter(
+            "force_refresh", inspect.Parameter.KEYWORD_ONLY, default=False,
+            annotation=Annotated[bool, Field(description="Bypass the local state replica and query Qt directly")],
+        ))
+    tool.__name__ = command.name
+    tool.__doc__ = command.description
+    tool.__signature__ = inspect.Signature(parameters, return_annotation=str)
+    return tool
+
+def register_command_tools() -> dict:
+    """Register one FastMCP tool per entry of the Qt command table"""
+    tools = {}
+    for command in QT_COMMANDS:
+        tool = make_command_tool(command)
+        mcp.tool(
+            name=command.name,
+            description=command.description,
+            annotations=ToolAnnotations(
+                readOnlyHint=command.read_only,
+                idempotentHint=command.idempotent,
+            ),
+        )(tool)
+        tools[command.name] = tool
+    return tools
+
+TOOLS = register_command_tools()
+login = TOOLS["login"]
+test_button = TOOLS["test_button"]
+get_state = TOOLS["get_state"]
 
 def format_qt_response(response: dict, action: str) -> str:
     """Format Qt application response for display"""
@@ -219,14 +274,17 @@ def format_qt_response(response: dict, action: str) -> str:
 @mcp.resource("resource://qt-control/status")
 def get_server_status() -> str:
     """Get MCP server status"""
-    return """
+    tool_lines = "\n".join(
+        f"  - {c.name}({', '.join(p.name for p in c.params)}) - {c.action}"
+        f" (超时 {c.budget(READ_TIMEOUT, WRITE_TIMEOUT):g}秒)"
+        for c in QT_COMMANDS
+    )
+    return f"""
 🚀 MCP Qt控制服务器运行中
 
-📱 连接目标: Qt应用 (localhost:8088)
+📱 连接目标: Qt应用 ({qt_client.pool.target})
 🛠️ 可用工具:
-  - login(account, password) - 登录到Qt应用
-  - test_button() - 点击测试按钮
-  - get_state() - 获取应用状态
+{tool_lines}
 
 使用方法:
 - 请帮我登录Qt应用，账号是admin，密码是123456
@@ -234,6 +292,25 @@ def get_server_status() -> str:
 - 请查看Qt应用的当前状态
 """
 
+@mcp.resource("resource://qt-control/pool")
+def get_pool_stats() -> str:
+    """Get Qt connection pool statistics"""
+    stats = qt_client.pool.stats.to_dict()
+    stats["open"] = qt_client.pool.size
+    stats["idle"] = qt_client.pool.idle_count
+    stats["single_flight"] = single_flight.stats()
+    return json.dumps(stats, ensure_ascii=False, indent=2)
+
+@mcp.resource("resource://qt-control/health")
+def get_health() -> str:
+    """Get Qt application health as seen by the circuit breaker"""
+    return json.dumps(qt_client.breaker.stats(), ensure_ascii=False, indent=2)
+
+@mcp.resource("resource://qt-control/state-replica")
+def get_state_replica_stats() -> str:
+    """Get Qt state replica statistics"""
+    return json.dumps(state_replica.stats(), ensure_ascii=False, indent=2)
+
 # Add a prompt for better user interaction
 @mcp.prompt()
 def qt_control_prompt(action: str = "login") -> str:
@@ -268,6 +345,9 @@ if __name__ == "__main__":
                 
         except Exception as e:
             logger.error(f"❌ Qt应用连接失败: {e}")
+        finally:
+            # 连接属于当前事件循环，MCP服务器会在新的事件循环中重新建立
+            await qt_client.close()
     
     # 检查命令行参数
     if len(sys.argv) > 1 and sys.argv[1] == "test":
@@ -0,0 +1,138 @@
+"""
+Circuit breaker for the Qt bridge
+
+After a run of consecutive transport failures (refused connects, dropped
+sockets, timeouts) the breaker opens and calls fail immediately instead of
+each paying a connect timeout. After a backoff one call is let through as
+a probe (half-open): success closes the breaker, failure reopens it with
+the backoff doubled up to a maximum.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of calling Qt while the breaker is open"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Qt应用不可用，熔断器已打开，{retry_after:.1f}秒后重试")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker shared by all Qt calls
+
+    Args:
+        failure_threshold: consecutive failures that open the breaker
+        backoff: seconds the breaker stays open the first time
+        max_backoff: upper bound of the doubled backoff
+    """
+
+    # Transport-level failures; error responses from Qt do not count
+    FAILURES = (ConnectionError, OSError, asyncio.TimeoutError)
+
+    def __init__(self, failure_threshold: int = 3, backoff: float = 1.0,
+                 max_backoff: float = 30.0):
+        if failure_threshold < 1:
+            raise ValueError(f"invalid failure threshold: {failure_threshold}")
+        self.failure_threshold = failure_threshold
+        self.base_backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.state = CLOSED
+        self.failures = 0
+        self.backoff = backoff
+        self.opened = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._last_error: Optional[str] = None
+
+    @property
+    def healthy(self) -> bool:
+        """Shared health flag: False while calls are being rejected"""
+        return self.state == CLOSED
+
+    @property
+    def retry_after(self) -> float:
+        """Seconds until the next probe is allowed (0 when not open)"""
+        if self.state != OPEN:
+            return 0.0
+        return max(self._opened_at + self.backoff - time.monotonic(), 0.0)
+
+    def allow(self) -> bool:
+        """Whether a call may go to Qt now; starts the probe when one is due"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self.retry_after == 0.0:
+            self.state = HALF_OPEN
+            self._probing = True
+            logger.info("熔断器半开，发送探测请求")
+            return True
+        return False
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn() under the breaker; raises CircuitOpenError when rejected"""
+        if not self.allow():
+            self.rejected += 1
+            raise CircuitOpenError(self.retry_after)
+        try:
+            result = await fn()
+        except self.FAILURES as e:
+            self.record_failure(e)
+            raise
+        except BaseException:
+            # cancelled or unexpected: neither outcome, let the next call probe
+            if self._probing:
+                self._probing = False
+                self.state = OPEN
+                self._opened_at = time.monotonic() - self.backoff
+            raise
+        self.record_success()
+        return result
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info("Qt应用已恢复，熔断器关闭")
+        self.state = CLOSED
+        self.failures = 0
+        self.backoff = self.base_backoff
+        self._probing = False
+
+    def record_failure(self, error: Optional[BaseException] = None):
+        self.failures += 1
+        self._last_error = repr(error) if error is not None else None
+        if self.state == HALF_OPEN:
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+            self._open()
+        elif self.state == CLOSED and self.failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened += 1
+        self._opened_at = time.monotonic()
+        self._probing = False
+        logger.warning(f"Qt应用连续失败{self.failures}次，熔断器打开 {self.backoff:.1f}秒")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "backoff": self.backoff,
+            "retry_after": round(self.retry_after, 3),
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "last_error": self._last_error,
+        }
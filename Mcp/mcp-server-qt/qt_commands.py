@@ -0,0 +1,109 @@
+"""
+Declarative Qt command table
+
+Every command the Qt application understands is described once here.
+main.py generates the FastMCP tools from this table, and the caching,
+retry and scheduling layers read the per-command metadata from it.
+
+The wire keywords must match the command table in App/mcpprocessor.cpp.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class CommandParam:
+    """A single tool argument, encoded positionally on the wire"""
+    name: str
+    description: str
+    type: type = str
+
+
+@dataclass(frozen=True)
+class QtCommand:
+    """
+    A Qt command and the MCP tool generated for it
+
+    Args:
+        name: MCP tool name
+        wire: Qt command keyword (``login``, ``testbutton``...)
+        action: display name used in formatted responses
+        description: tool description shown to MCP clients
+        params: tool arguments, appended to the keyword as ``wire:a:b``
+        read_only: the command does not change Qt application state
+        idempotent: repeating the command has no additional effect
+        timeout: time budget in seconds for one call; None uses the
+            configured default of its class (read or write)
+        replicated: reads may be answered from the local state replica
+        state_effect: for write commands, returns the state fields a
+            successful call changes, given (current state data, arguments);
+            writes without it invalidate the replica instead
+    """
+    name: str
+    wire: str
+    action: str
+    description: str
+    params: Tuple[CommandParam, ...] = ()
+    read_only: bool = False
+    idempotent: bool = False
+    timeout: Optional[float] = None
+    replicated: bool = False
+    state_effect: Optional[Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]] = None
+
+    def encode(self, **arguments: Any) -> str:
+        """Build the Qt wire command, e.g. ``login:admin:123456``"""
+        values = [str(arguments[param.name]) for param in self.params]
+        return ":".join([self.wire] + values)
+
+    def budget(self, read_timeout: float, write_timeout: float) -> float:
+        """Time budget for one call: the explicit timeout, else the class default"""
+        if self.timeout is not None:
+            return self.timeout
+        return read_timeout if self.read_only else write_timeout
+
+
+QT_COMMANDS: Tuple[QtCommand, ...] = (
+    QtCommand(
+        name="login",
+        wire="login",
+        action="登录",
+        description="Login to Qt application",
+        params=(
+            CommandParam("account", "User account name"),
+            CommandParam("password", "User password"),
+        ),
+        # Not idempotent: every Qt login opens a modal dialog and resets the
+        # session, so it is neither coalesced nor resent on a stale socket
+        state_effect=lambda state, args: {
+            "isLoggedIn": True,
+            "currentAccount": args["account"],
+        },
+    ),
+    QtCommand(
+        name="test_button",
+        wire="testbutton",
+        action="测试按钮",
+        description="Click the test button in Qt application",
+        state_effect=lambda state, args: {
+            "testButtonClickCount": state.get("testButtonClickCount", 0) + 1,
+        },
+    ),
+    QtCommand(
+        name="get_state",
+        wire="getstate",
+        action="状态查询",
+        description="Get current state of Qt application",
+        read_only=True,
+        idempotent=True,
+        replicated=True,
+    ),
+)
+
+COMMANDS_BY_NAME: Dict[str, QtCommand] = {command.name: command for command in QT_COMMANDS}
+COMMANDS_BY_WIRE: Dict[str, QtCommand] = {command.wire: command for command in QT_COMMANDS}
+
+
+def lookup_wire(command: str) -> Optional[QtCommand]:
+    """Find the table entry for a raw wire command, or None"""
+    return COMMANDS_BY_WIRE.get(command.split(":", 1)[0])
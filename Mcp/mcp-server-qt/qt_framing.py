@@ -0,0 +1,119 @@
+"""
+Wire framing for the Qt protocol
+
+The Qt application speaks newline-delimited JSON by default. A client may
+send a ``hello`` request to negotiate length-prefixed frames (4-byte
+big-endian length + payload), optionally CBOR encoded. Qt applications
+without negotiation support answer ``hello`` with an error, and the
+connection stays in line mode.
+"""
+
+import asyncio
+import json
+import logging
+import struct
+from typing import Any, List
+
+try:
+    import cbor2
+    CBOR_AVAILABLE = True
+except ImportError:
+    CBOR_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+FRAMING_LINE = "line"
+FRAMING_LENGTH_PREFIXED = "length-prefixed"
+FRAMING_AUTO = "auto"
+
+# Must match MAX_FRAME_SIZE in App/mcpserver.cpp
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+_HEADER = struct.Struct(">I")
+
+
+class LineCodec:
+    """Newline-delimited JSON; non-JSON response lines are returned as text"""
+
+    name = FRAMING_LINE
+    encoding = "json"
+
+    def encode(self, message: Any) -> bytes:
+        return (json.dumps(message) + '\n').encode('utf-8')
+
+    async def read(self, reader: asyncio.StreamReader) -> Any:
+        response_line = await reader.readline()
+        if not response_line:
+            raise ConnectionError("Qt应用连接已关闭")
+        response_str = response_line.decode('utf-8').strip()
+        try:
+            return json.loads(response_str)
+        except json.JSONDecodeError:
+            return response_str
+
+
+class FrameCodec:
+    """Length-prefixed frames carrying JSON or CBOR payloads"""
+
+    name = FRAMING_LENGTH_PREFIXED
+
+    def __init__(self, encoding: str = "json"):
+        if encoding == "cbor" and not CBOR_AVAILABLE:
+            raise ValueError("CBOR编码需要安装cbor2")
+        self.encoding = encoding
+
+    def encode(self, message: Any) -> bytes:
+        if self.encoding == "cbor":
+            payload = cbor2.dumps(message)
+        else:
+            payload = json.dumps(message, separators=(',', ':')).encode('utf-8')
+        return _HEADER.pack(len(payload)) + payload
+
+    async def read(self, reader: asyncio.StreamReader) -> Any:
+        try:
+            header = await reader.readexactly(_HEADER.size)
+            (length,) = _HEADER.unpack(header)
+            if length > MAX_FRAME_SIZE:
+                raise ConnectionError(f"消息帧过大: {length}")
+            payload = await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            raise ConnectionError("Qt应用连接已关闭")
+        if self.encoding == "cbor":
+            return cbor2.loads(payload)
+        return json.loads(payload)
+
+
+def offered_encodings() -> List[str]:
+    """Encodings this client can decode, most compact first"""
+    return ["cbor", "json"] if CBOR_AVAILABLE else ["json"]
+
+
+async def negotiate(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                    framing: str = FRAMING_AUTO):
+    """
+    Pick the codec for a new connection
+
+    framing: ``line`` skips negotiation; ``auto`` and ``length-prefixed``
+    send a hello request and fall back to line mode if Qt declines.
+    """
+    line_codec = LineCodec()
+    if framing == FRAMING_LINE:
+        return line_codec
+
+    hello = {
+        "id": "hello",
+        "method": "hello",
+        "params": {
+            "framing": [FRAMING_LENGTH_PREFIXED, FRAMING_LINE],
+            "encodings": offered_encodings(),
+        },
+    }
+    writer.write(line_codec.encode(hello))
+    await writer.drain()
+    response = await line_codec.read(reader)
+
+    result = response.get("result") if isinstance(response, dict) else None
+    data = result.get("data", {}) if isinstance(result, dict) else {}
+    if data.get("framing") != FRAMING_LENGTH_PREFIXED:
+        logger.info("Qt应用不支持帧格式协商，使用行模式")
+        return line_codec
+    return FrameCodec(data.get("encoding", "json"))
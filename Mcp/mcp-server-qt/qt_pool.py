@@ -0,0 +1,409 @@
+"""
+Qt TCP connection pool
+
+Keeps keep-alive connections to the Qt application (TCP port 8088, or a
+Unix domain socket when Qt runs on the same host) so that MCP tools share
+sockets instead of paying a handshake and teardown for every command.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, asdict
+from typing import Any, Deque, Optional
+
+from qt_framing import FRAMING_AUTO, LineCodec, negotiate
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PoolStats:
+    """Per-pool counters, used to observe connection reuse"""
+    acquired: int = 0
+    created: int = 0
+    reused: int = 0
+    closed: int = 0
+    evicted_idle: int = 0
+    failed_health_checks: int = 0
+    reconnects: int = 0
+    waits: int = 0
+    timeouts: int = 0
+
+    @property
+    def reuse_rate(self) -> float:
+        """Fraction of acquisitions served by an already open connection"""
+        return self.reused / self.acquired if self.acquired else 0.0
+
+    def to_dict(self) -> dict:
+        stats = asdict(self)
+        stats["reuse_rate"] = round(self.reuse_rate, 4)
+        return stats
+
+
+class QtConnection:
+    """A single persistent connection to the Qt application"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, codec=None):
+        self.reader = reader
+        self.writer = writer
+        self.codec = codec or LineCodec()
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+
+    @property
+    def is_closed(self) -> bool:
+        """True once either side has closed the socket"""
+        return self.writer.is_closing() or self.reader.at_eof()
+
+    async def roundtrip(self, message: Any, timeout: Optional[float] = None) -> Any:
+        """
+        Send one message with the negotiated framing and read one response
+
+        On timeout the response may still arrive later, so the caller must
+        not reuse the connection.
+        """
+        return await asyncio.wait_for(self._roundtrip(message), timeout)
+
+    async def _roundtrip(self, message: Any) -> Any:
+        self.writer.write(self.codec.encode(message))
+        await self.writer.drain()
+        return await self.codec.read(self.reader)
+
+    async def close(self):
+        """Close the socket, ignoring errors from an already dead peer"""
+        try:
+            self.writer.close()
+            await self.writer.wait_closed()
+        except Exception:
+            pass
+
+    def abort(self):
+        """Drop the socket without waiting (used when its event loop is gone)"""
+        try:
+            self.writer.transport.abort()
+        except Exception:
+            pass
+
+
+class QtConnectionPool:
+    """
+    Keep-alive connection pool for the Qt application
+
+    Args:
+        host: Qt application host
+        port: Qt application port
+        min_size: connections kept open even when idle
+        max_size: upper bound of open connections, further callers wait
+        idle_timeout: seconds after which surplus idle connections are closed
+        health_check_interval: seconds between background health sweeps
+        connect_timeout: seconds allowed for a TCP connect and framing negotiation
+        framing: ``auto``/``length-prefixed`` negotiate frames per connection,
+            ``line`` keeps newline-delimited JSON
+        socket_path: connect to this Unix domain socket (Qt's QLocalServer)
+            instead of host:port
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 8088,
+                 min_size: int = 1, max_size: int = 4,
+                 idle_timeout: float = 60.0, health_check_interval: float = 15.0,
+                 connect_timeout: float = 5.0, framing: str = FRAMING_AUTO,
+                 socket_path: Optional[str] = None):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"invalid pool size: min={min_size} max={max_size}")
+        self.host = host
+        self.port = port
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.connect_timeout = connect_timeout
+        self.framing = framing
+        self.socket_path = socket_path
+        self.stats = PoolStats()
+
+        self._idle: Deque[QtConnection] = deque()
+        self._size = 0
+        self._queued = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._cond: Optional[asyncio.Condition] = None
+        self._maintenance_task: Optional[asyncio.Task] = None
+
+    @property
+    def target(self) -> str:
+        """Human readable address of the Qt application"""
+        return f"unix:{self.socket_path}" if self.socket_path else f"{self.host}:{self.port}"
+
+    @property
+    def size(self) -> int:
+        """Number of open connections (idle + in use)"""
+        return self._size
+
+    @property
+    def idle_count(self) -> int:
+        return len(self._idle)
+
+    def _bind_loop(self):
+        """
+        Bind the pool to the running event loop
+
+        The server runs a startup check in one loop and then serves MCP in
+        another, so connections from a previous loop are dropped here.
+        Transports and tasks are not thread-safe: while the previous loop
+        is still alive they are released from inside that loop, and only
+        aborted directly once it has been closed.
+        """
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return
+        if self._loop is not None:
+            logger.info("事件循环已切换，丢弃旧的Qt连接")
+            stale = list(self._idle)
+            self.stats.closed += len(stale)
+            self._drop_stale(self._loop, stale, self._maintenance_task)
+        self._idle.clear()
+        self._size = 0
+        self._queued = 0
+        self._loop = loop
+        self._cond = asyncio.Condition()
+        self._maintenance_task = None
+
+    @staticmethod
+    def _drop_stale(old_loop: asyncio.AbstractEventLoop, connections, task: Optional[asyncio.Task]):
+        """Abort connections and stop maintenance belonging to a previous event loop"""
+        def drop():
+            if task is not None:
+                task.cancel()
+            for conn in connections:
+                conn.abort()
+
+        if not old_loop.is_closed():
+            try:
+                old_loop.call_soon_threadsafe(drop)
+                return
+            except RuntimeError:
+                # closed between the check and the call
+                pass
+        for conn in connections:
+            conn.abort()
+
+    async def _open(self, deadline: Optional[float] = None) -> QtConnection:
+        if self.socket_path:
+            connecting = asyncio.open_unix_connection(self.socket_path)
+        else:
+            connecting = asyncio.open_connection(self.host, self.port)
+        reader, writer = await asyncio.wait_for(
+            connecting, _remaining(deadline, self.connect_timeout)
+        )
+        try:
+            codec = await asyncio.wait_for(negotiate(reader, writer, self.framing),
+                                           _remaining(deadline, self.connect_timeout))
+        except BaseException:
+            writer.close()
+            raise
+        self.stats.created += 1
+        logger.debug(f"新建Qt连接 {self.target} ({codec.name}/{codec.encoding})")
+        return QtConnection(reader, writer, codec)
+
+    async def acquire(self, deadline: Optional[float] = None) -> QtConnection:
+        """
+        Take an open connection from the pool, connecting if needed
+
+        deadline: time.monotonic() value after which waiting for a free
+        slot or connecting raises asyncio.TimeoutError
+        """
+        self._bind_loop()
+        self._start_maintenance()
+        async with self._cond:
+            # callers already waiting go first, a newcomer must not take the
+            # connection that was just released for them
+            if self._queued:
+                await self._wait(deadline)
+            while True:
+                while self._idle:
+                    conn = self._idle.pop()
+                    if conn.is_closed:
+                        self.stats.failed_health_checks += 1
+                        await self._discard(conn)
+                        continue
+                    self.stats.acquired += 1
+                    self.stats.reused += 1
+                    self._pass_on()
+                    return conn
+                if self._size < self.max_size:
+                    self._size += 1
+                    self._pass_on()
+                    break
+                await self._wait(deadline)
+
+        try:
+            conn = await self._open(deadline)
+        except BaseException:
+            async with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        self.stats.acquired += 1
+        return conn
+
+    async def _wait(self, deadline: Optional[float] = None):
+        """Queue behind other waiters (caller holds the condition)"""
+        self.stats.waits += 1
+        self._queued += 1
+        try:
+            await asyncio.wait_for(self._cond.wait(), _remaining(deadline))
+        except BaseException:
+            # a wake-up meant for this waiter must not be lost
+            self._queued -= 1
+            self._pass_on()
+            raise
+        self._queued -= 1
+
+    def _pass_on(self):
+        """Wake the next waiter if there is still capacity for it"""
+        if self._queued and (self._idle or self._size < self.max_size):
+            self._cond.notify()
+
+    async def release(self, conn: QtConnection, reusable: bool = True):
+        """Return a connection; broken or unwanted connections are closed"""
+        conn.last_used = time.monotonic()
+        conn.uses += 1
+        async with self._cond:
+            if reusable and not conn.is_closed:
+                self._idle.append(conn)
+            else:
+                await self._discard(conn)
+            self._cond.notify()
+
+    async def _discard(self, conn: QtConnection):
+        """Close a connection and free its slot (caller holds the condition)"""
+        self._size -= 1
+        self.stats.closed += 1
+        await conn.close()
+
+    @asynccontextmanager
+    async def connection(self):
+        """Async context manager around acquire/release"""
+        conn = await self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            await self.release(conn, reusable=False)
+            raise
+        else:
+            await self.release(conn)
+
+    async def roundtrip(self, message: Any, retry: bool = True,
+                        deadline: Optional[float] = None) -> Any:
+        """
+        Send a message on a pooled connection and return the decoded response
+
+        A reused connection may have been closed by the Qt side while idle;
+        in that case the request is retried once on a fresh connection,
+        unless retry is False (non-idempotent commands).
+
+        deadline bounds the whole call (pool wait, connect, retry and the
+        response read). When it passes, asyncio.TimeoutError is raised and
+        the connection is closed, since its late response would otherwise
+        be read by the next request.
+        """
+        try:
+            conn = await self.acquire(deadline)
+            reused = conn.uses > 0
+            try:
+                response = await conn.roundtrip(message, _remaining(deadline))
+            except asyncio.TimeoutError:
+                await self.release(conn, reusable=False)
+                raise
+            except (ConnectionError, OSError) as e:
+                await self.release(conn, reusable=False)
+                if not (reused and retry):
+                    raise
+                logger.info(f"复用的Qt连接已失效，重新连接: {e}")
+                self.stats.reconnects += 1
+                conn = await self.acquire(deadline)
+                try:
+                    response = await conn.roundtrip(message, _remaining(deadline))
+                except BaseException:
+                    await self.release(conn, reusable=False)
+                    raise
+            except BaseException:
+                await self.release(conn, reusable=False)
+                raise
+        except asyncio.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        await self.release(conn)
+        return response
+
+    def _start_maintenance(self):
+        if self._maintenance_task is None or self._maintenance_task.done():
+            self._maintenance_task = asyncio.ensure_future(self._maintain())
+
+    async def _maintain(self):
+        """Background sweep: health check, idle eviction and min_size refill"""
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            try:
+                await self._sweep()
+            except Exception as e:
+                logger.warning(f"连接池维护失败: {e}")
+
+    async def _sweep(self):
+        now = time.monotonic()
+        async with self._cond:
+            kept: Deque[QtConnection] = deque()
+            for conn in self._idle:
+                if conn.is_closed:
+                    self.stats.failed_health_checks += 1
+                    await self._discard(conn)
+                elif (now - conn.last_used > self.idle_timeout
+                      and self._size > self.min_size):
+                    self.stats.evicted_idle += 1
+                    await self._discard(conn)
+                else:
+                    kept.append(conn)
+            self._idle = kept
+            missing = self.min_size - self._size
+            self._size += max(missing, 0)
+
+        for _ in range(max(missing, 0)):
+            try:
+                conn = await self._open()
+            except Exception as e:
+                async with self._cond:
+                    self._size -= 1
+                logger.debug(f"连接池预热失败: {e}")
+                continue
+            async with self._cond:
+                self._idle.appendleft(conn)
+                self._cond.notify()
+
+    async def close(self):
+        """Close all idle connections and stop the maintenance task"""
+        if self._maintenance_task is not None:
+            self._maintenance_task.cancel()
+            try:
+                await self._maintenance_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._maintenance_task = None
+        if self._cond is None:
+            return
+        async with self._cond:
+            while self._idle:
+                await self._discard(self._idle.pop())
+            self._cond.notify_all()
+
+
+def _remaining(deadline: Optional[float], cap: Optional[float] = None) -> Optional[float]:
+    """Seconds left until deadline (at most cap); raises once it has passed"""
+    if deadline is None:
+        return cap
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise asyncio.TimeoutError()
+    return remaining if cap is None else min(remaining, cap)
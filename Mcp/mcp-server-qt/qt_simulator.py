@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Qt McpServer simulator
+
+A pure-asyncio stand-in for the Qt application's MCP TCP server
+(App/mcpserver.cpp, mcpprocessor.cpp, mcpexecutor.cpp). It speaks the same
+protocol: JSON-RPC and plain-text commands, JSON-RPC batch arrays, hello
+negotiation of length-prefixed JSON/CBOR frames, and the response shapes
+of McpProcessor::formatResponse. Service time, jitter, error and
+disconnect injection make it usable for load tests on headless machines.
+
+Usage:
+    python qt_simulator.py --port 8088 --service-time 0.01 --jitter 0.005
+    python qt_simulator.py --unix /tmp/mcp-qt.sock
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import struct
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional
+
+from qt_framing import CBOR_AVAILABLE, FRAMING_LENGTH_PREFIXED, MAX_FRAME_SIZE
+
+if CBOR_AVAILABLE:
+    import cbor2
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct(">I")
+
+
+@dataclass
+class SimulatorStats:
+    """Counters of the simulated Qt server"""
+    connections: int = 0
+    messages: int = 0
+    commands: int = 0
+    injected_errors: int = 0
+    injected_disconnects: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class _Disconnect(Exception):
+    """Raised to drop a client connection (disconnect injection)"""
+
+
+class QtSimulator:
+    """
+    Simulated Qt MCP server
+
+    Args:
+        host: listen address
+        port: listen port, 0 picks a free port
+        service_time: seconds the simulated GUI thread spends per command
+        jitter: uniform random extra service time in [0, jitter]
+        error_rate: probability that a command fails with an injected error
+        disconnect_rate: probability that a message drops the connection
+            instead of being answered
+        seed: random seed for reproducible injection
+        socket_path: listen on this Unix domain socket instead of host:port,
+            like the Qt application started with MCP_LOCAL_SOCKET
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8088,
+                 service_time: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, disconnect_rate: float = 0.0,
+                 seed: Optional[int] = None, socket_path: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.service_time = service_time
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.disconnect_rate = disconnect_rate
+        self.socket_path = socket_path
+        self.stats = SimulatorStats()
+
+        self.window_title = "MCP Qt Control Application"
+        self.application_version = ""
+        self.is_logged_in = False
+        self.current_account = ""
+        self.test_button_click_count = 0
+
+        self._random = random.Random(seed)
+        self._server: Optional[asyncio.AbstractServer] = None
+        # Qt executes every command on the single GUI thread
+        self._gui_thread: Optional[asyncio.Lock] = None
+
+    async def start(self):
+        """Start listening; self.port holds the bound port afterwards"""
+        self._gui_thread = asyncio.Lock()
+        if self.socket_path:
+            # 与QLocalServer::removeServer一样，先清理遗留的套接字文件
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self._server = await asyncio.start_unix_server(self._handle_client, self.socket_path)
+            logger.info(f"Qt模拟器已启动，监听本地套接字 {self.socket_path}")
+            return
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Qt模拟器已启动，监听 {self.host}:{self.port}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            if self.socket_path and os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            logger.info("Qt模拟器已停止")
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    # ---- connection handling (McpServer::onDataReceived) ----
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.stats.connections += 1
+        state = {"framing": "line", "cbor": False}
+        try:
+            while True:
+                if state["framing"] == "line":
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    message = line.decode('utf-8').strip()
+                    if not message:
+                        continue
+                    response = await self._process_message(message, state)
+                    payload = (_compact(response) + '\n').encode('utf-8')
+                    self._maybe_switch_framing(state)
+                else:
+                    try:
+                        header = await reader.readexactly(_HEADER.size)
+                        (length,) = _HEADER.unpack(header)
+                        if length > MAX_FRAME_SIZE:
+                            break
+                        frame = await reader.readexactly(length)
+                    except asyncio.IncompleteReadError:
+                        break
+                    response = await self._process_frame(frame, state)
+                    body = cbor2.dumps(response) if state["cbor"] else _compact(response).encode('utf-8')
+                    payload = _HEADER.pack(len(body)) + body
+                writer.write(payload)
+                await writer.drain()
+        except (_Disconnect, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            # 模拟器停止时正在处理的连接直接关闭
+            pass
+        finally:
+            writer.close()
+
+    def _maybe_switch_framing(self, state: Dict[str, Any]):
+        """After answering hello in line mode, switch to the negotiated framing"""
+        pending = state.pop("negotiated", None)
+        if pending is not None:
+            state.update(pending)
+
+    async def _process_message(self, message: str, state: Dict[str, Any]) -> Any:
+        """McpServer::processMessage"""
+        self.stats.messages += 1
+        if message.startswith("["):
+            try:
+                items = json.loads(message)
+            except json.JSONDecodeError:
+                items = None
+            if not isinstance(items, list) or not items:
+                return format_response("", False, "无效的批量请求")
+            return [await self._execute(self._parse_object(item, None)) for item in items]
+
+        if message.startswith("{"):
+            try:
+                obj = json.loads(message)
+            except json.JSONDecodeError:
+                obj = None
+            cmd = self._parse_object(obj if isinstance(obj, dict) else {}, message)
+        else:
+            cmd = parse_command(message)
+            cmd["id"] = str(int(time.time() * 1000))
+
+        if cmd["type"] == "hello":
+            return self._negotiate(cmd, state)
+        return await self._execute(cmd)
+
+    async def _process_frame(self, frame: bytes, state: Dict[str, Any]) -> Any:
+        """McpServer::processFrame"""
+        self.stats.messages += 1
+        try:
+            value = cbor2.loads(frame) if state["cbor"] else json.loads(frame)
+        except Exception:
+            value = None
+        if isinstance(value, list):
+            if not value:
+                return format_response("", False, "无效的批量请求")
+            return [await self._execute(self._parse_object(item, None)) for item in value]
+        if isinstance(value, dict):
+            cmd = self._parse_object(value, None)
+            if cmd["type"] == "hello":
+                return self._negotiate(cmd, state)
+            return await self._execute(cmd)
+        return format_response("", False, "无效的消息帧")
+
+    def _negotiate(self, cmd: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, Any]:
+        """McpServer::negotiateFraming"""
+        options = cmd.get("options", {})
+        length_prefixed = FRAMING_LENGTH_PREFIXED in options.get("framing", [])
+        cbor = length_prefixed and CBOR_AVAILABLE and "cbor" in options.get("encodings", [])
+        data = {
+            "framing": FRAMING_LENGTH_PREFIXED if length_prefixed else "line",
+            "encoding": "cbor" if cbor else "json",
+            "maxFrameSize": MAX_FRAME_SIZE,
+        }
+        new_state = {"framing": data["framing"], "cbor": cbor}
+        if state["framing"] == "line":
+            state["negotiated"] = new_state
+        else:
+            state.update(new_state)
+        return format_response(cmd["id"], True, "帧格式协商成功", data)
+
+    @staticmethod
+    def _parse_object(obj: Any, original: Optional[str]) -> Dict[str, Any]:
+        """McpProcessor::parseJsonObject"""
+        if not isinstance(obj, dict):
+            obj = {}
+        request_id = obj.get("id")
+        cmd = {"type": "unknown", "params": [], "original": original or "",
+               "id": request_id if isinstance(request_id, str) else ""}
+        method = obj.get("method")
+        params = obj.get("params") if isinstance(obj.get("params"), dict) else {}
+        if method == "execute" and "command" in params:
+            command = str(params["command"])
+            parsed = parse_command(command)
+            cmd["type"] = parsed["type"]
+            cmd["params"] = parsed["params"]
+            cmd["original"] = original or command
+        elif method == "hello":
+            cmd["type"] = "hello"
+            cmd["options"] = params
+        return cmd
+
+    # ---- command execution (McpServer::executeCommand / McpExecutor) ----
+
+    async def _execute(self, cmd: Dict[str, Any]) -> Dict[str, Any]:
+        async with self._gui_thread:
+            self.stats.commands += 1
+            delay = self.service_time + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.disconnect_rate and self._random.random() < self.disconnect_rate:
+                self.stats.injected_disconnects += 1
+                raise _Disconnect()
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.stats.injected_errors += 1
+                return format_response(cmd["id"], False, "模拟错误: 命令执行失败")
+
+            if cmd["type"] == "login":
+                if len(cmd["params"]) < 2:
+                    return format_response(cmd["id"], False, "登录参数不足")
+                return self._login(cmd["id"], cmd["params"][0], cmd["params"][1])
+            if cmd["type"] == "testbutton":
+                self.test_button_click_count += 1
+                return format_response(cmd["id"], True, "测试按钮执行成功", {
+                    "buttonClicked": True,
+                    "clickTime": _qt_time(),
+                })
+            if cmd["type"] == "getstate":
+                return format_response(cmd["id"], True, "状态获取成功", {
+                    "windowTitle": self.window_title,
+                    "isVisible": True,
+                    "isEnabled": True,
+                    "currentTime": _qt_time(),
+                    "applicationVersion": self.application_version,
+                    "isLoggedIn": self.is_logged_in,
+                    "currentAccount": self.current_account,
+                    "testButtonClickCount": self.test_button_click_count,
+                })
+            return format_response(cmd["id"], False, "未知命令: " + cmd["original"])
+
+    def _login(self, request_id: str, account: str, password: str) -> Dict[str, Any]:
+        """McpExecutor::executeLogin + MainWindow::performLogin"""
+        if not (3 <= len(account) <= 50 and 3 <= len(password) <= 100):
+            return format_response(request_id, False, "账号或密码格式无效")
+        self.is_logged_in = True
+        self.current_account = account
+        return format_response(request_id, True, "登录成功", {
+            "account": account,
+            "loginTime": _qt_time(),
+        })
+
+
+# Command keywords and parameter counts, as in COMMAND_SPECS (mcpprocessor.cpp)
+_COMMAND_SPECS = {"login": 2, "testbutton": 0, "getstate": 0}
+
+
+def parse_command(command: str) -> Dict[str, Any]:
+    """McpProcessor::parseCommand"""
+    keyword, separator, _ = command.partition(":")
+    param_count = _COMMAND_SPECS.get(keyword)
+    cmd = {"type": "unknown", "params": [], "original": command, "id": ""}
+    if param_count is None or (param_count > 0) != bool(separator):
+        return cmd
+    cmd["type"] = keyword
+    parts = command.split(":")
+    if len(parts) > param_count:
+        cmd["params"] = parts[1:1 + param_count]
+    return cmd
+
+
+def format_response(request_id: str, success: bool, message: str,
+                    data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """McpProcessor::formatResponseObject"""
+    data = data or {}
+    result: Dict[str, Any] = {"success": success, "message": message}
+    if data:
+        result["data"] = data
+    if success:
+        return {"id": request_id, "result": result}
+    return {"id": request_id, "error": {"code": -1, "message": message, "data": data}}
+
+
+def _compact(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _qt_time() -> str:
+    """Same shape as QDateTime::currentDateTime().toString()"""
+    return time.strftime("%a %b %d %H:%M:%S %Y")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Qt McpServer模拟器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--unix", default=None, help="改为监听此Unix域套接字路径")
+    parser.add_argument("--service-time", type=float, default=0.0, help="每条命令的处理时间(秒)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="处理时间随机抖动上限(秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="注入失败响应的概率")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0, help="注入断开连接的概率")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    simulator = QtSimulator(
+        host=args.host, port=args.port, service_time=args.service_time,
+        jitter=args.jitter, error_rate=args.error_rate,
+        disconnect_rate=args.disconnect_rate, seed=args.seed, socket_path=args.unix,
+    )
+    try:
+        asyncio.run(simulator.serve_forever())
+    except KeyboardInterrupt:
+        print("\nQt模拟器退出")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Single-flight coalescing for Qt commands
+
+Concurrent calls with the same key share one in-flight request, so a
+burst of identical idempotent commands (e.g. several clients calling
+get_state at once) costs the Qt GUI thread a single command.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """Share one in-flight coroutine among concurrent callers of the same key"""
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn() for key, or join the call already running for key
+
+        The shared call runs as its own task, so cancelling one caller
+        does not cancel the request for the others.
+        """
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "shared": self.shared,
+            "share_rate": round(self.shared / self.calls, 4) if self.calls else 0.0,
+            "inflight": self.inflight,
+        }
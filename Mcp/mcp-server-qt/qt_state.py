@@ -0,0 +1,95 @@
+"""
+Write-through replica of the Qt application state
+
+Holds the last successful ``getstate`` response. Write commands issued
+through this server patch it with their declared state effect, so reads
+within the freshness bound are answered from memory instead of a round
+trip into the Qt GUI thread. Changes made directly in the Qt GUI (e.g.
+clicking "退出登录") are picked up once the freshness bound expires.
+"""
+
+import copy
+import time
+from typing import Any, Dict, Optional
+
+from qt_commands import QtCommand
+
+
+class QtStateReplica:
+    """
+    In-memory copy of the Qt ``getstate`` response
+
+    Args:
+        max_age: freshness bound in seconds; 0 disables the replica
+    """
+
+    def __init__(self, max_age: float = 2.0):
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._response: Optional[Dict[str, Any]] = None
+        self._updated_at = 0.0
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        """Bumped on every write, used to drop reads that raced a write"""
+        return self._version
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the replica was last refreshed, None when empty"""
+        if self._response is None:
+            return None
+        return time.monotonic() - self._updated_at
+
+    def get(self) -> Optional[Dict[str, Any]]:
+        """Return a copy of the replicated response if it is fresh enough"""
+        age = self.age
+        if age is None or age > self.max_age:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return copy.deepcopy(self._response)
+
+    def store(self, response: Dict[str, Any], version: int):
+        """
+        Replace the replica with a fresh getstate response
+
+        version is the value of self.version when the read was sent; a
+        response that raced a write is discarded.
+        """
+        if version != self._version or not _is_success(response):
+            return
+        self._response = copy.deepcopy(response)
+        self._updated_at = time.monotonic()
+
+    def apply_write(self, command: QtCommand, arguments: Dict[str, Any],
+                    response: Dict[str, Any]):
+        """Write-through: patch the replica with the effect of a write command"""
+        self._version += 1
+        if self._response is None:
+            return
+        if command.state_effect is None or not _is_success(response):
+            self.invalidate()
+            return
+        data = self._response["result"].setdefault("data", {})
+        data.update(command.state_effect(data, arguments))
+
+    def invalidate(self):
+        self._response = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "max_age": self.max_age,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "age": None if self.age is None else round(self.age, 3),
+        }
+
+
+def _is_success(response: Dict[str, Any]) -> bool:
+    result = response.get("result")
+    return isinstance(result, dict) and bool(result.get("success"))
@@ -65,11 +65,10 @@ if __name__ == "__main__":
         if not any(t.name == 'login' for t in tools):
             print("\n⚠️ 问题发现: login工具未注册")
             print("💡 可能原因:")
-            print("  1. async函数定义导致注册失败")
-            print("  2. FastMCP版本兼容性问题")
-            print("  3. 装饰器问题")
+            print("  1. FastMCP版本过旧，不支持async工具")
+            print("  2. 装饰器问题")
             print("\n🔧 修复建议:")
-            print("  重新定义login工具为同步函数")
+            print("  升级FastMCP: pip install --upgrade mcp fastmcp")
         else:
             print("\n✅ 所有工具注册正常")
             
@@ -207,45 +207,67 @@ async def main():
         print(f"\n🔗 MCP服务器: {mcp_server_url}")
         await mcp_client.connect_to_server(mcp_server_url)
         
-        # 获取可用工具列表并格式化为系统提示的一部分
-        tools = await mcp_client.list_tools()
-        tools_description = json.dumps(tools, ensure_ascii=False, indent=2)
+        if llm_client.function_calling:
+            # 工具定义随每次请求通过tools参数传递，系统提示词中不再附带工具列表
+            tools_section = "可用工具已通过函数调用接口提供。"
+            response_rules = '''
+        1、当识别到操作指令时，直接调用对应的函数，参数从语音识别结果中提取；
+        一句话包含多个操作时，在同一次回复中按执行顺序调用全部函数
+
+        2、不要在回复中输出工具调用的JSON文本
+'''
+            fault_tolerance = '''
+         - "登录账号wyx密码124" → 调用 login，account=wyx，password=124
+         - "账号是wyx，密码是124，登录" → 调用 login，account=wyx，password=124
+         - "测试一下按钮" → 调用 test_button，random_string=test
+         - "登录wyx密码124然后看下状态" → 依次调用 login 和 get_state
+'''
+        else:
+            # 获取可用工具列表并格式化为系统提示的一部分
+            tools = await mcp_client.list_tools()
+            tools_description = json.dumps(tools, ensure_ascii=False, indent=2)
+            tools_section = f"可用工具：{tools_description}"
+            response_rules = '''
+        1、当识别到操作指令时，返回严格的JSON格式：
+        {
+            "tool": "tool-name",
+            "arguments": {
+                "argument-name": "value"
+            }
+        }
+        一句话包含多个操作时，返回按执行顺序排列的数组，互不依赖的调用会同时执行；
+        必须等前面的调用完成后才能执行的调用，加上 "depends_on_previous": true
+
+        2、禁止包含以下内容：
+         - Markdown标记（如```json）
+         - 自然语言解释前缀
+         - 多余的格式化符号
+'''
+            fault_tolerance = '''
+         - "登录账号wyx密码124" → {"tool":"login","arguments":{"account":"wyx","password":"124"}}
+         - "账号是wyx，密码是124，登录" → {"tool":"login","arguments":{"account":"wyx","password":"124"}}
+         - "测试一下按钮" → {"tool":"test_button","arguments":{"random_string":"test"}}
+         - "登录wyx密码124然后看下状态" → [{"tool":"login","arguments":{"account":"wyx","password":"124"}},{"tool":"get_state","arguments":{},"depends_on_previous":true}]
+'''
 
         # QT应用控制专用系统提示词（语音优化版）
         system_message = f'''
         你是一个QT应用程序语音控制助手，专门帮助用户通过语音或文字操作QT应用程序。
 
-        可用工具：{tools_description}
+        {tools_section}
 
         语音交互优化规则：
         1、语音识别结果可能包含口语化表达，需要智能理解用户意图
         2、支持模糊匹配，如"登陆"→"登录"，"用户名wyx密码124"→提取用户名和密码
         3、对于不完整的语音指令，主动询问缺失信息
 
-        响应规则：
-        1、当识别到操作指令时，返回严格的JSON格式：
-        {{
-            "tool": "tool-name",
-            "arguments": {{
-                "argument-name": "value"
-            }}
-        }}
-
-        2、禁止包含以下内容：
-         - Markdown标记（如```json）
-         - 自然语言解释前缀
-         - 多余的格式化符号
-
+        响应规则：{response_rules}
         3、常见语音指令映射：
          - "登录" "登陆" "账号登录" → 使用 login 工具
          - "点击测试" "测试按钮" "按钮测试" → 使用 test_button 工具  
          - "查看状态" "应用状态" "当前状态" → 使用 get_state 工具
 
-        4、语音识别容错：
-         - "登录账号wyx密码124" → {{"tool":"login","arguments":{{"account":"wyx","password":"124"}}}}
-         - "账号是wyx，密码是124，登录" → {{"tool":"login","arguments":{{"account":"wyx","password":"124"}}}}
-         - "测试一下按钮" → {{"tool":"test_button","arguments":{{"random_string":"test"}}}}
-
+        4、语音识别容错：{fault_tolerance}
         5、执行结果反馈：
          - 将工具执行结果转化为友好的中文回应
          - 突出操作成功/失败状态
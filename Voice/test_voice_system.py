@@ -240,6 +240,88 @@ def test_integration():
         return False
 
 
+async def test_deferred_tool_reply():
+    """测试本地执行的工具结果交给LLM回复时，语音会话仍会回复用户"""
+    print("\n=== 本地执行结果交给LLM回复测试 ===")
+    
+    try:
+        mcp_client_dir = current_dir.parent / "Mcp" / "mcp-client"
+        sys.path.insert(0, str(mcp_client_dir))
+        from voice_chat_session import VoiceChatSession
+        from completion_cache import CompletionCache
+        
+        class MockLLMClient:
+            """与LLMClient的属性和get_response签名一致，记录每次请求的消息"""
+            function_calling = False
+            
+            def __init__(self):
+                self.cache = CompletionCache(path="")
+                self.requests = []
+            
+            async def get_response(self, messages, on_text=None, tools=None,
+                                   cacheable=False, storable=None):
+                self.requests.append(list(messages))
+                return "应用当前运行正常"
+            
+            async def close(self):
+                self.cache.close()
+        
+        class MockMCPClient:
+            """只提供get_state工具的MCP客户端"""
+            def __init__(self):
+                self.calls = []
+            
+            async def get_tool(self, name):
+                return {"name": name, "inputSchema": {"type": "object", "properties": {}}} if name == "get_state" else None
+            
+            def tool_names(self):
+                return ["get_state"]
+            
+            def validate_arguments(self, name, arguments):
+                return None if name == "get_state" else f"未知工具: {name}"
+            
+            def is_idempotent(self, name):
+                return True
+            
+            def is_read_only(self, name):
+                return True
+            
+            async def execute_tool(self, name, arguments):
+                self.calls.append(name)
+                return "获取状态结果: ✅ 成功\n消息: 状态获取成功"
+            
+            async def cleanup(self):
+                pass
+        
+        llm_client = MockLLMClient()
+        mcp_client = MockMCPClient()
+        session = VoiceChatSession(llm_client, mcp_client, voice_enabled=False)
+        # 模板回复总是交给LLM，模拟结果无法识别或LLM_FOLLOWUP=always
+        session.renderer.followup = "always"
+        inputs = iter(["查看状态", "exit"])
+        session._get_user_input = lambda prompt="用户": next(inputs)
+        
+        await session.start("测试")
+        await session.cleanup()
+        
+        if mcp_client.calls != ["get_state"]:
+            print(f"✗ 本地识别未执行工具: {mcp_client.calls}")
+            return False
+        if len(llm_client.requests) != 1:
+            print(f"✗ 工具结果未交给LLM回复，LLM请求次数: {len(llm_client.requests)}")
+            return False
+        last = llm_client.requests[0][-1]
+        if not last.get("content", "").startswith("工具执行结果"):
+            print(f"✗ LLM请求的最后一条消息不是工具执行结果: {last}")
+            return False
+        print("✓ 本地执行的结果已交给LLM回复")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 本地执行结果回复测试失败: {e}")
+        return False
+
+
 def main():
     """主测试函数"""
     print("🎤 语音控制系统完整测试")
@@ -268,6 +350,12 @@ def main():
             print(f"✗ {name}测试异常: {e}")
             results[name] = False
     
+    try:
+        results["本地结果回复"] = asyncio.run(test_deferred_tool_reply())
+    except Exception as e:
+        print(f"✗ 本地结果回复测试异常: {e}")
+        results["本地结果回复"] = False
+    
     # 语音识别需要异步测试
     try:
         result = asyncio.run(test_speech_recognition())
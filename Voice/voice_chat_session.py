@@ -17,6 +17,7 @@ sys.path.insert(0, str(mcp_client_dir))
 
 # 导入MCP客户端模块
 from main import ChatSession, LLMClient, MCPClient
+from chat_history import ConversationHistory
 
 # 导入本地语音模块
 try:
@@ -220,7 +221,8 @@ class VoiceChatSession(ChatSession):
             - system_message：系统消息
         返回值：无
         """
-        messages = [{"role": "system", "content": system_message}]
+        # 按token预算保留历史，超出时在后台压缩较早的轮次
+        history = ConversationHistory(system_message)
         
         # 打印启动信息
         print("=== QT应用语音控制助手已启动 ===")
@@ -251,30 +253,41 @@ class VoiceChatSession(ChatSession):
                 if not user_input:
                     continue
                     
-                messages.append({"role": "user", "content": user_input})
+                history.append({"role": "user", "content": user_input})
+
+                # 常见指令和参数补全在本地处理，不请求LLM
+                local_messages = await self.handle_locally(user_input)
+                if local_messages is not None:
+                    for message in local_messages:
+                        history.append(message)
+                    if local_messages[-1]["role"] != "assistant":
+                        # 本地执行的结果无法用模板回复（或LLM_FOLLOWUP要求），由LLM回复
+                        friendly_response = await self._ask_llm(history, use_tools=False)
+                        history.append({"role": "assistant", "content": friendly_response})
+                    continue
 
                 # 获取LLM的初始响应
-                llm_response = self.llm_client.get_response(messages)
-                print("助手:", llm_response)
+                llm_response = await self._ask_llm(history)
 
-                # 处理可能的工具调用
+                # 处理可能的工具调用，成功执行的调用写入语义缓存
                 result = await self.process_llm_response(llm_response)
+                self.remember_tool_call(user_input, result)
                 
                 # 如果处理结果与原始响应不同，说明执行了工具调用
                 if result != llm_response:
                     print(f"🛠️ {result}")  # 显示工具执行结果
                     
-                    # 将工具执行结果发送回LLM获取友好响应
-                    messages.append({"role": "assistant", "content": llm_response})
-                    messages.append({"role": "system", "content": result})
+                    for message in self.tool_turn_messages(llm_response, result):
+                        history.append(message)
                     
-                    # 获取LLM的友好响应
-                    friendly_response = self.llm_client.get_response(messages)
-                    print("助手:", friendly_response)
-                    messages.append({"role": "assistant", "content": friendly_response})
+                    # 友好响应优先用模板在本地生成，结果无法识别（或LLM_FOLLOWUP要求）时才请求LLM
+                    friendly_response = self.reply_to_tool_results()
+                    if friendly_response is None:
+                        friendly_response = await self._ask_llm(history, use_tools=False)
+                    history.append({"role": "assistant", "content": friendly_response})
                 else:
                     # 非工具调用，直接添加到消息历史
-                    messages.append({"role": "assistant", "content": llm_response})
+                    history.append({"role": "assistant", "content": llm_response})
 
             except KeyboardInterrupt:
                 print('\nQT控制助手退出')
@@ -297,11 +310,22 @@ def test_voice_chat():
     try:
         # 这里只是测试组件初始化，不运行完整会话
         from main import LLMClient, MCPClient
+        from completion_cache import CompletionCache
         
         # 模拟客户端（测试用）
         class MockLLMClient:
-            def get_response(self, messages):
+            """与LLMClient的属性和get_response签名一致，只在内存中缓存响应"""
+            function_calling = False
+
+            def __init__(self):
+                self.cache = CompletionCache(path="")
+
+            async def get_response(self, messages, on_text=None, tools=None,
+                                   cacheable=False, storable=None):
                 return "测试响应"
+
+            async def close(self):
+                self.cache.close()
         
         class MockMCPClient:
             async def cleanup(self):
@@ -317,6 +341,11 @@ def test_voice_chat():
             print("语音组件可用")
         else:
             print("语音功能不可用，将使用文字模式")
+        
+        # 按LLMClient的签名请求一次LLM（含响应缓存的cacheable/storable参数）
+        history = ConversationHistory("测试")
+        history.append({"role": "user", "content": "你好"})
+        asyncio.run(voice_session._ask_llm(history))
             
         # 清理资源
         asyncio.run(voice_session.cleanup())